@@ -9,11 +9,18 @@ Usage:
 Supports dual AI models (switch with /model command):
   1. MiniMax M2     — fast, general purpose
   2. GLM-4.7        — reasoning/thinking model
+
+The prompt appears before the schema is introspected: the DB summary and
+schema context load on one startup thread while the model clients (and the
+openai import behind them) are built on another. The first question waits
+for the schema only if it is still loading.
 """
 
 import os
 import sys
+import threading
 from pathlib import Path
+from typing import Optional
 
 # Ensure the nl_query directory is in the path
 sys.path.insert(0, str(Path(__file__).parent))
@@ -23,12 +30,23 @@ from dotenv import load_dotenv
 # Load .env from the nl_query directory
 load_dotenv(Path(__file__).parent / ".env")
 
-from schema_introspect import get_schema_context, get_table_summary
+from schema_introspect import get_schema_metadata, get_table_summary, render_schema_context
+from schema_retriever import SchemaRetriever
 from nl_engine import NLEngine
-from db_executor import SafeExecutor
+from db_executor import SafeExecutor, make_queries_interruptible
+from query_cache import QueryCache
+from intent_router import IntentRouter
+from pins import PinStore
+from telemetry import (
+    TelemetryLog, get_log_path, parse_since, read_records, summarize,
+    format_report as format_stats_report,
+)
+from cost_guard import OK, WARN, CostGuard, format_report, rewrite_request
+from query_jobs import JobManager, QueryJob
+from history import estimate_tokens
 from formatter import (
-    display_results, display_sql, display_welcome,
-    display_help, export_csv, console,
+    display_results, display_results_stream, display_sql, display_welcome,
+    display_help, export_csv, export_csv_stream, console,
 )
 
 
@@ -43,49 +61,447 @@ def get_db_params() -> dict:
     }
 
 
+def get_read_endpoints() -> list[dict]:
+    """
+    Read replicas from DB_READ_HOSTS ("host[:port],host[:port]"), sharing
+    the primary's database name and credentials.
+    """
+    endpoints = []
+    for entry in os.getenv("DB_READ_HOSTS", "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.rpartition(":")
+        if not (host and port.isdigit()):
+            host, port = entry, os.getenv("DB_PORT", "5432")
+        endpoints.append(dict(get_db_params(), host=host, port=int(port)))
+    return endpoints
+
+
+def get_pool_config() -> dict:
+    """Get connection pool sizing, read replicas and prepared-statement use from environment."""
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX", "4")),
+        "use_prepared": os.getenv("PREPARED_STATEMENTS", "1") != "0",
+        "read_endpoints": get_read_endpoints(),
+    }
+
+
+def get_cache_config() -> dict:
+    """Get query cache settings from environment."""
+    similarity = os.getenv("CACHE_SIMILARITY", "")
+    return {
+        "similarity": float(similarity) if similarity else None,
+    }
+
+
+def get_cost_guard_config() -> Optional[dict]:
+    """Get EXPLAIN cost-guard thresholds from environment (None if COST_GUARD=0)."""
+    if os.getenv("COST_GUARD", "1") == "0":
+        return None
+    return {
+        "warn_cost": float(os.getenv("COST_GUARD_WARN_COST", "200000")),
+        "max_cost": float(os.getenv("COST_GUARD_MAX_COST", "2000000")),
+        "warn_rows": int(os.getenv("COST_GUARD_WARN_ROWS", "100000")),
+        "max_rows": int(os.getenv("COST_GUARD_MAX_ROWS", "5000000")),
+    }
+
+
+def get_background_after() -> float:
+    """Seconds a query may hold the prompt before it moves to the background (0 = never)."""
+    return float(os.getenv("BACKGROUND_AFTER_S", "5"))
+
+
 def get_env_config() -> dict:
     """Get all environment variables as a dict."""
     keys = [
-        "AI_PROVIDER", "NVIDIA_NIM_API_KEY", "NVIDIA_NIM_API_URL",
+        "AI_PROVIDER", "NVIDIA_NIM_API_KEY", "NVIDIA_NIM_API_URL", "NVIDIA_NIM_API_URL_2",
         "NVIDIA_NIM_MODEL", "NVIDIA_NIM_API_KEY_2", "NVIDIA_NIM_MODEL_2",
         "DEFAULT_MODEL",
     ]
     return {k: os.getenv(k, "") for k in keys}
 
 
+def run_cancellable(fn):
+    """
+    Run fn(cancel_event) on a worker thread so Ctrl-C sets the event and
+    returns control instead of exiting the app. Returns None if cancelled.
+    """
+    cancel = threading.Event()
+    box = {}
+    worker = threading.Thread(
+        target=lambda: box.setdefault("result", fn(cancel)),
+        name="llm-ask",
+        daemon=True,
+    )
+    worker.start()
+    while worker.is_alive():
+        try:
+            worker.join(0.1)
+        except KeyboardInterrupt:
+            cancel.set()
+            console.print("\n[yellow]🛑 Answer cancelled.[/yellow]")
+            return None
+    return box.get("result")
+
+
+def ask_cancellable(engine: NLEngine, question: str, on_sql=None) -> Optional[str]:
+    """engine.ask on a worker thread; None if the user pressed Ctrl-C."""
+    return run_cancellable(lambda cancel: engine.ask(question, cancel_event=cancel, on_sql=on_sql))
+
+
+def race_accept(executor: SafeExecutor):
+    """Race acceptance check: SQL passes validate_query and EXPLAIN plans it."""
+    def accept(sql: str) -> bool:
+        is_valid, _ = executor.validate_query(sql)
+        if not is_valid:
+            return False
+        try:
+            executor.explain(sql)
+        except Exception:
+            return False
+        return True
+    return accept
+
+
+def _ask_user(prompt: str) -> str:
+    """Read a lowercase answer; Ctrl-C / EOF count as "n"."""
+    try:
+        return input(prompt).strip().lower()
+    except (KeyboardInterrupt, EOFError):
+        console.print()
+        return "n"
+
+
+def guard_query(sql: str, executor: SafeExecutor, guard: CostGuard,
+                engine: NLEngine, auto_rewrite: bool = False) -> Optional[str]:
+    """
+    Check a query's EXPLAIN estimate before it runs.
+    
+    Plans over the warning level run only if the user agrees. Plans over the
+    limit are blocked and can be sent back to the model once for a cheaper
+    rewrite. Returns the SQL to run, or None to skip execution.
+    """
+    for attempt in range(2):
+        try:
+            report = guard.assess(executor.explain(sql))
+        except Exception:
+            # Invalid SQL or a planner error: execution reports it properly
+            return sql
+        
+        if report["verdict"] == OK:
+            return sql
+        
+        if report["verdict"] == WARN:
+            console.print("[yellow]⚠ Planner estimate is high:[/yellow]")
+            console.print(format_report(report))
+            answer = _ask_user("  ▶ Run anyway? (y/N): ")
+            return sql if answer in ("y", "yes") else None
+        
+        console.print("[red]⛔ Blocked by cost guard:[/red]")
+        console.print(format_report(report))
+        if attempt > 0:
+            return None
+        if not auto_rewrite:
+            answer = _ask_user("  ▶ Ask the model for a cheaper rewrite? (Y/n): ")
+            if answer in ("n", "no"):
+                return None
+        
+        console.print(f"\n[dim]🤖 Asking for a rewrite — {engine.get_active_model_info()}[/dim]")
+        # generate() is stateless: the rewrite prompt stays out of the history
+        outcome = run_cancellable(lambda cancel: engine.generate(
+            rewrite_request(sql, report),
+            on_token=lambda content: print(content, end="", flush=True),
+            cancel_event=cancel,
+        ))
+        if outcome is None:
+            return None
+        print()
+        if outcome["error"]:
+            console.print(f"[red]{outcome['error']}[/red]")
+            return None
+        new_sql = outcome["sql"]
+        if not new_sql:
+            return None
+        sql = new_sql
+        display_sql(sql)
+        if _ask_user("  ▶ Execute the rewritten query? (Y/n): ") in ("n", "no"):
+            return None
+    return None
+
+
+def log_query(telemetry: Optional[TelemetryLog], sql: str, result: dict, question: str,
+              llm_stats: Optional[dict] = None, **extra):
+    """Append an executed query to the telemetry log, if enabled."""
+    if telemetry is not None:
+        telemetry.record(sql, result, question=question, llm=llm_stats, **extra)
+
+
+class Speculation:
+    """
+    Runs an answer's SQL while the model is still explaining it.
+    
+    start() is engine.ask's on_sql callback: it fires on the streaming
+    thread as soon as the ```sql block closes. SQL that passes
+    validate_query (and, with a cost guard, an EXPLAIN that the guard
+    rates OK) is submitted as a query job right away. take(sql) hands the
+    job over if the user runs exactly that SQL; any other outcome cancels
+    the statement on the server.
+    """
+    
+    def __init__(self, executor: SafeExecutor, jobs: JobManager,
+                 guard: Optional[CostGuard], label: str):
+        self.executor = executor
+        self.jobs = jobs
+        self.guard = guard
+        self.label = label
+        self.job: Optional[QueryJob] = None
+        self._closed = False
+        self._lock = threading.Lock()
+    
+    def start(self, sql: str):
+        is_valid, _ = self.executor.validate_query(sql)
+        if not is_valid:
+            return
+        if self.guard is not None:
+            # Anything but OK waits for guard_query to ask the user
+            try:
+                if self.guard.assess(self.executor.explain(sql))["verdict"] != OK:
+                    return
+            except Exception:
+                return
+        with self._lock:
+            if self._closed:
+                return
+            self.job = self.jobs.submit(
+                "query", self.label,
+                lambda progress: self.executor.execute(sql, progress=progress),
+                sql=sql,
+            )
+    
+    def take(self, sql: str) -> Optional[QueryJob]:
+        """The job started for sql, or None (cancelling one started for other SQL)."""
+        with self._lock:
+            self._closed = True
+            job, self.job = self.job, None
+        if job is not None and job.sql != sql:
+            job.cancel()
+            return None
+        return job
+    
+    def cancel(self):
+        """Stop any speculative query; later start() calls do nothing."""
+        with self._lock:
+            self._closed = True
+            job, self.job = self.job, None
+        if job is not None:
+            job.cancel()
+
+
+def wait_for_job(job: QueryJob, background_after: float) -> bool:
+    """
+    Show a spinner with elapsed time and rows fetched while a job runs.
+    
+    Ctrl-C cancels the statement on the server. Returns False if the job
+    is still running after background_after seconds.
+    """
+    with console.status("[dim]Executing...[/dim]") as status:
+        while True:
+            try:
+                if job.wait(0.1):
+                    return True
+            except KeyboardInterrupt:
+                job.cancel()
+                status.update("[yellow]🛑 Cancelling...[/yellow]")
+                continue
+            if job.progress.cancelled:
+                continue
+            status.update(
+                f"[dim]Executing... {job.elapsed_s:.1f}s  •  "
+                f"{job.progress.rows_fetched:,} rows fetched  •  Ctrl-C to cancel[/dim]"
+            )
+            if background_after > 0 and job.elapsed_s >= background_after:
+                return False
+
+
+def export_job(executor: SafeExecutor, sql: str):
+    """Job body that streams the full result of sql to CSV."""
+    def work(progress):
+        with executor.stream(sql, progress=progress) as stream:
+            return export_csv_stream(stream)
+    return work
+
+
+def show_job_result(job: QueryJob, cache: QueryCache) -> Optional[dict]:
+    """Display a finished job. Returns the result dict for query jobs."""
+    if job.error is not None:
+        if job.progress.cancelled:
+            console.print(f"[yellow]🛑 Job #{job.job_id} cancelled.[/yellow]")
+        else:
+            console.print(f"[red]❌ Job #{job.job_id} failed: {job.error}[/red]")
+        return None
+    
+    if job.kind == "export":
+        filepath, rows_written = job.result
+        console.print(f"[green]✅ Exported {rows_written:,} rows to: {filepath}[/green]")
+        return None
+    
+    result = job.result
+    cache.put_result(job.sql, result)
+    if result["success"]:
+        cache.put_sql(job.label, job.sql)
+    display_results(result, title=job.label[:80])
+    return result
+
+
+def load_schema(db_params: dict) -> dict:
+    """DB summary, schema metadata and rendered schema context."""
+    schema_meta = get_schema_metadata(db_params, include_samples=True)
+    return {
+        "summary": get_table_summary(db_params),
+        "meta": schema_meta,
+        "context": render_schema_context(schema_meta, include_samples=True),
+    }
+
+
+class StartupLoader:
+    """
+    Loads the schema into the engine and builds its model clients on
+    background threads, so the prompt does not wait for either.
+    """
+    
+    def __init__(self, db_params: dict, engine: NLEngine):
+        self.engine = engine
+        self.summary: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self._ready = threading.Event()
+        
+        # Daemon threads: quitting never waits on a slow database connect
+        threading.Thread(target=self._load_schema, args=(db_params,), name="startup-schema", daemon=True).start()
+        threading.Thread(target=self._build_clients, name="startup-clients", daemon=True).start()
+    
+    def _build_clients(self):
+        try:
+            self.engine.preload_clients()
+        except Exception:
+            # Rebuilt, and the error shown, on first use
+            pass
+    
+    def _load_schema(self, db_params: dict):
+        try:
+            schema = load_schema(db_params)
+            # Send only question-relevant tables unless SCHEMA_RETRIEVAL=0
+            retriever = None
+            if os.getenv("SCHEMA_RETRIEVAL", "1") != "0":
+                retriever = SchemaRetriever(schema["meta"])
+            self.engine.set_schema(schema["context"], retriever)
+            self.summary = schema["summary"]
+        except Exception as e:
+            self.error = e
+            console.print(f"\n[red]❌ Cannot connect to database: {e}[/red]")
+            console.print("[dim]Check your .env file: DB_HOST, DB_NAME, DB_USER, DB_PASSWORD[/dim]")
+        finally:
+            self._ready.set()
+    
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+    
+    def wait(self) -> str:
+        """Block until the schema is installed; exits if it failed. Returns the DB summary."""
+        if not self._ready.is_set():
+            with console.status("[dim]Loading schema...[/dim]"):
+                self._ready.wait()
+        if self.error is not None:
+            sys.exit(1)
+        return self.summary
+
+
 def main():
     """Main interactive loop."""
     db_params = get_db_params()
     env_config = get_env_config()
     
     # ── Initialize components ─────────────────────────────────
-    console.print("\n[dim]Connecting to database...[/dim]")
+    # Initialize AI engine; follow-ups replay compact history within a token budget
+    engine = NLEngine(
+        env_config,
+        history_token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "1500")),
+    )
     
-    try:
-        db_summary = get_table_summary(db_params)
-    except Exception as e:
-        console.print(f"[red]❌ Cannot connect to database: {e}[/red]")
-        console.print("[dim]Check your .env file: DB_HOST, DB_NAME, DB_USER, DB_PASSWORD[/dim]")
-        sys.exit(1)
+    # Schema and model clients load in the background while the prompt is up
+    startup = StartupLoader(db_params, engine)
+    
+    # Initialize safe executor; Ctrl-C cancels a running statement.
+    # Queries prefer DB_READ_HOSTS replicas that are up to date with the primary.
+    pool_config = get_pool_config()
+    executor = SafeExecutor(db_params, **pool_config)
+    make_queries_interruptible()
+    if pool_config["read_endpoints"]:
+        console.print(f"[dim]Read replicas: {len(pool_config['read_endpoints'])} (primary as fallback)[/dim]")
     
-    console.print("[dim]Loading schema context...[/dim]")
-    schema_context = get_schema_context(db_params, include_samples=True)
-    console.print(f"[dim]Schema loaded: {len(schema_context):,} chars[/dim]")
+    # EXPLAIN-based guard against runaway generated SQL
+    guard_config = get_cost_guard_config()
+    guard = CostGuard(**guard_config) if guard_config else None
+    auto_rewrite = os.getenv("COST_GUARD_AUTO_REWRITE", "0") == "1"
     
-    # Initialize AI engine
-    engine = NLEngine(env_config, schema_context)
+    # Question → SQL and SQL → result cache, invalidated by loader runs
+    cache = QueryCache(version_fn=executor.get_data_version, **get_cache_config())
     
-    # Initialize safe executor
-    executor = SafeExecutor(db_params)
+    # Every executed query is appended to the telemetry log unless TELEMETRY=0
+    log_path = get_log_path()
+    telemetry = TelemetryLog(log_path, source="cli") if log_path else None
+    # job_id → (question's model stats, SQL source) until a background job reports
+    job_meta = {}
     
-    # Last result for export
+    # Common question shapes go straight to vetted SQL unless INTENT_ROUTER=0
+    router = IntentRouter(executor) if os.getenv("INTENT_ROUTER", "1") != "0" else None
+    
+    # Last result, SQL and question for export and /pin
     last_result = None
+    last_sql = None
+    last_question = None
+    
+    # Named queries the loader re-runs into snapshots after every load
+    pins = PinStore()
+    
+    # Page through results via a server-side cursor instead of a capped fetch
+    stream_mode = os.getenv("STREAM_RESULTS", "0") == "1"
+    
+    # Ask every model at once and keep the first runnable SQL
+    race_mode = os.getenv("RACE_MODE", "0") == "1"
+    
+    # Start the answer's SQL as soon as its code block closes, while the
+    # explanation is still streaming (not in stream mode, which pages instead)
+    speculate = os.getenv("SPECULATIVE_EXECUTION", "1") != "0" and not stream_mode
+    
+    # Queries that outlive the foreground wait keep running here
+    background_after = get_background_after()
+    jobs = JobManager(on_finish=lambda job: console.print(
+        f"\n[green]🔔 Job #{job.job_id} finished ({job.elapsed_s:.1f}s) — press Enter to view[/green]"
+    ))
     
     # ── Welcome ───────────────────────────────────────────────
-    display_welcome(db_summary, engine.get_active_model_info())
+    display_welcome(startup.summary if startup.ready else None, engine.get_active_model_info())
     
     # ── Interactive loop ──────────────────────────────────────
     while True:
+        # ── Results of background jobs that finished meanwhile ──
+        for job in jobs.pop_finished():
+            console.print(f"\n[cyan]📬 Job #{job.job_id}: {job.label[:80]}[/cyan]")
+            result = show_job_result(job, cache)
+            llm_stats, sql_source, intent = job_meta.pop(job.job_id, (None, None, None))
+            if result is not None:
+                log_query(telemetry, job.sql, result, job.label, llm_stats, sql_source=sql_source, intent=intent)
+                engine.record_result(job.label, result, sql=job.sql)
+                last_result = result
+                if result["success"]:
+                    last_sql = job.sql
+                    last_question = job.label
+        
+        if startup.error is not None:
+            sys.exit(1)
         try:
             console.print()
             user_input = input("📝 You: ").strip()
@@ -110,7 +526,7 @@ def main():
                 continue
             
             elif command == "/schema":
-                console.print(f"\n[cyan]{db_summary}[/cyan]\n")
+                console.print(f"\n[cyan]{startup.wait()}[/cyan]\n")
                 continue
             
             elif command == "/models":
@@ -132,28 +548,177 @@ def main():
                 continue
             
             elif command == "/history":
-                if not engine.conversation_history:
+                turns = engine.history.turns
+                if not turns:
                     console.print("[dim]No conversation history yet.[/dim]")
                 else:
-                    for i, turn in enumerate(engine.conversation_history):
-                        role = "👤 You" if turn["role"] == "user" else "🤖 AI"
-                        content = turn["content"][:150] + "..." if len(turn["content"]) > 150 else turn["content"]
-                        console.print(f"[dim]{i+1}.[/dim] {role}: {content}")
+                    for i, turn in enumerate(turns):
+                        console.print(f"[dim]{i+1}.[/dim] 👤 You: {turn['question']}", markup=False)
+                        answer = " ".join(turn["sql"].split()) if turn["sql"] else turn["answer"] or ""
+                        answer = answer[:150] + "..." if len(answer) > 150 else answer
+                        console.print(f"     🤖 AI: {answer}", markup=False)
+                        if turn["summary"]:
+                            console.print(f"     📊 {turn['summary']}", markup=False)
+                    replayed = engine.conversation_history
+                    tokens = sum(estimate_tokens(m["content"]) for m in replayed)
+                    console.print(
+                        f"[dim]Replaying last {len(replayed) // 2} of {len(turns)} turns "
+                        f"(~{tokens:,} of {engine.history.token_budget:,} tokens)[/dim]"
+                    )
                 continue
             
             elif command == "/export":
-                if last_result and last_result["success"] and last_result["rows"]:
+                if last_sql:
+                    # Re-run through a server-side cursor so the file has every row
+                    job = jobs.submit("export", "export of last result", export_job(executor, last_sql), sql=last_sql)
+                    if wait_for_job(job, background_after):
+                        show_job_result(job, cache)
+                    else:
+                        jobs.send_to_background(job)
+                        console.print(f"[yellow]⏳ Export continues in the background as job #{job.job_id}.[/yellow]")
+                elif last_result and last_result["success"] and last_result["rows"]:
                     filepath = export_csv(last_result)
                     console.print(f"[green]✅ Exported to: {filepath}[/green]")
                 else:
                     console.print("[yellow]No results to export. Run a query first.[/yellow]")
                 continue
             
+            elif command == "/jobs":
+                running = jobs.running()
+                if not running:
+                    console.print("[dim]No background jobs running.[/dim]")
+                for job in running:
+                    console.print(
+                        f"  #{job.job_id} [{job.kind}] {job.elapsed_s:.1f}s, "
+                        f"{job.progress.rows_fetched:,} rows — {job.label[:60]}"
+                    )
+                continue
+            
+            elif command == "/cancel":
+                if len(cmd) > 1:
+                    job = jobs.get(int(cmd[1])) if cmd[1].isdigit() else None
+                    if job is None or job.done:
+                        console.print(f"[yellow]No running job {cmd[1]}. See /jobs.[/yellow]")
+                    else:
+                        job.cancel()
+                        console.print(f"[yellow]🛑 Cancelling job #{job.job_id}...[/yellow]")
+                else:
+                    count = jobs.cancel_all()
+                    console.print(f"[yellow]🛑 Cancelling {count} job(s)...[/yellow]")
+                continue
+            
+            elif command == "/race":
+                if len(cmd) > 1 and cmd[1] in ("on", "off"):
+                    race_mode = cmd[1] == "on"
+                state = "on" if race_mode else "off"
+                console.print(f"[green]Race mode: {state}[/green]")
+                continue
+            
+            elif command == "/stream":
+                if len(cmd) > 1 and cmd[1] in ("on", "off"):
+                    stream_mode = cmd[1] == "on"
+                state = "on" if stream_mode else "off"
+                console.print(f"[green]Streaming results: {state}[/green]")
+                continue
+            
             elif command == "/clear":
                 engine.clear_history()
                 console.print("[green]✅ Conversation history cleared.[/green]")
                 continue
             
+            elif command == "/cache":
+                sub = cmd[1] if len(cmd) > 1 else "stats"
+                if sub == "clear":
+                    cache.clear()
+                    console.print("[green]✅ Query cache cleared.[/green]")
+                elif sub == "stats":
+                    console.print(f"\n[yellow]Query Cache:[/yellow]")
+                    console.print(cache.format_stats())
+                else:
+                    console.print("[yellow]Usage: /cache stats or /cache clear[/yellow]")
+                continue
+            
+            elif command == "/stats":
+                if telemetry is None:
+                    console.print("[yellow]Telemetry is off (TELEMETRY=0).[/yellow]")
+                    continue
+                try:
+                    since = parse_since(cmd[1]) if len(cmd) > 1 else None
+                except ValueError:
+                    console.print("[yellow]Usage: /stats [7d|12h|30m|2026-01-31][/yellow]")
+                    continue
+                console.print(f"\n[yellow]Query telemetry ({telemetry.path}):[/yellow]")
+                console.print(format_stats_report(summarize(read_records(telemetry.path, since))), markup=False)
+                continue
+            
+            elif command == "/pin":
+                if len(cmd) < 2:
+                    console.print("[yellow]Usage: /pin <name> — pins the last query's SQL[/yellow]")
+                elif not last_sql:
+                    console.print("[yellow]No query to pin. Run a query first.[/yellow]")
+                else:
+                    try:
+                        replaced = pins.add(cmd[1], last_sql, last_question)
+                    except ValueError as e:
+                        console.print(f"[red]{e}[/red]")
+                        continue
+                    action = "Re-pinned" if replaced else "Pinned"
+                    console.print(
+                        f"[green]📌 {action} '{cmd[1]}' — refreshed after every load; "
+                        f"/pinned {cmd[1]} shows it.[/green]"
+                    )
+                continue
+            
+            elif command == "/unpin":
+                if len(cmd) < 2:
+                    console.print("[yellow]Usage: /unpin <name>[/yellow]")
+                elif pins.remove(cmd[1]):
+                    console.print(f"[green]✅ Unpinned '{cmd[1]}'.[/green]")
+                else:
+                    console.print(f"[yellow]No pin named '{cmd[1]}'. See /pinned.[/yellow]")
+                continue
+            
+            elif command == "/pinned":
+                if len(cmd) < 2:
+                    pinned = pins.all()
+                    if not pinned:
+                        console.print("[dim]Nothing pinned yet. Run a query, then /pin <name>.[/dim]")
+                    for name, pin in pinned.items():
+                        snapshot = pins.snapshot(name)
+                        state = (
+                            f"{snapshot['row_count']:,} rows, refreshed {snapshot['refreshed_at'][:16]}"
+                            if snapshot else "waiting for the next load"
+                        )
+                        console.print(f"  📌 {name} — {pin['question'] or ' '.join(pin['sql'].split())[:60]} [dim]({state})[/dim]")
+                    continue
+                
+                name = cmd[1]
+                pin = pins.get(name)
+                if pin is None:
+                    console.print(f"[yellow]No pin named '{name}'. See /pinned.[/yellow]")
+                    continue
+                snapshot = pins.snapshot(name)
+                if snapshot is not None and snapshot["sql"] == pin["sql"]:
+                    console.print(f"\n[dim]⚡ Pinned snapshot from {snapshot['refreshed_at'][:16]} — no database call[/dim]")
+                    display_results(snapshot, title=f"📌 {name}")
+                    version = executor.get_data_version()
+                    if version is not None and snapshot["data_version"] != version:
+                        console.print("[dim]Data has changed since; the snapshot refreshes after the next load.[/dim]")
+                    result = snapshot
+                else:
+                    console.print("\n[dim]No snapshot yet (taken after the next load) — running live...[/dim]")
+                    result = executor.execute(pin["sql"])
+                    display_results(result, title=f"📌 {name}")
+                last_result = result
+                last_sql = pin["sql"]
+                last_question = pin["question"]
+                continue
+            
+            elif command == "/templates":
+                console.print(f"\n[yellow]Query templates by total time:[/yellow]")
+                console.print(executor.template_stats.format_stats())
+                continue
+            
             elif command == "/test":
                 console.print("[dim]Testing API connection...[/dim]")
                 result = engine.test_connection()
@@ -165,17 +730,62 @@ def main():
                 continue
         
         # ── Process natural language query ────────────────────
-        console.print(f"\n[dim]🤖 {engine.get_active_model_info()}[/dim]")
-        
-        # Get LLM response
-        response = engine.ask(user_input)
-        
-        # Extract SQL from response
-        sql = engine.extract_sql(response)
-        
-        if not sql:
-            # No SQL found — the LLM gave a text-only answer
-            continue
+        startup.wait()
+        cached = cache.get_sql(user_input)
+        routed = router.route(user_input) if router is not None and not cached else None
+        llm_stats, intent, speculation = None, None, None
+        if cached:
+            sql, match = cached
+            sql_source = "cache"
+            console.print(f"\n[dim]⚡ Cached SQL ({match} match) — no API call[/dim]")
+            engine.add_history(user_input, f"```sql\n{sql}\n```")
+        elif routed:
+            sql, sql_source, intent = routed["sql"], "intent", routed["intent"]
+            console.print(f"\n[dim]⚡ {routed['description']} (canned query) — no API call[/dim]")
+            engine.add_history(user_input, f"```sql\n{sql}\n```")
+        elif race_mode:
+            with console.status(f"[dim]🏁 Racing {len(engine.models)} models...[/dim]"):
+                outcome = run_cancellable(
+                    lambda cancel: engine.race(user_input, race_accept(executor), cancel_event=cancel) or {}
+                )
+            if outcome is None:
+                continue
+            if not outcome:
+                console.print("[red]❌ No model returned SQL that validates and plans.[/red]")
+                continue
+            others = ", ".join(
+                f"{engine.models[mid]['label']}: {status}"
+                for mid, status in outcome["results"].items() if mid != outcome["model_id"]
+            )
+            console.print(
+                f"\n[dim]🏁 {engine.models[outcome['model_id']]['label']} won in "
+                f"{outcome['elapsed_ms']:,.0f}ms ({others})[/dim]"
+            )
+            if engine.last_schema_tables:
+                console.print(f"[dim]📉 Schema sent: {', '.join(engine.last_schema_tables)}[/dim]")
+            print(outcome["response"])
+            sql, sql_source, llm_stats = outcome["sql"], "race", engine.last_call
+        else:
+            console.print(f"\n[dim]🤖 {engine.get_active_model_info()}[/dim]")
+            
+            # Get LLM response (Ctrl-C stops it)
+            speculation = Speculation(executor, jobs, guard, user_input) if speculate else None
+            response = ask_cancellable(engine, user_input, speculation.start if speculation else None)
+            if response is None:
+                if speculation is not None:
+                    speculation.cancel()
+                continue
+            if engine.last_schema_tables:
+                console.print(f"[dim]📉 Schema sent: {', '.join(engine.last_schema_tables)}[/dim]")
+            
+            # Extract SQL from response
+            sql, sql_source, llm_stats = engine.extract_sql(response), "llm", engine.last_call
+            
+            if not sql:
+                # No SQL found — the LLM gave a text-only answer
+                if speculation is not None:
+                    speculation.cancel()
+                continue
         
         # Display the extracted SQL
         display_sql(sql)
@@ -184,10 +794,14 @@ def main():
         try:
             confirm = input("  ▶ Execute this query? (Y/n/edit): ").strip().lower()
         except (KeyboardInterrupt, EOFError):
+            if speculation is not None:
+                speculation.cancel()
             console.print("\n[dim]Query cancelled.[/dim]")
             continue
         
         if confirm in ("n", "no"):
+            if speculation is not None:
+                speculation.cancel()
             console.print("[dim]Query skipped.[/dim]")
             continue
         
@@ -204,17 +818,92 @@ def main():
                     break
             if lines:
                 sql = "\n".join(lines)
+                sql_source = "edited"
                 display_sql(sql)
             else:
                 console.print("[dim]No changes. Using original SQL.[/dim]")
         
-        # Execute the query
-        console.print("[dim]Executing...[/dim]")
-        result = executor.execute(sql)
-        last_result = result
+        # A query started while the answer streamed is reused only for the
+        # exact SQL confirmed here; it already passed the cost guard
+        job = speculation.take(sql) if speculation is not None else None
         
-        # Display results
-        display_results(result, title=user_input[:80])
+        # Cached results skip the database, so they skip the cost guard too
+        result = None if stream_mode else cache.get_result(sql)
+        if result is not None and job is not None:
+            job.cancel()
+            job = None
+        speculative = job is not None
+        if result is None and job is None and guard is not None:
+            sql = guard_query(sql, executor, guard, engine, auto_rewrite)
+            if sql is None:
+                console.print("[dim]Query skipped.[/dim]")
+                continue
+        
+        # Stream mode: page through the full result as it arrives
+        if stream_mode:
+            console.print("[dim]Streaming...[/dim]")
+            try:
+                with executor.stream(sql) as stream:
+                    shown = display_results_stream(stream, title=user_input[:80])
+                    engine.record_result(user_input, {
+                        "success": True, "columns": stream.columns, "row_count": shown,
+                    }, sql=sql)
+                # Time to the first batch stands in for database latency
+                log_query(telemetry, sql, {
+                    "success": True, "row_count": shown, "truncated": False,
+                    "execution_time_ms": stream.first_batch_ms,
+                }, user_input, llm_stats, sql_source=sql_source, intent=intent, streamed=True)
+            except ValueError as e:
+                console.print(f"[red]{e}[/red]")
+                continue
+            except KeyboardInterrupt:
+                console.print("\n[yellow]🛑 Stream closed.[/yellow]")
+                continue
+            except Exception as e:
+                console.print(f"[red]❌ Database error: {e}[/red]")
+                continue
+            cache.put_sql(user_input, sql)
+            last_sql = sql
+            last_question = user_input
+            continue
+        
+        # Execute the query (or reuse a cached result for the same SQL)
+        cached_result = result
+        if result is not None:
+            console.print("[dim]⚡ Cached result — no database call[/dim]")
+            display_results(result, title=user_input[:80])
+        else:
+            if job is not None:
+                console.print("[dim]⚡ Query started while the answer streamed[/dim]")
+            else:
+                job = jobs.submit(
+                    "query", user_input,
+                    lambda progress, sql=sql: executor.execute(sql, progress=progress),
+                    sql=sql,
+                )
+            if not wait_for_job(job, background_after):
+                jobs.send_to_background(job)
+                job_meta[job.job_id] = (llm_stats, sql_source, intent)
+                console.print(
+                    f"[yellow]⏳ Still running — moved to background as job #{job.job_id}. "
+                    f"Ask away; /jobs lists it, /cancel {job.job_id} stops it.[/yellow]"
+                )
+                continue
+            result = show_job_result(job, cache)
+            if result is None:
+                continue
+        log_query(telemetry, sql, result, user_input, llm_stats, sql_source=sql_source,
+                  intent=intent, cached=result is cached_result,
+                  speculative=speculative)
+        if result["success"]:
+            cache.put_sql(user_input, sql)
+            last_sql = sql
+            last_question = user_input
+        last_result = result
+        engine.record_result(user_input, result, sql=sql)
+    
+    jobs.cancel_all()
+    executor.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,376 @@
+"""
+Batch NL Query Runner
+Answers a file of questions without the interactive prompt — for nightly
+report generation and as a latency / regression benchmark.
+
+Usage:
+    cd nl_query
+    python batch_runner.py questions.jsonl -o batch_out
+    python batch_runner.py questions.jsonl -o batch_out --llm-concurrency 8 --model 2 --full
+
+Input is JSONL, one object per line ("id" defaults to the line number):
+    {"id": "sbi_top10", "question": "Top 10 holdings of SBI Bluechip by value"}
+    {"id": "amc_count", "sql": "SELECT COUNT(*) FROM amc_master"}    # skips the LLM
+
+SQL is generated with at most --llm-concurrency requests in flight; each
+answer moves straight on to validation and execution on the SafeExecutor
+pool, so database work overlaps with generation of the next questions.
+
+Output directory:
+    results.jsonl   one record per question: sql, status, error, rows,
+                    columns and timings (llm_ms, ttft_ms, validation_ms, db_ms)
+    csv/<id>.csv    result rows of every successful query
+    summary.json    status counts, wall time and p50 / p95 / max per stage
+
+Executed queries are also appended to the telemetry log (source "batch")
+unless TELEMETRY=0.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+# Ensure the nl_query directory is in the path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app import get_cost_guard_config, get_db_params, get_env_config, get_pool_config
+from cost_guard import REJECT, CostGuard
+from db_executor import SafeExecutor
+from formatter import export_csv, export_csv_stream
+from nl_engine import NLEngine
+from schema_introspect import get_schema_metadata, render_schema_context
+from schema_retriever import SchemaRetriever
+from telemetry import TelemetryLog, get_log_path
+
+log = logging.getLogger("batch_runner")
+
+STAGES = ("llm_ms", "ttft_ms", "validation_ms", "db_ms")
+
+
+def load_questions(path: str) -> list[dict]:
+    """Read JSONL items; each needs a "question" or a "sql"."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line)
+            if not item.get("question") and not item.get("sql"):
+                raise ValueError(f"{path}:{line_no}: needs a 'question' or 'sql'")
+            item.setdefault("id", str(line_no))
+            item["index"] = len(items)
+            items.append(item)
+    return items
+
+
+def _safe_name(item_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(item_id))[:100]
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+class BatchRunner:
+    """Runs questions through generate → validate → execute with bounded concurrency."""
+
+    def __init__(
+        self,
+        engine: NLEngine,
+        executor: SafeExecutor,
+        output_dir: str,
+        llm_concurrency: int = 4,
+        db_concurrency: Optional[int] = None,
+        model_id: Optional[int] = None,
+        full: bool = False,
+        guard: Optional[CostGuard] = None,
+        telemetry: Optional[TelemetryLog] = None,
+    ):
+        """
+        Args:
+            engine / executor: shared NLEngine and SafeExecutor (pool)
+            output_dir: where results.jsonl, csv/ and summary.json go
+            llm_concurrency: max LLM requests in flight
+            db_concurrency: max queries in flight (defaults to the pool size)
+            model_id: model to ask (defaults to the engine's active model)
+            full: stream complete results to CSV instead of the MAX_ROWS cap
+            guard: optional EXPLAIN cost guard; rejected plans are not run
+            telemetry: optional log that receives every executed query
+        """
+        self.engine = engine
+        self.executor = executor
+        self.output_dir = Path(output_dir)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.db_concurrency = max(1, db_concurrency or executor.max_size)
+        self.model_id = model_id or engine.active_model_id
+        self.full = full
+        self.guard = guard
+        self.telemetry = telemetry
+
+    # ── Stages ────────────────────────────────────────────────
+
+    def _generate(self, item: dict) -> dict:
+        """LLM stage: question → SQL (skipped for items that carry SQL)."""
+        record = {
+            "id": item["id"],
+            "index": item["index"],
+            "question": item.get("question"),
+            "model": None,
+            "sql": item.get("sql"),
+            "status": "generated",
+            "error": None,
+            "rows": None,
+            "columns": None,
+            "truncated": None,
+            "csv": None,
+            "schema_tables": None,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "tokens_estimated": None,
+            "timings": {stage: None for stage in STAGES},
+        }
+        if record["sql"]:
+            return record
+
+        try:
+            record["model"] = self.engine.models[self.model_id]["name"]
+            gen = self.engine.generate(item["question"], model_id=self.model_id)
+        except Exception as e:
+            # Raised in a done-callback's future.result(), it would only be
+            # logged and the item would vanish from the output
+            record["status"], record["error"] = "llm_error", f"❌ {type(e).__name__}: {e}"
+            return record
+        record["sql"] = gen["sql"]
+        record["schema_tables"] = gen["schema_tables"]
+        record["timings"]["llm_ms"] = gen["llm_ms"]
+        record["timings"]["ttft_ms"] = gen["ttft_ms"]
+        record["prompt_tokens"] = gen["prompt_tokens"]
+        record["completion_tokens"] = gen["completion_tokens"]
+        record["tokens_estimated"] = gen["tokens_estimated"]
+        if gen["error"]:
+            record["status"], record["error"] = "llm_error", gen["error"]
+        elif not gen["sql"]:
+            record["status"], record["error"] = "no_sql", gen["response"][:500]
+        return record
+
+    def _execute(self, record: dict) -> dict:
+        """Validation + DB stage."""
+        sql = record["sql"]
+
+        start = time.perf_counter()
+        is_valid, message = self.executor.validate_query(sql)
+        if is_valid and self.guard is not None:
+            try:
+                report = self.guard.assess(self.executor.explain(sql))
+                if report["verdict"] == REJECT:
+                    is_valid, message = False, "; ".join(report["reasons"])
+                    record["status"] = "rejected"
+            except Exception as e:
+                is_valid, message = False, str(e)
+        record["timings"]["validation_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if not is_valid:
+            if record["status"] != "rejected":
+                record["status"] = "invalid"
+            record["error"] = message
+            return record
+
+        csv_path = self.output_dir / "csv" / f"{_safe_name(record['id'])}.csv"
+        start = time.perf_counter()
+        try:
+            if self.full:
+                with self.executor.stream(sql) as stream:
+                    _, rows = export_csv_stream(stream, str(csv_path))
+                record.update(status="ok", rows=rows, columns=stream.columns, truncated=False)
+                record["csv"] = str(csv_path.relative_to(self.output_dir))
+            else:
+                result = self.executor.execute(sql)
+                if not result["success"]:
+                    record.update(status="db_error", error=result["error"])
+                else:
+                    record.update(
+                        status="ok", rows=result["row_count"],
+                        columns=result["columns"], truncated=result["truncated"],
+                    )
+                    if result["rows"]:
+                        export_csv(result, str(csv_path))
+                        record["csv"] = str(csv_path.relative_to(self.output_dir))
+        except Exception as e:
+            record.update(status="db_error", error=f"❌ Database error: {e}")
+        record["timings"]["db_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._log(record)
+        return record
+
+    def _log(self, record: dict):
+        """Append an executed query to the telemetry log."""
+        if self.telemetry is None:
+            return
+        timings = record["timings"]
+        llm = None
+        if timings["llm_ms"] is not None:
+            llm = {
+                "model": record["model"],
+                "llm_ms": timings["llm_ms"],
+                "ttft_ms": timings["ttft_ms"],
+                "prompt_tokens": record["prompt_tokens"],
+                "completion_tokens": record["completion_tokens"],
+                "tokens_estimated": record["tokens_estimated"],
+            }
+        result = {
+            "success": record["status"] == "ok",
+            "row_count": record["rows"],
+            "truncated": record["truncated"],
+            "execution_time_ms": timings["db_ms"],
+            "error": record["error"],
+        }
+        self.telemetry.record(
+            record["sql"], result, question=record["question"], llm=llm,
+            sql_source="llm" if llm else "given", streamed=self.full,
+            total_ms=round(sum(timings[stage] or 0 for stage in ("llm_ms", "validation_ms", "db_ms")), 1),
+        )
+
+    # ── Run ───────────────────────────────────────────────────
+
+    def run(self, items: list[dict]) -> dict:
+        """Process every item; write results.jsonl and summary.json. Returns the summary."""
+        (self.output_dir / "csv").mkdir(parents=True, exist_ok=True)
+        records = []
+        db_futures = []
+        wall_start = time.perf_counter()
+
+        db_pool = ThreadPoolExecutor(self.db_concurrency, thread_name_prefix="batch-db")
+
+        def after_generate(future):
+            record = future.result()
+            if record["status"] == "generated":
+                db_futures.append(db_pool.submit(self._execute, record))
+            else:
+                records.append(record)
+
+        with ThreadPoolExecutor(self.llm_concurrency, thread_name_prefix="batch-llm") as llm_pool:
+            for item in items:
+                llm_pool.submit(self._generate, item).add_done_callback(after_generate)
+        # Callbacks run on the LLM workers, so every DB job is queued by now
+        db_pool.shutdown(wait=True)
+        records.extend(f.result() for f in db_futures)
+        records.sort(key=lambda r: r["index"])
+
+        wall_ms = round((time.perf_counter() - wall_start) * 1000, 1)
+        with open(self.output_dir / "results.jsonl", "w", encoding="utf-8") as f:
+            for record in records:
+                out = {k: v for k, v in record.items() if k != "index"}
+                f.write(json.dumps(out, ensure_ascii=False, default=str) + "\n")
+
+        summary = self.summarize(records, wall_ms)
+        with open(self.output_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def summarize(self, records: list[dict], wall_ms: float) -> dict:
+        """Status counts and per-stage latency percentiles."""
+        statuses = {}
+        for record in records:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+
+        stages = {}
+        for stage in STAGES:
+            values = [r["timings"][stage] for r in records if r["timings"][stage] is not None]
+            stages[stage] = {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": max(values) if values else None,
+            }
+
+        return {
+            "questions": len(records),
+            "statuses": statuses,
+            "wall_ms": wall_ms,
+            "questions_per_s": round(len(records) / (wall_ms / 1000), 2) if wall_ms else None,
+            "rows": sum(r["rows"] or 0 for r in records),
+            "llm_concurrency": self.llm_concurrency,
+            "db_concurrency": self.db_concurrency,
+            "model": self.engine.models[self.model_id]["name"],
+            "stages": stages,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in batch")
+    parser.add_argument("input", help="JSONL file of {id, question} or {id, sql} items")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for results")
+    parser.add_argument("--llm-concurrency", type=int, default=4,
+                        help="Max LLM requests in flight (default 4)")
+    parser.add_argument("--db-concurrency", type=int, default=None,
+                        help="Max queries in flight (default DB_POOL_MAX)")
+    parser.add_argument("--model", type=int, default=None, help="Model to use (1 or 2)")
+    parser.add_argument("--full", action="store_true",
+                        help="Stream complete results to CSV (no 500-row cap)")
+    parser.add_argument("--cost-guard", action="store_true",
+                        help="Skip queries whose EXPLAIN estimate exceeds COST_GUARD_* limits")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Verbose logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    if not args.verbose:
+        # One INFO line per HTTP request from the OpenAI client is noise here
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    items = load_questions(args.input)
+    log.info(f"Loaded {len(items)} items from {args.input}")
+
+    db_params = get_db_params()
+    pool_config = get_pool_config()
+    if args.db_concurrency:
+        pool_config["max_size"] = max(pool_config["max_size"], args.db_concurrency)
+    executor = SafeExecutor(db_params, **pool_config)
+
+    schema_context, retriever = "", None
+    if any(item.get("question") for item in items):
+        schema_meta = get_schema_metadata(db_params, include_samples=True)
+        schema_context = render_schema_context(schema_meta, include_samples=True)
+        retriever = SchemaRetriever(schema_meta) if os.getenv("SCHEMA_RETRIEVAL", "1") != "0" else None
+    engine = NLEngine(get_env_config(), schema_context, schema_retriever=retriever)
+
+    guard = None
+    if args.cost_guard:
+        guard = CostGuard(**(get_cost_guard_config() or {}))
+
+    log_path = get_log_path()
+    runner = BatchRunner(
+        engine, executor, args.output_dir,
+        llm_concurrency=args.llm_concurrency,
+        db_concurrency=args.db_concurrency,
+        model_id=args.model,
+        full=args.full,
+        guard=guard,
+        telemetry=TelemetryLog(log_path, source="batch") if log_path else None,
+    )
+    try:
+        summary = runner.run(items)
+    finally:
+        executor.close()
+
+    log.info(f"Done in {summary['wall_ms'] / 1000:.1f}s — {summary['statuses']}")
+    for stage, stats in summary["stages"].items():
+        if stats["count"]:
+            log.info(f"  {stage:<14} p50 {stats['p50']:>9.1f}  p95 {stats['p95']:>9.1f}  max {stats['max']:>9.1f}")
+    log.info(f"Results written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
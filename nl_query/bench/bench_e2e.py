@@ -0,0 +1,290 @@
+"""
+End-to-End Latency Benchmark
+Drives the CLI's question path: NLEngine.ask → extract_sql →
+SafeExecutor.execute → display_results. Reports time to first token,
+time to SQL and end-to-end latency percentiles.
+
+By default the model is the bundled stub (stub_llm_server.py), started
+in-process, so runs are reproducible in CI and on air-gapped hosts.
+--llm-url points at an already running OpenAI-compatible server instead,
+and --live uses the NVIDIA NIM endpoints from .env. Queries run against
+the database configured in .env (DB_HOST, DB_NAME, ...). Streamed tokens
+and rendered tables go to /dev/null, but their cost is still measured.
+
+As in the CLI, a query is started speculatively (app.Speculation) as soon
+as the answer's ```sql block closes, and its result is reused when the
+final answer's SQL matches; time to SQL is then the moment the fence
+closed, time to result is when the speculative query finished, and
+Execute is only the wait left after the stream ends.
+--no-speculate executes after the full answer instead, for comparison.
+
+Each question starts from an empty conversation history, so every
+iteration sends the same prompt. The executor and its prepared
+statements stay warm across iterations, as they do in a CLI session.
+
+Usage:
+    cd nl_query
+    python bench/bench_e2e.py
+    python bench/bench_e2e.py --iterations 10 --ttft-ms 400 --token-delay-ms 30
+    python bench/bench_e2e.py --questions questions.jsonl --json baseline.json
+    python bench/bench_e2e.py --no-speculate
+    python bench/bench_e2e.py --live --model 2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from app import Speculation, get_db_params, get_env_config, get_pool_config
+from db_executor import SafeExecutor
+from formatter import console, display_results
+from nl_engine import NLEngine
+from query_jobs import JobManager
+from schema_introspect import get_schema_metadata, render_schema_context
+from schema_retriever import SchemaRetriever
+from stub_llm_server import StubLLM, load_script, start_in_thread
+
+# Matches the built-in stub script; any questions work against a live model
+DEFAULT_QUESTIONS = [
+    "What is the sector allocation across all funds?",
+    "Top 10 holdings by market value",
+    "Which funds have the largest portfolios?",
+    "How has the total market value changed month over month?",
+    "How many funds does each AMC have?",
+]
+
+# (key, label) of the reported latencies
+METRICS = (
+    ("ttft_ms", "Time to first token"),
+    ("sql_ms", "Time to SQL"),
+    ("result_ms", "Time to result"),
+    ("e2e_ms", "End-to-end"),
+    ("llm_ms", "  LLM stream"),
+    ("extract_ms", "  SQL extraction"),
+    ("execute_ms", "  Execute"),
+    ("render_ms", "  Render"),
+)
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def load_questions(path: Optional[str]) -> list[str]:
+    """Questions from a .jsonl ({"question": ...} per line) or .txt file."""
+    if not path:
+        return DEFAULT_QUESTIONS
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return questions
+
+
+def run_once(engine: NLEngine, executor: SafeExecutor, question: str, sink,
+             jobs: Optional[JobManager] = None) -> dict:
+    """
+    One question through the full path; times in ms. With jobs, the SQL
+    starts speculatively while the explanation streams.
+    """
+    engine.clear_history()
+    speculation = Speculation(executor, jobs, None, question) if jobs is not None else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        response = engine.ask(question, on_sql=speculation.start if speculation else None)
+    asked = time.perf_counter()
+    call = engine.last_call or {}
+
+    sql = engine.extract_sql(response) if response else None
+    extracted = time.perf_counter()
+    job = speculation.take(sql) if speculation is not None and sql else None
+    record = {
+        "question": question,
+        "ttft_ms": call.get("ttft_ms"),
+        "llm_ms": round((asked - start) * 1000, 1),
+        "extract_ms": round((extracted - asked) * 1000, 3),
+        "sql_ms": call.get("sql_ms") or round((extracted - start) * 1000, 1),
+        "speculative": job is not None,
+        "result_ms": None,
+        "execute_ms": None,
+        "db_ms": None,
+        "render_ms": None,
+        "e2e_ms": None,
+        "rows": None,
+        "error": None,
+    }
+    if not sql:
+        if speculation is not None:
+            speculation.cancel()
+        record["error"] = response[:200] if response else "empty response"
+        return record
+
+    if job is not None:
+        job.wait()
+        if job.error is not None:
+            record["error"] = str(job.error)
+            return record
+        result = job.result
+    else:
+        result = executor.execute(sql)
+    executed = time.perf_counter()
+    display_results(result, title=question[:80])
+    rendered = time.perf_counter()
+    if job is not None:
+        # The job started when the SQL block closed, not when the stream ended
+        result_ms = record["sql_ms"] + job.elapsed_s * 1000
+    else:
+        result_ms = (executed - start) * 1000
+    record.update(
+        result_ms=round(result_ms, 1),
+        execute_ms=round((executed - extracted) * 1000, 1),
+        db_ms=result["execution_time_ms"],
+        render_ms=round((rendered - executed) * 1000, 1),
+        e2e_ms=round((rendered - start) * 1000, 1),
+        rows=result["row_count"],
+        error=None if result["success"] else result["error"],
+    )
+    return record
+
+
+def summarize(records: list[dict]) -> dict:
+    """Percentiles per metric over successful runs."""
+    ok = [r for r in records if not r["error"]]
+    summary = {
+        "runs": len(records),
+        "failures": len(records) - len(ok),
+        "speculative": sum(1 for r in ok if r.get("speculative")),
+        "latency": {},
+    }
+    for key, _ in METRICS:
+        values = [r[key] for r in ok if r[key] is not None]
+        summary["latency"][key] = {
+            "count": len(values),
+            "mean": round(statistics.fmean(values), 1) if values else None,
+            "p50": _percentile(values, 50),
+            "p90": _percentile(values, 90),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+    return summary
+
+
+def format_summary(summary: dict) -> str:
+    def ms(value):
+        return "—" if value is None else f"{value:,.1f}"
+
+    lines = [
+        f"{summary['runs']} runs, {summary['failures']} failed, "
+        f"{summary['speculative']} executed while the answer streamed",
+        "",
+        f"  {'(ms)':<22} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}",
+    ]
+    for key, label in METRICS:
+        s = summary["latency"][key]
+        if s["count"]:
+            lines.append(
+                f"  {label:<22} {ms(s['p50']):>9} {ms(s['p90']):>9} "
+                f"{ms(s['p95']):>9} {ms(s['p99']):>9} {ms(s['max']):>9}"
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end NL → SQL → result latency benchmark")
+    parser.add_argument("--questions", default=None, help="Questions file (.jsonl or one per line)")
+    parser.add_argument("--iterations", type=int, default=5, help="Passes over the questions (default 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unreported passes first (default 1)")
+    parser.add_argument("--model", type=int, choices=(1, 2), default=None, help="Model to use (default DEFAULT_MODEL)")
+    parser.add_argument("--live", action="store_true", help="Use the configured NVIDIA NIM endpoints")
+    parser.add_argument("--llm-url", default=None, help="Running OpenAI-compatible server (e.g. http://127.0.0.1:8001/v1)")
+    parser.add_argument("--script", default=None, help="Answer script for the in-process stub")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="Stub delay before the first token (default 300)")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="Stub delay between tokens (default 20)")
+    parser.add_argument("--no-speculate", action="store_true",
+                        help="Execute only after the full answer has streamed")
+    parser.add_argument("--json", default=None, help="Write the summary and every run to this file")
+    args = parser.parse_args()
+
+    env_config = get_env_config()
+    stub_server = None
+    if not args.live:
+        llm_url = args.llm_url
+        if llm_url is None:
+            stub = StubLLM(
+                load_script(args.script) if args.script else None,
+                ttft_ms=args.ttft_ms, token_delay_ms=args.token_delay_ms,
+            )
+            stub_server, llm_url = start_in_thread(stub)
+        for suffix in ("", "_2"):
+            env_config[f"NVIDIA_NIM_API_URL{suffix}"] = llm_url
+            env_config[f"NVIDIA_NIM_API_KEY{suffix}"] = env_config.get(f"NVIDIA_NIM_API_KEY{suffix}") or "stub"
+    if args.model:
+        env_config["DEFAULT_MODEL"] = str(args.model)
+    env_config["DEFAULT_MODEL"] = env_config.get("DEFAULT_MODEL") or "1"
+
+    db_params = get_db_params()
+    schema_meta = get_schema_metadata(db_params, include_samples=True)
+    retriever = SchemaRetriever(schema_meta) if os.getenv("SCHEMA_RETRIEVAL", "1") != "0" else None
+    engine = NLEngine(
+        env_config, render_schema_context(schema_meta, include_samples=True),
+        schema_retriever=retriever,
+    )
+    executor = SafeExecutor(db_params, **get_pool_config())
+    questions = load_questions(args.questions)
+    jobs = None if args.no_speculate else JobManager()
+
+    target = "live NIM" if args.live else (args.llm_url or f"stub (ttft {args.ttft_ms:.0f}ms, {args.token_delay_ms:.0f}ms/token)")
+    mode = "after the stream" if args.no_speculate else "speculative"
+    print(f"{len(questions)} questions × {args.iterations} iterations — "
+          f"{engine.get_active_model_info()} via {target}, execution {mode}")
+
+    records = []
+    with open(os.devnull, "w", encoding="utf-8") as sink:
+        console_file = console.file
+        console.file = sink
+        try:
+            for i in range(args.warmup + args.iterations):
+                for question in questions:
+                    record = run_once(engine, executor, question, sink, jobs)
+                    if i >= args.warmup:
+                        records.append(record)
+        finally:
+            console.file = console_file
+            executor.close()
+            if stub_server is not None:
+                stub_server.shutdown()
+
+    summary = summarize(records)
+    print(format_summary(summary))
+    for record in records:
+        if record["error"]:
+            print(f"  ✗ {record['question'][:60]}: {record['error'][:120]}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": target, "mode": mode, "summary": summary, "runs": records}, f, indent=2, default=str)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Startup Benchmark
+Import-time profile (python -X importtime) of the CLI and the time until
+its prompt appears.
+
+For each module the child interpreter's importtime log is parsed and the
+median cumulative import time over --runs fresh processes is reported,
+with the heaviest imports underneath it. Time to prompt launches
+`python app.py` and stops the clock when "📝 You:" is written; the schema
+and model clients load in the background, so no database or API needs to
+answer for the prompt to show.
+
+Usage:
+    cd nl_query
+    python bench/import_profile.py
+    python bench/import_profile.py --runs 10 --top 25 --module app --module openai
+    python bench/import_profile.py --no-prompt
+"""
+
+import argparse
+import os
+import selectors
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+NL_QUERY_DIR = Path(__file__).resolve().parent.parent
+
+PROMPT = "📝 You:".encode("utf-8")
+
+
+def import_profile(module: str, python: str = sys.executable) -> list[tuple[int, int, int, str]]:
+    """
+    (self_us, cumulative_us, depth, name) per import of module in a fresh
+    interpreter, in the order -X importtime reports them.
+    """
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=NL_QUERY_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-1000:]}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(fields[0]), int(fields[1]), depth, name.strip()))
+    return entries
+
+
+def total_ms(entries, module: str) -> float:
+    """Cumulative import time of the top-level module."""
+    for _, cumulative, depth, name in entries:
+        if depth == 0 and name == module:
+            return cumulative / 1000
+    return 0.0
+
+
+def heaviest(entries, top: int) -> list[tuple[float, float, str]]:
+    """(cumulative_ms, self_ms, name) of the slowest imports, slowest first."""
+    ranked = sorted(entries, key=lambda e: e[1], reverse=True)
+    return [(c / 1000, s / 1000, name) for s, c, _, name in ranked[:top]]
+
+
+def time_to_prompt(python: str = sys.executable, timeout_s: float = 60) -> float:
+    """Milliseconds from launching app.py until its prompt is written."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [python, "app.py"], cwd=NL_QUERY_DIR,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        env=dict(os.environ, PYTHONUNBUFFERED="1"),
+    )
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ)
+    output = b""
+    try:
+        while PROMPT not in output:
+            remaining = timeout_s - (time.perf_counter() - start)
+            if remaining <= 0 or not selector.select(remaining):
+                raise TimeoutError(f"No prompt after {timeout_s:.0f}s")
+            chunk = os.read(proc.stdout.fileno(), 65536)
+            if not chunk:
+                tail = output.decode("utf-8", "replace")[-500:]
+                raise RuntimeError(f"app.py exited before showing the prompt:\n{tail}")
+            output += chunk
+        return (time.perf_counter() - start) * 1000
+    finally:
+        selector.close()
+        try:
+            proc.communicate(b"/quit\n", timeout=10)
+        except (subprocess.TimeoutExpired, OSError):
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and time-to-prompt benchmark for the NL CLI")
+    parser.add_argument("--module", action="append", default=None,
+                        help="Module to profile (repeatable; default: app and openai)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement (default 5)")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest imports to list (default 15)")
+    parser.add_argument("--no-prompt", action="store_true", help="Skip the time-to-prompt measurement")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to benchmark")
+    args = parser.parse_args()
+
+    modules = args.module or ["app", "openai"]
+    print(f"Import time (-X importtime, median of {args.runs} runs)")
+    profiles = {}
+    for module in modules:
+        runs = [import_profile(module, args.python) for _ in range(args.runs)]
+        totals = [total_ms(entries, module) for entries in runs]
+        median = statistics.median(totals)
+        # List the heaviest imports from the run closest to the median
+        profiles[module] = min(runs, key=lambda entries: abs(total_ms(entries, module) - median))
+        print(f"  {module:<20} {median:>9.1f}ms   (min {min(totals):.1f}, max {max(totals):.1f})")
+
+    first = modules[0]
+    print(f"\nHeaviest imports under {first} (cumulative / self):")
+    for cumulative, self_ms, name in heaviest(profiles[first], args.top):
+        print(f"  {cumulative:>9.1f}ms {self_ms:>8.1f}ms  {name}")
+
+    if not args.no_prompt:
+        timings = [time_to_prompt(args.python) for _ in range(args.runs)]
+        print(f"\nTime to prompt (python app.py, median of {args.runs} runs): "
+              f"{statistics.median(timings):.0f}ms   (min {min(timings):.0f}, max {max(timings):.0f})")
+
+
+if __name__ == "__main__":
+    main()
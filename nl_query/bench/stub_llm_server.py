@@ -0,0 +1,338 @@
+"""
+Stub LLM Server
+Local OpenAI-compatible chat-completions endpoint with scripted answers,
+for benchmarking NLEngine without NVIDIA NIM (CI, air-gapped hosts).
+
+Speaks POST /v1/chat/completions (streamed as server-sent events with
+chunked transfer encoding, or a single JSON body) and GET /v1/models.
+Each answer is picked from a script by matching the last user message,
+then streamed one word (with its leading whitespace) per chunk: the first
+after --ttft-ms, the rest --token-delay-ms apart. When the request asks
+for stream_options.include_usage a final usage chunk follows, with prompt
+tokens estimated at 4 characters each.
+
+A script is a JSON list of entries:
+    {"match": "sector",             regex on the last user message (optional)
+     "content": "```sql ...```",    the answer
+     "reasoning": "...",            streamed first as reasoning_content (optional)
+     "ttft_ms": 300,                per-entry timing overrides (optional)
+     "token_delay_ms": 20}
+The first entry whose match is found wins; entries without "match" answer
+everything else in turn. Without --script the built-in SCRIPT is used; its
+SQL runs against the mutual fund schema.
+
+Usage:
+    cd nl_query
+    python bench/stub_llm_server.py --port 8001 --ttft-ms 300 --token-delay-ms 20
+    NVIDIA_NIM_API_URL=http://127.0.0.1:8001/v1 NVIDIA_NIM_API_KEY=stub python app.py
+"""
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+_EXPLANATION = (
+    " This query uses the latest report date in portfolio_holdings and joins"
+    " the master tables for readable names. Values are summed in lakhs and"
+    " rounded to two decimals, and the result is ordered so the largest"
+    " positions come first."
+)
+
+SCRIPT = [
+    {
+        "match": r"ready",
+        "content": "Hello, I am ready!",
+    },
+    {
+        "match": r"sector",
+        "content": """```sql
+SELECT COALESCE(ph.sector_at_time, sm.current_sector) AS sector,
+       ROUND(SUM(ph.market_value_lakhs), 2) AS total_value_lakhs,
+       COUNT(DISTINCT ph.security_id) AS securities
+FROM portfolio_holdings ph
+JOIN security_master sm ON ph.security_id = sm.security_id
+WHERE ph.report_date = (SELECT MAX(report_date) FROM portfolio_holdings)
+GROUP BY 1
+ORDER BY total_value_lakhs DESC
+LIMIT 15;
+```
+Sector allocation across all funds for the latest month.""" + _EXPLANATION,
+    },
+    {
+        "match": r"\b(top|largest|biggest)\b",
+        "content": """```sql
+SELECT sm.security_name, sm.isin,
+       ROUND(SUM(ph.market_value_lakhs), 2) AS total_value_lakhs,
+       COUNT(DISTINCT ph.fund_id) AS fund_count
+FROM portfolio_holdings ph
+JOIN security_master sm ON ph.security_id = sm.security_id
+WHERE ph.report_date = (SELECT MAX(report_date) FROM portfolio_holdings)
+GROUP BY sm.security_name, sm.isin
+ORDER BY total_value_lakhs DESC
+LIMIT 10;
+```
+The ten largest holdings across all funds.""" + _EXPLANATION,
+    },
+    {
+        "match": r"\b(month|monthly|trend|over time)\b",
+        "content": """```sql
+SELECT ph.report_date,
+       COUNT(*) AS holdings,
+       ROUND(SUM(ph.market_value_lakhs), 2) AS total_value_lakhs
+FROM portfolio_holdings ph
+GROUP BY ph.report_date
+ORDER BY ph.report_date;
+```
+Holdings count and total market value for every reported month.""" + _EXPLANATION,
+    },
+    {
+        "match": r"\b(funds?|schemes?)\b",
+        "content": """```sql
+SELECT fm.scheme_name,
+       COUNT(*) AS holdings,
+       ROUND(SUM(ph.market_value_lakhs), 2) AS total_value_lakhs
+FROM portfolio_holdings ph
+JOIN fund_master fm ON ph.fund_id = fm.fund_id
+WHERE ph.report_date = (SELECT MAX(report_date) FROM portfolio_holdings)
+GROUP BY fm.scheme_name
+ORDER BY total_value_lakhs DESC
+LIMIT 20;
+```
+Funds ranked by the market value of their latest portfolio.""" + _EXPLANATION,
+    },
+    {
+        "content": """```sql
+SELECT am.amc_name, COUNT(fm.fund_id) AS funds
+FROM amc_master am
+LEFT JOIN fund_master fm ON fm.amc_id = am.amc_id
+GROUP BY am.amc_name
+ORDER BY funds DESC;
+```
+Number of funds per AMC.""" + _EXPLANATION,
+    },
+]
+
+_TOKEN_RE = re.compile(r"\s*\S+|\s+$")
+
+
+def _tokens(text: str) -> list[str]:
+    """Stream chunks: each word with the whitespace before it."""
+    return _TOKEN_RE.findall(text) or [text]
+
+
+class StubLLM:
+    """Scripted answers and timing shared by every request handler."""
+
+    def __init__(self, script: Optional[list] = None, ttft_ms: float = 300,
+                 token_delay_ms: float = 20, usage: bool = True):
+        """
+        Args:
+            script: entries as described in the module docstring (default SCRIPT)
+            ttft_ms: delay before the first chunk
+            token_delay_ms: delay between later chunks
+            usage: send a usage chunk when the client asks for one
+        """
+        self.script = script if script is not None else SCRIPT
+        self.ttft_ms = ttft_ms
+        self.token_delay_ms = token_delay_ms
+        self.usage = usage
+        self._patterns = [
+            (re.compile(entry["match"], re.IGNORECASE), entry)
+            for entry in self.script if entry.get("match")
+        ]
+        fallbacks = [entry for entry in self.script if not entry.get("match")]
+        self._fallbacks = itertools.cycle(fallbacks or [{"content": "I can only answer scripted questions."}])
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.disconnects = 0
+
+    def pick(self, messages: list) -> dict:
+        """Script entry answering the last user message."""
+        question = next(
+            (m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        with self._lock:
+            self.requests += 1
+            for pattern, entry in self._patterns:
+                if pattern.search(question):
+                    return entry
+            return next(self._fallbacks)
+
+
+def _chunk(model: str, delta: dict, finish_reason: Optional[str] = None) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _usage(messages: list, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub: StubLLM = None
+    verbose = False
+
+    def log_message(self, fmt, *args):
+        if self.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, body):
+        payload = body if isinstance(body, str) else json.dumps(body)
+        self._write_chunk(f"data: {payload}\n\n".encode("utf-8"))
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {
+                "object": "list",
+                "data": [{"id": "stub", "object": "model", "owned_by": "stub"}],
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {"error": {"message": "Body must be JSON"}})
+            return
+
+        stub = self.stub
+        messages = request.get("messages") or []
+        model = request.get("model") or "stub"
+        entry = stub.pick(messages)
+        ttft_s = entry.get("ttft_ms", stub.ttft_ms) / 1000
+        delay_s = entry.get("token_delay_ms", stub.token_delay_ms) / 1000
+        reasoning = _tokens(entry["reasoning"]) if entry.get("reasoning") else []
+        content = _tokens(entry["content"])
+
+        if not request.get("stream"):
+            time.sleep(ttft_s + delay_s * (len(reasoning) + len(content) - 1))
+            message = {"role": "assistant", "content": entry["content"]}
+            if reasoning:
+                message["reasoning_content"] = entry["reasoning"]
+            self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": _usage(messages, len(reasoning) + len(content)),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._send_event(_chunk(model, {"role": "assistant", "content": ""}))
+            pieces = [("reasoning_content", t) for t in reasoning] + [("content", t) for t in content]
+            for i, (field, token) in enumerate(pieces):
+                time.sleep(ttft_s if i == 0 else delay_s)
+                self._send_event(_chunk(model, {field: token}))
+            self._send_event(_chunk(model, {}, finish_reason="stop"))
+            if stub.usage and (request.get("stream_options") or {}).get("include_usage"):
+                self._send_event({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": _usage(messages, len(pieces)),
+                })
+            self._send_event("[DONE]")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream early (cancelled or got what it needed)
+            with stub._lock:
+                stub.disconnects += 1
+            self.close_connection = True
+
+
+def make_server(stub: StubLLM, host: str = "127.0.0.1", port: int = 8001,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    """HTTP server answering from stub; port 0 picks a free port."""
+    handler = type("StubHandler", (_Handler,), {"stub": stub, "verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(stub: StubLLM, host: str = "127.0.0.1", port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """Serve from a daemon thread. Returns (server, base_url ending in /v1)."""
+    server = make_server(stub, host, port)
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def load_script(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    if not isinstance(script, list) or not all(isinstance(e, dict) and "content" in e for e in script):
+        raise ValueError(f"{path}: expected a JSON list of entries with a 'content' field")
+    return script
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM with scripted streaming answers")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8001, help="Port (default 8001)")
+    parser.add_argument("--script", default=None, help="JSON script of answers (default: built-in)")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="Delay before the first token (default 300)")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="Delay between tokens (default 20)")
+    parser.add_argument("--no-usage", action="store_true", help="Never send a usage chunk")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    stub = StubLLM(
+        load_script(args.script) if args.script else None,
+        ttft_ms=args.ttft_ms, token_delay_ms=args.token_delay_ms, usage=not args.no_usage,
+    )
+    server = make_server(stub, args.host, args.port, verbose=args.verbose)
+    print(f"Stub LLM on http://{args.host}:{server.server_address[1]}/v1 "
+          f"({len(stub.script)} scripted answers, ttft {args.ttft_ms:.0f}ms, "
+          f"{args.token_delay_ms:.0f}ms/token)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Cost Guard
+Checks the planner's estimate for generated SQL before it runs.
+
+validate_query() only looks at keywords, so a cartesian join or an
+unfiltered scan of portfolio_holdings passes and then holds a shared
+connection until statement_timeout. The guard reads EXPLAIN (FORMAT JSON)
+for the query, compares the plan's total cost and estimated result rows
+with configurable thresholds, and names the nodes that account for most of
+the cost. A rejected plan can be handed back to the model for a rewrite.
+"""
+
+# Verdicts, in increasing severity
+OK = "ok"
+WARN = "warn"
+REJECT = "reject"
+
+# Scans of relations estimated above this many rows are worth flagging
+BIG_SCAN_ROWS = 10_000
+
+# Nodes below this share of the total cost are not reported
+MIN_NODE_SHARE = 0.10
+
+
+def _walk(node: dict, depth: int = 0):
+    """Yield (node, depth) for a plan node and all its descendants."""
+    yield node, depth
+    for child in node.get("Plans", []):
+        yield from _walk(child, depth + 1)
+
+
+def _self_cost(node: dict) -> float:
+    """Node's own cost: its total minus what its children already cost."""
+    children = sum(c.get("Total Cost", 0) for c in node.get("Plans", []))
+    return max(0.0, node.get("Total Cost", 0) - children)
+
+
+def _describe(node: dict) -> str:
+    """Short label like 'Seq Scan on portfolio_holdings (ph)'."""
+    label = node["Node Type"]
+    if node.get("Join Type"):
+        label += f" ({node['Join Type']})"
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+        alias = node.get("Alias")
+        if alias and alias != node["Relation Name"]:
+            label += f" ({alias})"
+    return label
+
+
+def _problems(node: dict) -> list[str]:
+    """Known-bad shapes: cartesian joins and unfiltered scans of big tables."""
+    problems = []
+    node_type = node["Node Type"]
+    if node_type == "Nested Loop" and "Join Filter" not in node:
+        # No join filter and no parameterised inner side → every outer row
+        # pairs with every inner row
+        inner_parameterised = any(
+            "Index Cond" in n or "Recheck Cond" in n or "Filter" in n
+            for child in node.get("Plans", [])[1:]
+            for n, _ in _walk(child)
+        )
+        if not inner_parameterised:
+            problems.append("no join condition (cartesian product)")
+    if (
+        node_type in ("Seq Scan", "Parallel Seq Scan")
+        and "Filter" not in node
+        and node.get("Plan Rows", 0) >= BIG_SCAN_ROWS
+    ):
+        problems.append(f"reads all ~{node['Plan Rows']:,} rows (no filter)")
+    return problems
+
+
+class CostGuard:
+    """Classifies EXPLAIN plans as ok / warn / reject against thresholds."""
+
+    def __init__(
+        self,
+        warn_cost: float = 200_000,
+        max_cost: float = 2_000_000,
+        warn_rows: int = 100_000,
+        max_rows: int = 5_000_000,
+    ):
+        """
+        Args:
+            warn_cost / max_cost: planner total-cost thresholds
+            warn_rows / max_rows: estimated result-row thresholds
+        """
+        self.warn_cost = warn_cost
+        self.max_cost = max_cost
+        self.warn_rows = warn_rows
+        self.max_rows = max_rows
+
+    def assess(self, plan: list) -> dict:
+        """
+        Assess EXPLAIN (FORMAT JSON) output.
+
+        Returns dict with:
+        - verdict: "ok" | "warn" | "reject"
+        - total_cost: float
+        - plan_rows: int (estimated result rows)
+        - reasons: list of threshold messages
+        - nodes: list of {node, self_cost, share, rows, problems} for the
+          expensive or suspicious nodes, most expensive first
+        """
+        root = plan[0]["Plan"]
+        total_cost = root.get("Total Cost", 0.0)
+        plan_rows = root.get("Plan Rows", 0)
+
+        verdict = OK
+        reasons = []
+        if total_cost >= self.max_cost:
+            verdict = REJECT
+            reasons.append(f"estimated cost {total_cost:,.0f} ≥ limit {self.max_cost:,.0f}")
+        elif total_cost >= self.warn_cost:
+            verdict = WARN
+            reasons.append(f"estimated cost {total_cost:,.0f} ≥ warning level {self.warn_cost:,.0f}")
+        if plan_rows >= self.max_rows:
+            verdict = REJECT
+            reasons.append(f"~{plan_rows:,} result rows ≥ limit {self.max_rows:,}")
+        elif plan_rows >= self.warn_rows:
+            if verdict == OK:
+                verdict = WARN
+            reasons.append(f"~{plan_rows:,} result rows ≥ warning level {self.warn_rows:,}")
+
+        nodes = []
+        for node, _ in _walk(root):
+            own = _self_cost(node)
+            share = own / total_cost if total_cost else 0.0
+            problems = _problems(node)
+            if share >= MIN_NODE_SHARE or problems:
+                nodes.append({
+                    "node": _describe(node),
+                    "self_cost": round(own, 1),
+                    "share": round(share, 3),
+                    "rows": node.get("Plan Rows", 0),
+                    "problems": problems,
+                })
+        nodes.sort(key=lambda n: -n["self_cost"])
+
+        # A cartesian product is never intended, even when it is cheap today
+        if verdict == OK and any(
+            "cartesian" in p for n in nodes for p in n["problems"]
+        ):
+            verdict = WARN
+            reasons.append("plan contains a join without a join condition")
+
+        return {
+            "verdict": verdict,
+            "total_cost": total_cost,
+            "plan_rows": plan_rows,
+            "reasons": reasons,
+            "nodes": nodes,
+        }
+
+
+def format_report(report: dict, max_nodes: int = 5) -> str:
+    """Human-readable summary of a CostGuard.assess() report."""
+    lines = [
+        f"  Estimated cost {report['total_cost']:,.0f}, ~{report['plan_rows']:,} rows",
+    ]
+    for reason in report["reasons"]:
+        lines.append(f"  • {reason}")
+    if report["nodes"]:
+        lines.append("  Expensive nodes:")
+        for n in report["nodes"][:max_nodes]:
+            detail = f"{n['share'] * 100:.0f}% of cost, ~{n['rows']:,} rows"
+            if n["problems"]:
+                detail += " — " + "; ".join(n["problems"])
+            lines.append(f"    {n['node']}: {detail}")
+    return "\n".join(lines)
+
+
+def rewrite_request(sql: str, report: dict) -> str:
+    """Follow-up message asking the model to rewrite a query the guard flagged."""
+    return (
+        "The query below was blocked before execution because the PostgreSQL "
+        "planner estimates it is too expensive for a shared database.\n\n"
+        f"```sql\n{sql}\n```\n\n"
+        f"Planner report:\n{format_report(report)}\n\n"
+        "Rewrite it to answer the same question cheaply: add the missing join "
+        "conditions, filter on report_date / amc / fund where the question "
+        "allows, aggregate before joining, and add a LIMIT. Return the new "
+        "query in a ```sql code block."
+    )
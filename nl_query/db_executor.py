@@ -2,13 +2,165 @@
 Safe SQL Executor
 Validates and executes SQL queries with safety checks and timeouts.
 Only allows read-only (SELECT / WITH) queries.
+
+Queries run on a pool of warm sessions opened with statement_timeout and
+default_transaction_read_only already set, so a query pays for execution
+only, not TCP + auth + backend startup.
+
+With read endpoints configured (DB_READ_HOSTS), queries go to the
+least-loaded replica that answers its health check and carries the
+primary's etl_data_version stamp; the primary (where the loader writes)
+serves them only when no replica qualifies. Health and freshness are
+checked on a background thread, never on the thread running a query.
+tests/test_replica_routing.py exercises the routing against two local servers.
 """
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
+import psycopg2.pool
 import re
+import threading
 import time
-from typing import Optional
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sql_template import TemplateStats, canonicalize, statement_name
+
+
+def make_queries_interruptible():
+    """
+    Route libpq waits through Python so Ctrl-C in the main thread sends a
+    cancel request for the running query (like pg_cancel_backend) instead
+    of blocking until the statement finishes. Process-wide.
+    """
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
+
+class QueryProgress:
+    """
+    Live state of one running query, shared between the thread executing it
+    and a thread that watches (spinner) or cancels it.
+    """
+    
+    def __init__(self):
+        self.rows_fetched = 0
+        self.cancelled = False
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def attach(self, conn):
+        """Bind the connection the query runs on so cancel() can reach it."""
+        with self._lock:
+            self._conn = conn
+    
+    def detach(self):
+        """Unbind before the connection goes back to the pool."""
+        with self._lock:
+            self._conn = None
+    
+    def cancel(self):
+        """Ask the server to cancel the statement in progress, if any."""
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None and not self._conn.closed:
+                self._conn.cancel()
+
+
+class ResultStream:
+    """Rows of a server-side (named) cursor, fetched in batches on demand."""
+    
+    def __init__(self, cursor, first_batch: list, started: float,
+                 progress: Optional[QueryProgress] = None):
+        self._cursor = cursor
+        self._first_batch = first_batch
+        self._started = started
+        self._progress = progress
+        self.columns = [desc[0] for desc in cursor.description or []]
+        self.type_codes = [desc[1] for desc in cursor.description or []]
+        self.first_batch_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.row_count = 0
+    
+    def batches(self) -> Iterator[list]:
+        """Yield row batches until the cursor is exhausted."""
+        batch, self._first_batch = self._first_batch, None
+        while batch:
+            self.row_count += len(batch)
+            if self._progress is not None:
+                self._progress.rows_fetched = self.row_count
+            yield batch
+            batch = self._cursor.fetchmany(self._cursor.itersize)
+    
+    @property
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the query was sent."""
+        return round((time.perf_counter() - self._started) * 1000, 1)
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """A pooled session carrying its own bookkeeping, so state never outlives it."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        # Prepared statement names on this session, least recently used first
+        self.prepared: OrderedDict = OrderedDict()
+
+
+class _WarmPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that keeps every returned session open.
+    
+    The stock pool closes a returned connection once minconn are idle, so
+    with DB_POOL_MIN=1 a burst of queries reconnects on every checkout after
+    the first. Here up to maxconn idle sessions stay warm; minconn only
+    controls how many are opened up front.
+    """
+    
+    def _putconn(self, conn, key=None, close=False):
+        if self.closed:
+            raise psycopg2.pool.PoolError("connection pool is closed")
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise psycopg2.pool.PoolError("trying to put unkeyed connection")
+        
+        if close or conn.closed or len(self._pool) >= self.maxconn:
+            conn.close()
+        else:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                # Server connection lost
+                conn.close()
+            else:
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._pool.append(conn)
+        
+        del self._used[key]
+        del self._rused[id(conn)]
+
+
+class _Endpoint:
+    """Connection pool and routing state for one server (primary or replica)."""
+    
+    def __init__(self, name: str, conn_params: dict, max_size: int):
+        self.name = name
+        self.conn_params = conn_params
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # getconn() raises when exhausted; the semaphore makes callers wait instead
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.in_flight = 0
+        
+        # Replica health / freshness, refreshed every REPLICA_CHECK_S;
+        # out of rotation until the first check passes
+        self.usable = False
+        self.data_version: Optional[int] = None
+        self.checked_at = 0.0
+        self.check_lock = threading.Lock()
 
 
 class SafeExecutor:
@@ -24,16 +176,346 @@ class SafeExecutor:
     # Max rows to return
     MAX_ROWS = 500
     
+    # Rows per round trip when streaming through a server-side cursor
+    STREAM_BATCH_ROWS = 1000
+    
     # Query timeout in milliseconds
     QUERY_TIMEOUT_MS = 30_000
     
-    def __init__(self, conn_params: dict):
+    # Pooled sessions idle longer than this are pinged before reuse
+    HEALTH_CHECK_IDLE_S = 30
+    
+    # Max seconds to wait for a free pooled connection
+    POOL_WAIT_S = 30
+    
+    # A query shape is prepared server-side from its Nth execution on
+    PREPARE_AFTER = 2
+    
+    # SQLSTATEs of EXECUTE failing to bind a lifted literal to its inferred
+    # type (invalid input syntax, bad datetime, out of range, type mismatch)
+    _BIND_ERRORS = {"22P02", "22007", "22008", "22003", "42804"}
+    
+    # Prepared statements kept per pooled session (least recently used go)
+    MAX_PREPARED_PER_CONN = 64
+    
+    # Seconds between replica health / data-version checks
+    REPLICA_CHECK_S = 5
+    
+    # libpq connect timeout for replicas, so a dead host fails over quickly
+    REPLICA_CONNECT_TIMEOUT_S = 3
+    
+    # How long a replica check waits for a primary session to read its version
+    PRIMARY_VERSION_WAIT_S = 1
+    
+    def __init__(self, conn_params: dict, min_size: int = 1, max_size: int = 4,
+                 use_prepared: bool = True, read_endpoints: Optional[list[dict]] = None):
+        """
+        Args:
+            conn_params: primary database (psycopg2.connect keyword arguments)
+            min_size / max_size: pooled sessions per endpoint
+            use_prepared: run repeated query templates as prepared statements
+            read_endpoints: connection params of read replicas; queries prefer
+                these and fall back to the primary
+        """
         self.conn_params = conn_params
+        self.use_prepared = use_prepared
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        
+        self._primary = _Endpoint("primary", conn_params, self.max_size)
+        self._replicas = [
+            _Endpoint(
+                f"replica {params.get('host')}:{params.get('port', 5432)}",
+                {"connect_timeout": self.REPLICA_CONNECT_TIMEOUT_S, **params},
+                self.max_size,
+            )
+            for params in read_endpoints or []
+        ]
+        self._load_lock = threading.Lock()
+        
+        self._monitor_stop = threading.Event()
+        self._monitor = None
+        if self._replicas:
+            self._monitor = threading.Thread(
+                target=self._monitor_replicas, name="replica-monitor", daemon=True
+            )
+            self._monitor.start()
+        
+        # Templates PREPARE rejected (per-session names live on the connection)
+        self._unpreparable: set[str] = set()
+        self.template_stats = TemplateStats()
+    
+    # ── Connection pool ───────────────────────────────────────
+    
+    def _session_options(self, conn_params: dict) -> str:
+        """libpq options applied once per pooled session."""
+        opts = [
+            f"-c statement_timeout={self.QUERY_TIMEOUT_MS}",
+            "-c default_transaction_read_only=on",
+        ]
+        if conn_params.get("options"):
+            opts.insert(0, conn_params["options"])
+        return " ".join(opts)
+    
+    def _get_pool(self, endpoint: _Endpoint) -> _WarmPool:
+        """Create an endpoint's pool on first use."""
+        if endpoint.pool is None:
+            with endpoint.pool_lock:
+                if endpoint.pool is None:
+                    params = dict(
+                        endpoint.conn_params,
+                        options=self._session_options(endpoint.conn_params),
+                        connection_factory=_PooledConnection,
+                    )
+                    endpoint.pool = _WarmPool(self.min_size, self.max_size, **params)
+        return endpoint.pool
+    
+    def _is_healthy(self, conn) -> bool:
+        """Cheap liveness check; pings only connections idle for a while."""
+        if conn.closed:
+            return False
+        idle = time.monotonic() - conn.last_used
+        if idle < self.HEALTH_CHECK_IDLE_S:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def _discard(self, conn, endpoint: _Endpoint):
+        """Close a broken connection and drop it from the pool."""
+        try:
+            self._get_pool(endpoint).putconn(conn, close=True)
+        except psycopg2.pool.PoolError:
+            pass
+    
+    def _acquire(self, endpoint: _Endpoint, wait_s: Optional[float] = None):
+        """Take a slot and a healthy autocommit connection from an endpoint."""
+        wait_s = self.POOL_WAIT_S if wait_s is None else wait_s
+        if not endpoint.slots.acquire(timeout=wait_s):
+            raise psycopg2.pool.PoolError(
+                f"No database connection available after {wait_s}s"
+            )
+        with self._load_lock:
+            endpoint.in_flight += 1
+        conn = None
+        try:
+            pool = self._get_pool(endpoint)
+            conn = pool.getconn()
+            if not conn.closed and not conn.autocommit:
+                # Each query is its own read-only transaction; nothing idles open
+                conn.autocommit = True
+            if not self._is_healthy(conn):
+                self._discard(conn, endpoint)
+                conn = pool.getconn()
+                conn.autocommit = True
+            return conn
+        except BaseException:
+            if conn is not None:
+                self._discard(conn, endpoint)
+            self._leave(endpoint)
+            raise
+    
+    def _release(self, endpoint: _Endpoint, conn, broken: bool = False):
+        """Return (or, if broken, close) a connection and free its slot."""
+        try:
+            if broken:
+                self._discard(conn, endpoint)
+            else:
+                conn.last_used = time.monotonic()
+                self._get_pool(endpoint).putconn(conn)
+        finally:
+            self._leave(endpoint)
+    
+    def _leave(self, endpoint: _Endpoint):
+        with self._load_lock:
+            endpoint.in_flight -= 1
+        endpoint.slots.release()
+    
+    @contextmanager
+    def connection(self, read: bool = False):
+        """
+        Check out a healthy pooled connection.
+        
+        read=True routes to the least-loaded usable read replica, or to the
+        primary when there is none (or the chosen replica cannot be reached);
+        otherwise the primary is used.
+        
+        Broken connections (closed, failed ping, or an OperationalError /
+        InterfaceError raised while in use) are closed instead of returned.
+        A cancelled statement (timeout, Ctrl-C, /cancel) leaves the session
+        healthy, so it goes back to the pool with its prepared statements.
+        """
+        endpoint = self._route() if read else self._primary
+        try:
+            conn = self._acquire(endpoint)
+        except (psycopg2.Error, psycopg2.pool.PoolError):
+            if endpoint is self._primary:
+                raise
+            self._mark_unusable(endpoint)
+            endpoint = self._primary
+            conn = self._acquire(endpoint)
+        try:
+            yield conn
+        except psycopg2.extensions.QueryCanceledError:
+            # Subclasses OperationalError, but the session is fine
+            broken = bool(conn.closed)
+            if not broken and not conn.autocommit:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            if broken:
+                self._release(endpoint, conn, broken=True)
+                conn = None
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self._release(endpoint, conn, broken=True)
+            conn = None
+            if endpoint is not self._primary:
+                self._mark_unusable(endpoint)
+            raise
+        finally:
+            if conn is not None:
+                self._release(endpoint, conn)
+    
+    def close(self):
+        """Stop replica checks and close every pooled connection."""
+        self._monitor_stop.set()
+        for endpoint in [self._primary, *self._replicas]:
+            with endpoint.pool_lock:
+                if endpoint.pool is not None:
+                    endpoint.pool.closeall()
+                    endpoint.pool = None
+    
+    # ── Read replicas ─────────────────────────────────────────
+    
+    def _route(self) -> _Endpoint:
+        """Least-loaded usable replica, or the primary if none qualifies."""
+        if not self._replicas:
+            return self._primary
+        usable = [endpoint for endpoint in self._replicas if endpoint.usable]
+        if not usable:
+            return self._primary
+        return min(usable, key=lambda endpoint: endpoint.in_flight)
+    
+    def _mark_unusable(self, endpoint: _Endpoint):
+        """Take a replica out of rotation until its next check."""
+        endpoint.usable = False
+        endpoint.checked_at = time.monotonic()
+    
+    def _monitor_replicas(self):
+        """Background loop: check every replica each REPLICA_CHECK_S."""
+        while not self._monitor_stop.is_set():
+            self.check_replicas()
+            self._monitor_stop.wait(self.REPLICA_CHECK_S)
+    
+    def check_replicas(self):
+        """Check every replica now (the monitor thread does this periodically)."""
+        try:
+            primary_version = self._primary_data_version()
+            primary_known = True
+        except (psycopg2.Error, psycopg2.pool.PoolError):
+            primary_version, primary_known = None, False
+        for endpoint in self._replicas:
+            self._check_replica(endpoint, primary_version, primary_known)
+    
+    def _primary_data_version(self) -> Optional[int]:
+        """
+        The primary's data version, waiting at most PRIMARY_VERSION_WAIT_S for
+        a session. Raises if the primary cannot be read (e.g. pool saturated).
+        """
+        conn = self._acquire(self._primary, wait_s=self.PRIMARY_VERSION_WAIT_S)
+        broken = False
+        try:
+            with conn.cursor() as cur:
+                return self._read_data_version(cur)
+        except psycopg2.Error:
+            broken = True
+            raise
+        finally:
+            self._release(self._primary, conn, broken=broken)
+    
+    def _check_replica(self, endpoint: _Endpoint, primary_version: Optional[int],
+                       primary_known: bool = True):
+        """
+        Ping a replica and compare its data-version stamp with the primary's.
+        A replica that is unreachable or behind the primary is not used.
+        When the primary's version could not be read, a reachable replica
+        keeps its previous state rather than being trusted blindly.
+        """
+        # The monitor and an explicit check_replicas() call take turns
+        endpoint.check_lock.acquire()
+        try:
+            try:
+                conn = self._acquire(endpoint, wait_s=1)
+            except psycopg2.pool.PoolError:
+                # Every session busy: alive, freshness unchanged
+                return
+            except psycopg2.Error:
+                endpoint.usable = False
+                return
+            broken = False
+            try:
+                with conn.cursor() as cur:
+                    endpoint.data_version = self._read_data_version(cur)
+            except psycopg2.Error:
+                broken = True
+                endpoint.usable = False
+                return
+            finally:
+                self._release(endpoint, conn, broken=broken)
+            if not primary_known:
+                return
+            endpoint.usable = primary_version is None or (
+                endpoint.data_version is not None and endpoint.data_version >= primary_version
+            )
+        finally:
+            endpoint.checked_at = time.monotonic()
+            endpoint.check_lock.release()
+    
+    def endpoint_status(self) -> list[dict]:
+        """Routing state per endpoint, primary first (for health reports)."""
+        status = [{"name": self._primary.name, "in_flight": self._primary.in_flight}]
+        for endpoint in self._replicas:
+            status.append({
+                "name": endpoint.name,
+                "in_flight": endpoint.in_flight,
+                "usable": endpoint.usable,
+                "data_version": endpoint.data_version,
+            })
+        return status
+    
+    @staticmethod
+    def _read_data_version(cur) -> Optional[int]:
+        cur.execute("SELECT to_regclass('etl_data_version') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("SELECT version FROM etl_data_version WHERE id = 1")
+        row = cur.fetchone()
+        return row[0] if row else None
     
-    def validate_query(self, sql: str) -> tuple[bool, str]:
+    def get_data_version(self) -> Optional[int]:
+        """
+        Current loader data-version stamp (etl_data_version) on the primary,
+        or None if the table does not exist yet or the database is unreachable.
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cur:
+                return self._read_data_version(cur)
+        except (psycopg2.Error, psycopg2.pool.PoolError):
+            return None
+    
+    @classmethod
+    def validate_query(cls, sql: str) -> tuple[bool, str]:
         """
         Validate a SQL query for safety.
         Returns (is_valid, message).
+        
+        A classmethod, so SQL from outside a session (e.g. the loader's
+        pinned snapshots) can be checked without connecting.
         """
         if not sql or not sql.strip():
             return False, "Empty query"
@@ -51,7 +533,7 @@ class SafeExecutor:
             return False, "Only SELECT and WITH (CTE) queries are allowed"
         
         # Check for blocked keywords (word boundary match)
-        for kw in self._BLOCKED_KEYWORDS:
+        for kw in cls._BLOCKED_KEYWORDS:
             pattern = rf'\b{kw}\b'
             if re.search(pattern, upper):
                 return False, f"Blocked keyword detected: {kw}. Only read-only queries allowed."
@@ -64,13 +546,134 @@ class SafeExecutor:
         
         return True, "Query is valid"
     
-    def execute(self, sql: str) -> dict:
+    def explain(self, sql: str) -> list:
+        """
+        Planner estimate for a validated query, as EXPLAIN (FORMAT JSON)
+        output. Nothing is executed. Raises ValueError if validation fails.
+        """
+        is_valid, message = self.validate_query(sql)
+        if not is_valid:
+            raise ValueError(f"⛔ {message}")
+        
+        with self.connection(read=True) as conn, conn.cursor() as cur:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {sql.strip().rstrip(';')}")
+            return cur.fetchone()[0]
+    
+    @contextmanager
+    def stream(self, sql: str, batch_size: Optional[int] = None,
+               progress: Optional[QueryProgress] = None):
+        """
+        Run a validated query through a named server-side cursor.
+        
+        Yields a ResultStream whose batches() pulls rows from the server as
+        they are consumed, with no MAX_ROWS cap and constant client memory.
+        Raises ValueError if the query fails validation. A progress object,
+        if given, counts fetched rows and can cancel from another thread.
+        """
+        is_valid, message = self.validate_query(sql)
+        if not is_valid:
+            raise ValueError(f"⛔ {message}")
+        
+        with self.connection(read=True) as conn:
+            # Named cursors live inside a transaction
+            conn.autocommit = False
+            cur = conn.cursor(name=f"nlq_stream_{uuid.uuid4().hex[:12]}")
+            cur.itersize = batch_size or self.STREAM_BATCH_ROWS
+            if progress is not None:
+                progress.attach(conn)
+            try:
+                start = time.perf_counter()
+                cur.execute(sql)
+                first_batch = cur.fetchmany(cur.itersize)
+                yield ResultStream(cur, first_batch, start, progress)
+            finally:
+                if progress is not None:
+                    progress.detach()
+                if not conn.closed:
+                    try:
+                        cur.close()
+                        conn.rollback()
+                    finally:
+                        conn.autocommit = True
+    
+    def _execute_prepared(self, conn, cur, template: str, params: list, sql: str) -> bool:
+        """
+        Run a template through a prepared statement on this session, preparing
+        it on first use. Returns True if the prepared statement ran, False if
+        the original sql ran instead: the template cannot be prepared (e.g. a
+        parameter type PostgreSQL cannot infer), a lifted literal does not
+        bind, or the statement went stale. Errors of the query itself raise.
+        """
+        name = statement_name(template)
+        if name in self._unpreparable:
+            cur.execute(sql)
+            return False
+        
+        prepared = conn.prepared
+        if name not in prepared:
+            try:
+                self._prepare(cur, prepared, name, template)
+            except (psycopg2.ProgrammingError, psycopg2.DataError):
+                self._unpreparable.add(name)
+                cur.execute(sql)
+                return False
+        prepared.move_to_end(name)
+        
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {name}"
+        try:
+            try:
+                cur.execute(execute, params or None)
+            except psycopg2.errors.InvalidSqlStatementName:
+                # The session lost it (DEALLOCATE ALL, DISCARD, a pooler
+                # handing out another backend): forget it and prepare again
+                prepared.pop(name, None)
+                self._prepare(cur, prepared, name, template)
+                cur.execute(execute, params or None)
+        except psycopg2.NotSupportedError:
+            # "cached plan must not change result type": a table or view under
+            # it changed shape (holdings_fact swap, matview rebuild). Drop the
+            # statement; it is prepared afresh on next use.
+            prepared.pop(name, None)
+            cur.execute(f"DEALLOCATE {name}")
+            cur.execute(sql)
+            return False
+        except (psycopg2.ProgrammingError, psycopg2.DataError) as e:
+            if e.pgcode not in self._BIND_ERRORS:
+                # Raised while running (e.g. division by zero): the query's own error
+                raise
+            # A lifted literal that may not fit the inferred parameter type.
+            # The original SQL decides; if it fails too, that is the real error.
+            cur.execute(sql)
+            self._unpreparable.add(name)
+            return False
+        return True
+    
+    def _prepare(self, cur, prepared: OrderedDict, name: str, template: str):
+        """PREPARE a template on this session, evicting the least recently used."""
+        cur.execute(f"PREPARE {name} AS {template}")
+        prepared[name] = True
+        while len(prepared) > self.MAX_PREPARED_PER_CONN:
+            old, _ = prepared.popitem(last=False)
+            try:
+                cur.execute(f"DEALLOCATE {old}")
+            except psycopg2.errors.InvalidSqlStatementName:
+                pass
+    
+    def execute(self, sql: str, progress: Optional[QueryProgress] = None) -> dict:
         """
         Execute a validated SQL query and return results.
         
+        Pass a QueryProgress to run it from a worker thread: the caller can
+        then watch rows_fetched and cancel() the statement on the server.
+        
+        The query is canonicalized into a template (sql_template); repeated
+        templates run as server-side prepared statements so their plans are
+        reused, and every run is recorded in template_stats.
+        
         Returns dict with:
         - success: bool
         - columns: list of column names
+        - type_codes: list of column type OIDs (successful SELECTs only)
         - rows: list of tuples
         - row_count: int
         - truncated: bool (if rows exceeded MAX_ROWS)
@@ -90,49 +693,74 @@ class SafeExecutor:
                 "error": f"⛔ {message}",
             }
         
-        conn = None
+        start = time.perf_counter()
         try:
-            conn = psycopg2.connect(**self.conn_params)
-            cur = conn.cursor()
-            
-            # Set statement timeout
-            cur.execute(f"SET statement_timeout = {self.QUERY_TIMEOUT_MS}")
-            
-            # Execute
-            start = time.perf_counter()
-            cur.execute(sql)
-            elapsed_ms = (time.perf_counter() - start) * 1000
-            
-            # Fetch results
-            if cur.description is None:
+            with self.connection(read=True) as conn, conn.cursor() as cur:
+                if progress is not None:
+                    progress.attach(conn)
+                    if progress.cancelled:
+                        raise psycopg2.extensions.QueryCanceledError("cancelled before start")
+                
+                # Execute
+                template, params = canonicalize(sql)
+                start = time.perf_counter()
+                try:
+                    if (self.use_prepared
+                            and self.template_stats.seen(template) + 1 >= self.PREPARE_AFTER):
+                        prepared = self._execute_prepared(conn, cur, template, params, sql)
+                    else:
+                        prepared = False
+                        cur.execute(sql)
+                finally:
+                    if progress is not None:
+                        progress.detach()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self.template_stats.record(template, elapsed_ms, prepared)
+                
+                # Fetch results
+                if cur.description is None:
+                    return {
+                        "success": True,
+                        "columns": [],
+                        "rows": [],
+                        "row_count": 0,
+                        "truncated": False,
+                        "execution_time_ms": round(elapsed_ms, 1),
+                        "error": None,
+                    }
+                
+                columns = [desc[0] for desc in cur.description]
+                type_codes = [desc[1] for desc in cur.description]
+                rows = cur.fetchmany(self.MAX_ROWS + 1)
+                
+                truncated = len(rows) > self.MAX_ROWS
+                if truncated:
+                    rows = rows[:self.MAX_ROWS]
+                if progress is not None:
+                    progress.rows_fetched = len(rows)
+                
                 return {
                     "success": True,
-                    "columns": [],
-                    "rows": [],
-                    "row_count": 0,
-                    "truncated": False,
+                    "columns": columns,
+                    "type_codes": type_codes,
+                    "rows": rows,
+                    "row_count": len(rows),
+                    "truncated": truncated,
                     "execution_time_ms": round(elapsed_ms, 1),
                     "error": None,
                 }
-            
-            columns = [desc[0] for desc in cur.description]
-            rows = cur.fetchmany(self.MAX_ROWS + 1)
-            
-            truncated = len(rows) > self.MAX_ROWS
-            if truncated:
-                rows = rows[:self.MAX_ROWS]
-            
-            return {
-                "success": True,
-                "columns": columns,
-                "rows": rows,
-                "row_count": len(rows),
-                "truncated": truncated,
-                "execution_time_ms": round(elapsed_ms, 1),
-                "error": None,
-            }
         
         except psycopg2.extensions.QueryCanceledError:
+            if progress is not None and progress.cancelled:
+                return {
+                    "success": False,
+                    "columns": [],
+                    "rows": [],
+                    "row_count": 0,
+                    "truncated": False,
+                    "execution_time_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "error": "🛑 Query cancelled.",
+                }
             return {
                 "success": False,
                 "columns": [],
@@ -152,9 +780,6 @@ class SafeExecutor:
                 "execution_time_ms": 0,
                 "error": f"❌ Database error: {e}",
             }
-        finally:
-            if conn:
-                conn.close()
 
 
 if __name__ == "__main__":
@@ -190,3 +815,11 @@ if __name__ == "__main__":
     print(f"  Columns: {result['columns']}")
     print(f"  Rows: {result['rows']}")
     print(f"  Time: {result['execution_time_ms']}ms")
+    
+    # Test pooled reuse
+    print("\nTest 4 - Pooled reuse:")
+    for i in range(3):
+        start = time.perf_counter()
+        executor.execute("SELECT 1")
+        print(f"  Run {i + 1}: {(time.perf_counter() - start) * 1000:.1f}ms round trip")
+    executor.close()
@@ -0,0 +1,108 @@
+"""
+Conversation History
+Compact per-session memory of question → SQL turns for follow-up questions.
+
+Full assistant responses (and GLM-4.7 reasoning) are not replayed. Each
+turn keeps the question, the final SQL and a one-line result summary such
+as "12 rows × 3 columns (scheme_name, total_value, pct)"; text-only
+answers are kept truncated. Replay is capped by an estimated token budget
+instead of a turn count, so the prompt for a follow-up stays the same size
+however long the session gets.
+"""
+
+from typing import Optional
+
+# Rough tokens-per-character ratio for budgeting (no tokenizer needed)
+CHARS_PER_TOKEN = 4
+
+# Text-only answers are cut to this many characters in the replay
+MAX_TEXT_ANSWER_CHARS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a message."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def summarize_result(result: dict) -> str:
+    """One-line summary of a SafeExecutor result dict."""
+    if not result.get("success"):
+        error = (result.get("error") or "error").splitlines()[0]
+        return f"failed: {error[:100]}"
+    columns = result.get("columns") or []
+    names = ", ".join(columns[:8]) + (", ..." if len(columns) > 8 else "")
+    rows = f"{result.get('row_count', 0)}{'+' if result.get('truncated') else ''} rows"
+    return f"{rows} × {len(columns)} columns ({names})"
+
+
+class ConversationHistory:
+    """Question / SQL / result-summary turns, replayed within a token budget."""
+
+    def __init__(self, token_budget: int = 1500):
+        """
+        Args:
+            token_budget: estimated tokens of history replayed per request
+        """
+        self.token_budget = token_budget
+        self.turns: list[dict] = []
+
+    def add(self, question: str, response: str, sql: Optional[str] = None):
+        """Record a turn; the response is only kept if it carried no SQL."""
+        answer = None
+        if not sql:
+            answer = response.strip()
+            if len(answer) > MAX_TEXT_ANSWER_CHARS:
+                answer = answer[:MAX_TEXT_ANSWER_CHARS - 3] + "..."
+        self.turns.append({"question": question, "sql": sql, "answer": answer, "summary": None})
+
+    def set_result_summary(self, question: str, summary: str, sql: Optional[str] = None):
+        """
+        Attach a result summary to the latest turn for this question. sql,
+        if given, replaces the turn's SQL with the query that produced it
+        (after an edit or a cost-guard rewrite).
+        """
+        for turn in reversed(self.turns):
+            if turn["question"] == question:
+                turn["summary"] = summary
+                if sql:
+                    turn["sql"] = sql.strip().rstrip(";")
+                    turn["answer"] = None
+                return
+
+    def last_question(self) -> Optional[str]:
+        return self.turns[-1]["question"] if self.turns else None
+
+    @staticmethod
+    def _assistant_text(turn: dict) -> str:
+        if not turn["sql"]:
+            return turn["answer"] or ""
+        text = f"```sql\n{turn['sql']}\n```"
+        if turn["summary"]:
+            text += f"\nResult: {turn['summary']}"
+        return text
+
+    def messages(self, token_budget: Optional[int] = None) -> list[dict]:
+        """
+        Chat messages for the newest turns that fit the token budget,
+        oldest first. The latest turn is always included.
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        picked = []
+        used = 0
+        for turn in reversed(self.turns):
+            pair = [
+                {"role": "user", "content": turn["question"]},
+                {"role": "assistant", "content": self._assistant_text(turn)},
+            ]
+            cost = sum(estimate_tokens(m["content"]) for m in pair)
+            if picked and used + cost > budget:
+                break
+            picked[:0] = pair
+            used += cost
+        return picked
+
+    def clear(self):
+        self.turns.clear()
+
+    def __len__(self) -> int:
+        return len(self.turns)
@@ -0,0 +1,484 @@
+"""
+Intent Router
+Answers the most common question shapes from vetted SQL templates without
+calling the model:
+
+    top_holdings      "Top 10 holdings of Axis Nifty 500 Index Fund in Jan 2025"
+    holdings_count    "How many holdings does Axis have?"  /  "holdings per AMC"
+    sector_mix        "Sector allocation of Axis Consumption Fund"
+    holdings_changes  "New stocks bought by Axis in March 2025"  /  "exited securities"
+
+Fund and AMC names are resolved against fund_master / amc_master (reloaded
+when the loader bumps the data version), so the SQL filters on ids and
+report_date and stays on the (report_date, fund_id) and holdings_change
+indexes. Dates like "Jan 2025", "2025-01" or "2025-01-31" map to that
+month's report date; without one, the latest report date is used.
+
+Routing is deliberately conservative: every word of the question has to be
+an entity, a date, or part of the intent's vocabulary. Anything else —
+follow-ups, extra filters, unknown fund names — falls through to the model.
+So do groupings ("per fund", "each month", "by scheme"), which no template
+answers except holdings_count's per-AMC counts.
+"""
+
+import calendar
+import re
+import threading
+import time
+from datetime import date
+from typing import Optional
+
+from query_cache import is_follow_up
+
+# Rows returned when the question gives no "top N"
+DEFAULT_LIMIT = 10
+DEFAULT_CHANGES_LIMIT = 50
+MAX_LIMIT = 500
+
+_MONTHS = {
+    name: i
+    for i in range(1, 13)
+    for name in (calendar.month_name[i].lower(), calendar.month_abbr[i].lower())
+}
+_MONTHS["sept"] = 9
+
+_MONTH_RE = "|".join(sorted(_MONTHS, key=len, reverse=True))
+
+# (pattern, groups) → (year, month) for each accepted date spelling
+_DATE_PATTERNS = [
+    re.compile(r"\b(?P<year>20\d{2})-(?P<month>\d{1,2})(?:-\d{1,2})?\b"),
+    # "Jan 2025", "January, 2025", "Jan-25", "Jan '25" (not "Jan 31")
+    re.compile(rf"\b(?P<mname>{_MONTH_RE})\.?(?:[\s,]*(?P<year>20\d{{2}})|\s*['-](?P<yy>\d{{2}}))\b"),
+    re.compile(r"\b(?P<month>\d{1,2})/(?P<year>20\d{2})\b"),
+]
+
+# Words that only say "the latest snapshot"
+_LATEST_WORDS = {"latest", "current", "currently", "recent", "now", "today", "as"}
+
+# Filler accepted in any routed question
+_COMMON_WORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "by", "to", "from", "with",
+    "me", "show", "list", "give", "get", "please", "what", "which", "whats",
+    "is", "are", "was", "were", "tell", "display", "find", "all", "across",
+    "its", "their", "does", "do", "did", "has", "have", "had", "held", "hold",
+    "holds", "month", "date", "report", "portfolio", "portfolios", "amc",
+    "amcs", "mutual", "fund", "funds", "scheme", "schemes", "house", "houses",
+    "s", "and", "during", "into", "out", "it",
+}
+
+# Words that split the answer into groups; only holdings_count accepts them
+_GROUPING_WORDS = {"per", "each", "every", "wise"}
+
+# Scheme-name words that users usually leave out
+_GENERIC_NAME_WORDS = {"fund", "mutual", "scheme", "plan", "the", "of", "direct", "regular", "growth", "option"}
+
+_TOP_RE = re.compile(r"\b(?:top|largest|biggest)\s+(\d{1,3})\b")
+_NUMBER_RE = re.compile(r"\b(\d{1,3})\s+(?:holdings?|stocks?|securities|positions?|companies)\b")
+_RANKS_FUNDS_RE = re.compile(r"\b(?:top|largest|biggest)\s+(?:\d{1,3}\s+)?(?:funds?|schemes?|amcs?)\b", re.IGNORECASE)
+
+# "per fund", "each month", "by scheme", "amc-wise" → the grouped noun
+_GROUPING_RE = re.compile(
+    r"\b(?:per|each|every|by)\s+(?:mutual\s+)?"
+    r"(fund\s+houses?|funds?|schemes?|amcs?|months?|quarters?|years?|dates?)\b"
+    r"|\b(funds?|schemes?|amcs?|months?)[\s-]*wise\b",
+    re.IGNORECASE,
+)
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9]+", text.lower().replace("’", "'").replace("'s", ""))
+
+
+def _month_end(year: int, month: int) -> Optional[date]:
+    if not 1 <= month <= 12:
+        return None
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def extract_date(text: str) -> tuple[Optional[date], str]:
+    """
+    Find a month reference in the question.
+
+    Returns (month-end date or None, text with the date removed).
+    """
+    lowered = text.lower()
+    for pattern in _DATE_PATTERNS:
+        m = pattern.search(lowered)
+        if not m:
+            continue
+        groups = m.groupdict()
+        year = int(groups["year"]) if groups["year"] else 2000 + int(groups["yy"])
+        month = _MONTHS[groups["mname"]] if groups.get("mname") else int(groups["month"])
+        report_date = _month_end(year, month)
+        if report_date is not None:
+            return report_date, lowered[:m.start()] + " " + lowered[m.end():]
+    return None, lowered
+
+
+def grouping(text: str) -> Optional[str]:
+    """
+    What the question groups its answer by: "amc" (fund houses too),
+    another noun such as "fund" or "month", or None.
+    """
+    m = _GROUPING_RE.search(text)
+    if not m:
+        return None
+    noun = (m.group(1) or m.group(2)).lower()
+    if noun.startswith("amc") or "house" in noun:
+        return "amc"
+    return noun.rstrip("s")
+
+
+def _find_phrase(words: list[str], phrase: tuple[str, ...]) -> Optional[int]:
+    """Start index of phrase as a contiguous run in words, or None."""
+    n = len(phrase)
+    for i in range(len(words) - n + 1):
+        if tuple(words[i:i + n]) == phrase:
+            return i
+    return None
+
+
+class IntentRouter:
+    """Maps common questions straight to vetted SQL templates."""
+
+    # Seconds between data-version checks
+    VERSION_TTL_S = 30
+
+    def __init__(self, executor):
+        """
+        Args:
+            executor: SafeExecutor used to load the fund / AMC catalog
+        """
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self._funds: dict[tuple[str, ...], list[dict]] = {}
+        self._amcs: dict[tuple[str, ...], dict] = {}
+        self._has_changes = False
+        self._has_current_view = False
+
+    # ── Catalog ───────────────────────────────────────────────
+
+    def _load(self):
+        """Read fund and AMC names and which optional tables exist."""
+        funds, amcs = {}, {}
+        with self.executor.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT amc_id, amc_name, short_code FROM amc_master")
+            for amc_id, amc_name, short_code in cur.fetchall():
+                amc = {"amc_id": amc_id, "name": amc_name}
+                name = [w for w in _words(amc_name) if w not in _GENERIC_NAME_WORDS]
+                for key in (tuple(name), tuple(_words(short_code or ""))):
+                    if key:
+                        amcs[key] = amc
+            cur.execute("SELECT fund_id, amc_id, scheme_name FROM fund_master")
+            for fund_id, amc_id, scheme_name in cur.fetchall():
+                key = tuple(w for w in _words(scheme_name) if w not in _GENERIC_NAME_WORDS)
+                if key:
+                    funds.setdefault(key, []).append(
+                        {"fund_id": fund_id, "amc_id": amc_id, "name": scheme_name}
+                    )
+            cur.execute(
+                "SELECT to_regclass('holdings_change') IS NOT NULL, "
+                "to_regclass('current_holdings') IS NOT NULL"
+            )
+            has_changes, has_current_view = cur.fetchone()
+
+        self._funds, self._amcs = funds, amcs
+        self._has_changes, self._has_current_view = has_changes, has_current_view
+        self._loaded = True
+
+    def _refresh(self):
+        """Load the catalog on first use and again after each loader run."""
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded and now - self._version_checked_at < self.VERSION_TTL_S:
+                return
+            self._version_checked_at = now
+            version = self.executor.get_data_version()
+            if not self._loaded or version != self._version:
+                self._load()
+                self._version = version
+
+    def _resolve(self, words: list[str]) -> tuple[Optional[dict], Optional[dict], list[str]]:
+        """
+        Longest fund name, else AMC name, mentioned in the question.
+
+        Returns (fund, amc, remaining words). A name shared by several funds
+        resolves to nothing so the model can ask which one.
+        """
+        best = None
+        for key, funds in self._funds.items():
+            if len(key) < 2 or (best and len(key) <= len(best[0])):
+                continue
+            start = _find_phrase(words, key)
+            if start is not None:
+                best = (key, funds, start)
+        if best:
+            key, funds, start = best
+            rest = words[:start] + words[start + len(key):]
+            if len(funds) > 1:
+                return None, None, words
+            return funds[0], None, rest
+
+        for key, amc in sorted(self._amcs.items(), key=lambda kv: -len(kv[0])):
+            start = _find_phrase(words, key)
+            if start is not None:
+                return None, amc, words[:start] + words[start + len(key):]
+        return None, None, words
+
+    # ── Routing ───────────────────────────────────────────────
+
+    def route(self, question: str) -> Optional[dict]:
+        """
+        Match a question to a canned query.
+
+        Returns dict with intent, sql and description, or None to fall
+        through to the model.
+        """
+        if is_follow_up(question):
+            return None
+        try:
+            self._refresh()
+        except Exception:
+            return None
+
+        report_date, text = extract_date(question)
+        if _RANKS_FUNDS_RE.search(text):
+            # "top funds by holdings" ranks funds, not securities
+            return None
+        limit = None
+        for pattern in (_TOP_RE, _NUMBER_RE):
+            m = pattern.search(text)
+            if m:
+                limit = min(int(m.group(1)), MAX_LIMIT)
+                text = text[:m.start(1)] + " " + text[m.end(1):]
+                break
+
+        group = grouping(text)
+        if group is not None and group != "amc":
+            # "top holdings of each fund" is not one global ranking
+            return None
+
+        fund, amc, words = self._resolve(_words(text))
+        words = set(words)
+
+        if group == "amc":
+            return self._holdings_count(words, fund, amc, report_date, limit, per_amc=True)
+        for intent in (self._holdings_changes, self._sector_mix, self._top_holdings, self._holdings_count):
+            routed = intent(words, fund, amc, report_date, limit)
+            if routed is not None:
+                return routed
+        return None
+
+    @staticmethod
+    def _only(words: set[str], vocabulary: set[str]) -> bool:
+        """True if every remaining word is filler or intent vocabulary."""
+        return not (words - _COMMON_WORDS - _LATEST_WORDS - vocabulary)
+
+    @staticmethod
+    def _scope_label(fund: Optional[dict], amc: Optional[dict], report_date: Optional[date]) -> str:
+        scope = fund["name"] if fund else amc["name"] if amc else "all AMCs"
+        when = report_date.strftime("%b %Y") if report_date else "latest report date"
+        return f"{scope}, {when}"
+
+    # ── Templates ─────────────────────────────────────────────
+
+    def _holdings_date(self, fund: Optional[dict], amc: Optional[dict], report_date: Optional[date]) -> str:
+        """report_date filter value: the requested month or the scope's latest snapshot."""
+        if report_date is not None:
+            return f"'{report_date.isoformat()}'"
+        if fund:
+            return f"(SELECT MAX(report_date) FROM portfolio_holdings WHERE fund_id = {fund['fund_id']})"
+        if amc:
+            return (
+                "(SELECT MAX(ph2.report_date) FROM portfolio_holdings ph2 "
+                f"JOIN fund_master fm2 ON ph2.fund_id = fm2.fund_id WHERE fm2.amc_id = {amc['amc_id']})"
+            )
+        return "(SELECT MAX(report_date) FROM portfolio_holdings)"
+
+    def _top_holdings(self, words, fund, amc, report_date, limit) -> Optional[dict]:
+        if not words & {"top", "largest", "biggest"}:
+            return None
+        if not words & {"holding", "holdings", "stock", "stocks", "securities", "security", "positions", "companies"}:
+            return None
+        vocabulary = {
+            "top", "largest", "biggest", "holding", "holdings", "stock", "stocks",
+            "securities", "security", "positions", "companies", "value", "market",
+            "size", "weight", "invested", "investments",
+        }
+        if not self._only(words, vocabulary):
+            return None
+        limit = limit or DEFAULT_LIMIT
+        on_date = self._holdings_date(fund, amc, report_date)
+
+        if fund:
+            sql = f"""SELECT ph.report_date, sm.security_name, sm.isin,
+       COALESCE(ph.sector_at_time, sm.current_sector) AS sector,
+       ph.quantity, ph.market_value_lakhs, ph.pct_portfolio
+FROM portfolio_holdings ph
+JOIN security_master sm ON ph.security_id = sm.security_id
+WHERE ph.fund_id = {fund['fund_id']}
+  AND ph.report_date = {on_date}
+ORDER BY ph.market_value_lakhs DESC
+LIMIT {limit}"""
+        else:
+            amc_join = ""
+            if amc:
+                amc_join = (
+                    "\nJOIN fund_master fm ON ph.fund_id = fm.fund_id"
+                    f"\n  AND fm.amc_id = {amc['amc_id']}"
+                )
+            sql = f"""SELECT ph.report_date, sm.security_name, sm.isin,
+       SUM(ph.market_value_lakhs) AS total_value_lakhs,
+       COUNT(DISTINCT ph.fund_id) AS fund_count
+FROM portfolio_holdings ph{amc_join}
+JOIN security_master sm ON ph.security_id = sm.security_id
+WHERE ph.report_date = {on_date}
+GROUP BY ph.report_date, sm.security_name, sm.isin
+ORDER BY total_value_lakhs DESC
+LIMIT {limit}"""
+        return {
+            "intent": "top_holdings",
+            "sql": sql,
+            "description": f"Top {limit} holdings — {self._scope_label(fund, amc, report_date)}",
+        }
+
+    def _holdings_count(self, words, fund, amc, report_date, limit,
+                        per_amc: bool = False) -> Optional[dict]:
+        if fund or limit:
+            return None
+        counting = words & {"many", "number", "count", "counts", "total"}
+        if not words & {"holding", "holdings", "positions"}:
+            # "count securities" is about security_master, not holdings
+            return None
+        if not (counting or per_amc):
+            return None
+        vocabulary = {"how", "many", "number", "count", "counts", "total", "holding",
+                      "holdings", "positions"}
+        if per_amc:
+            vocabulary |= _GROUPING_WORDS
+        if not self._only(words, vocabulary):
+            return None
+
+        if amc is None and report_date is None and self._has_current_view:
+            # Each AMC's own latest month, already joined
+            sql = """SELECT amc_name, report_date,
+       COUNT(*) AS holdings_count,
+       COUNT(DISTINCT fund_id) AS fund_count,
+       COUNT(DISTINCT security_id) AS security_count
+FROM current_holdings
+GROUP BY amc_name, report_date
+ORDER BY holdings_count DESC"""
+        else:
+            amc_filter = f"\n  AND fm.amc_id = {amc['amc_id']}" if amc else ""
+            sql = f"""SELECT am.amc_name, ph.report_date,
+       COUNT(*) AS holdings_count,
+       COUNT(DISTINCT ph.fund_id) AS fund_count,
+       COUNT(DISTINCT ph.security_id) AS security_count
+FROM portfolio_holdings ph
+JOIN fund_master fm ON ph.fund_id = fm.fund_id
+JOIN amc_master am ON fm.amc_id = am.amc_id
+WHERE ph.report_date = {self._holdings_date(None, amc, report_date)}{amc_filter}
+GROUP BY am.amc_name, ph.report_date
+ORDER BY holdings_count DESC"""
+        return {
+            "intent": "holdings_count",
+            "sql": sql,
+            "description": f"Holdings count — {self._scope_label(None, amc, report_date)}",
+        }
+
+    def _sector_mix(self, words, fund, amc, report_date, limit) -> Optional[dict]:
+        if not words & {"sector", "sectors", "sectoral"}:
+            return None
+        vocabulary = {
+            "sector", "sectors", "sectoral", "mix", "allocation", "allocations",
+            "breakdown", "exposure", "exposures", "distribution", "split",
+            "weight", "weights", "weightage", "composition", "wise", "how",
+            "spread", "invested", "value",
+        }
+        if not self._only(words, vocabulary) or limit:
+            return None
+
+        if fund:
+            scope_filter = f"ph.fund_id = {fund['fund_id']}"
+            amc_join = ""
+        elif amc:
+            scope_filter = f"fm.amc_id = {amc['amc_id']}"
+            amc_join = "\nJOIN fund_master fm ON ph.fund_id = fm.fund_id"
+        else:
+            scope_filter, amc_join = "TRUE", ""
+        sql = f"""SELECT COALESCE(ph.sector_at_time, sm.current_sector, 'Unclassified') AS sector,
+       COUNT(*) AS holdings,
+       SUM(ph.market_value_lakhs) AS value_lakhs,
+       ROUND(100 * SUM(ph.market_value_lakhs)
+             / NULLIF(SUM(SUM(ph.market_value_lakhs)) OVER (), 0), 2) AS pct_of_value
+FROM portfolio_holdings ph{amc_join}
+JOIN security_master sm ON ph.security_id = sm.security_id
+WHERE {scope_filter}
+  AND ph.report_date = {self._holdings_date(fund, amc, report_date)}
+GROUP BY 1
+ORDER BY value_lakhs DESC NULLS LAST"""
+        return {
+            "intent": "sector_mix",
+            "sql": sql,
+            "description": f"Sector mix — {self._scope_label(fund, amc, report_date)}",
+        }
+
+    def _holdings_changes(self, words, fund, amc, report_date, limit) -> Optional[dict]:
+        if not self._has_changes:
+            return None
+        entry_words = {"new", "added", "add", "adds", "entered", "entry", "entries", "bought",
+                       "buy", "buys", "initiated", "fresh"}
+        exit_words = {"exited", "exit", "exits", "sold", "sell", "sells", "removed", "dropped", "closed"}
+        change_types = []
+        if words & entry_words:
+            change_types.append("new")
+        if words & exit_words:
+            change_types.append("exited")
+        if not change_types:
+            return None
+        vocabulary = entry_words | exit_words | {
+            "securities", "security", "stocks", "stock", "holdings", "holding",
+            "positions", "position", "companies", "names", "or", "vs", "versus",
+            "last", "previous", "completely", "fully", "top", "largest", "biggest",
+        }
+        if not words & {"securities", "security", "stocks", "stock", "holdings", "holding",
+                        "positions", "position", "companies", "names"}:
+            return None
+        if not self._only(words, vocabulary):
+            return None
+        limit = limit or DEFAULT_CHANGES_LIMIT
+
+        if fund:
+            scope_filter = f"\n  AND hc.fund_id = {fund['fund_id']}"
+            latest = f"(SELECT MAX(report_date) FROM holdings_change WHERE fund_id = {fund['fund_id']})"
+        elif amc:
+            scope_filter = f"\n  AND fm.amc_id = {amc['amc_id']}"
+            latest = (
+                "(SELECT MAX(hc2.report_date) FROM holdings_change hc2 "
+                f"JOIN fund_master fm2 ON hc2.fund_id = fm2.fund_id WHERE fm2.amc_id = {amc['amc_id']})"
+            )
+        else:
+            scope_filter = ""
+            latest = "(SELECT MAX(report_date) FROM holdings_change)"
+        on_date = f"'{report_date.isoformat()}'" if report_date else latest
+        types = ", ".join(f"'{t}'" for t in change_types)
+        sql = f"""SELECT hc.report_date, hc.change_type, fm.scheme_name, sm.security_name, sm.isin,
+       hc.quantity_prev, hc.quantity_curr,
+       hc.value_prev_lakhs, hc.value_curr_lakhs
+FROM holdings_change hc
+JOIN fund_master fm ON hc.fund_id = fm.fund_id
+JOIN security_master sm ON hc.security_id = sm.security_id
+WHERE hc.report_date = {on_date}
+  AND hc.change_type IN ({types}){scope_filter}
+ORDER BY COALESCE(hc.value_curr_lakhs, hc.value_prev_lakhs) DESC NULLS LAST
+LIMIT {limit}"""
+        kind = " and ".join("entries" if t == "new" else "exits" for t in change_types)
+        return {
+            "intent": "holdings_changes",
+            "sql": sql,
+            "description": f"Position {kind} — {self._scope_label(fund, amc, report_date)}",
+        }
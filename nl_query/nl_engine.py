@@ -2,14 +2,22 @@
 Natural Language to SQL Engine
 Uses NVIDIA NIM API (OpenAI-compatible) to translate natural language
 questions into PostgreSQL queries. Supports dual-model switching.
+
+The openai package (with httpx and pydantic, most of the CLI's import
+time) is imported when the first client is built, not at module import.
 """
 
 import re
 import os
 import sys
+import threading
 import time
-from openai import OpenAI
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+from history import ConversationHistory, estimate_tokens, summarize_result
 
 _USE_COLOR = sys.stdout.isatty() and os.getenv("NO_COLOR") is None
 _THINKING_COLOR = "\033[90m" if _USE_COLOR else ""
@@ -45,26 +53,70 @@ DOMAIN KNOWLEDGE:
 - portfolio_holdings links to fund_master via fund_id and security_master via security_id
 - fund_sector_exposure, fund_monthly_metrics, fund_style_exposure_monthly link to fund_master via fund_id
 - cap_bucket values: 'Large Cap', 'Mid Cap', 'Small Cap', 'Micro Cap'
+- current_holdings (materialized view) = each AMC's latest-month holdings with amc_name, amc_short_code, scheme_name, isin, security_name and sector already joined. Prefer it over portfolio_holdings + joins for "latest"/"current" questions
+- holdings_fact (if present) = portfolio_holdings flattened with amc_short_code, scheme_name, isin, security_name and sector for every month. Prefer it for multi-month scans; filter on report_date ranges
 
 DATABASE SCHEMA:
 {schema}
 """
 
+# A fenced ```sql block; the SQL is group 1
+_SQL_BLOCK_RE = re.compile(r'```sql\s*\n?(.*?)\n?\s*```', re.DOTALL | re.IGNORECASE)
+
+
+class StreamingSQLExtractor:
+    """
+    Spots the first closed ```sql block while an answer is still streaming.
+    
+    The model writes its SQL block first and explains it afterwards, so the
+    query is complete well before the stream ends. feed() takes each answer
+    delta and returns the block's SQL once, on the delta that closes the
+    fence; otherwise None. Only deltas containing a backtick trigger a scan.
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.sql: Optional[str] = None
+    
+    def feed(self, delta: str) -> Optional[str]:
+        self.text += delta
+        if self.sql is not None or "`" not in delta:
+            return None
+        match = _SQL_BLOCK_RE.search(self.text)
+        if match is None or not match.group(1).strip():
+            return None
+        self.sql = match.group(1).strip()
+        return self.sql
+
 
 class NLEngine:
     """Natural Language to SQL translation engine with dual-model support."""
     
-    def __init__(self, env_config: dict, schema_context: str = ""):
+    def __init__(self, env_config: dict, schema_context: str = "", schema_retriever=None,
+                 history_token_budget: int = 1500):
         """
         Initialize with environment configuration.
         
         env_config should contain:
         - NVIDIA_NIM_API_KEY, NVIDIA_NIM_API_URL, NVIDIA_NIM_MODEL (model 1)
         - NVIDIA_NIM_API_KEY_2, NVIDIA_NIM_MODEL_2 (model 2)
+        - NVIDIA_NIM_API_URL_2 (optional; model 2 endpoint, defaults to model 1's)
         - DEFAULT_MODEL (1 or 2)
+        
+        If schema_retriever (a SchemaRetriever) is given, each question only
+        sends the relevant slice of the schema; schema_context is the fallback.
+        Follow-up context replays compact question / SQL / result turns up to
+        history_token_budget estimated tokens.
         """
         self.config = env_config
         self.schema_context = schema_context
+        self.schema_retriever = schema_retriever
+        
+        # Tables sent with the last question (None = full schema)
+        self.last_schema_tables = None
+        
+        # Model, latency and token usage of the last ask() / race() answer
+        self.last_call: Optional[dict] = None
         
         # Model configurations
         self.models = {
@@ -78,7 +130,8 @@ class NLEngine:
             2: {
                 "name": env_config.get("NVIDIA_NIM_MODEL_2", "z-ai/glm4.7"),
                 "api_key": env_config.get("NVIDIA_NIM_API_KEY_2", ""),
-                "api_url": env_config.get("NVIDIA_NIM_API_URL", "https://integrate.api.nvidia.com/v1"),
+                "api_url": env_config.get("NVIDIA_NIM_API_URL_2")
+                    or env_config.get("NVIDIA_NIM_API_URL", "https://integrate.api.nvidia.com/v1"),
                 "label": "GLM-4.7 (Reasoning)",
                 "supports_thinking": True,
             },
@@ -89,20 +142,34 @@ class NLEngine:
         self.active_model_id = default if default in self.models else 1
         
         # Conversation history (per session)
-        self.conversation_history = []
+        self.history = ConversationHistory(token_budget=history_token_budget)
         
         # Build clients lazily
         self._clients = {}
+        self._clients_lock = threading.Lock()
     
-    def _get_client(self, model_id: int) -> OpenAI:
+    def _get_client(self, model_id: int) -> "OpenAI":
         """Get or create an OpenAI client for the given model."""
-        if model_id not in self._clients:
-            model_cfg = self.models[model_id]
-            self._clients[model_id] = OpenAI(
-                base_url=model_cfg["api_url"],
-                api_key=model_cfg["api_key"],
-            )
-        return self._clients[model_id]
+        with self._clients_lock:
+            if model_id not in self._clients:
+                from openai import OpenAI
+                
+                model_cfg = self.models[model_id]
+                self._clients[model_id] = OpenAI(
+                    base_url=model_cfg["api_url"],
+                    api_key=model_cfg["api_key"],
+                )
+            return self._clients[model_id]
+    
+    def preload_clients(self):
+        """Import openai and build every model's client (e.g. on a startup thread)."""
+        for model_id in self.models:
+            self._get_client(model_id)
+    
+    def set_schema(self, schema_context: str, schema_retriever=None):
+        """Install the schema once it has been loaded (see __init__)."""
+        self.schema_context = schema_context
+        self.schema_retriever = schema_retriever
     
     def switch_model(self, model_id: int) -> str:
         """Switch the active model. Returns status message."""
@@ -127,31 +194,31 @@ class NLEngine:
             lines.append(f"  {mid}. {m['label']} ({m['name']}){thinking}{active}")
         return "\n".join(lines)
     
-    def _build_system_prompt(self) -> str:
-        """Build the system prompt with schema context."""
-        return SYSTEM_PROMPT_TEMPLATE.format(schema=self.schema_context)
+    def _system_prompt_for(self, retrieval_text: Optional[str]) -> tuple[str, Optional[list]]:
+        """System prompt for retrieval text. Returns (prompt, tables or None for full schema)."""
+        if self.schema_retriever is None or not retrieval_text:
+            return SYSTEM_PROMPT_TEMPLATE.format(schema=self.schema_context), None
+        schema, tables = self.schema_retriever.build_context(retrieval_text)
+        return SYSTEM_PROMPT_TEMPLATE.format(schema=schema), tables
     
-    def ask(self, question: str, stream: bool = True) -> str:
-        """
-        Send a natural language question to the LLM and get a response.
-        Supports streaming output.
-        
-        Returns the full response text.
-        """
-        model_cfg = self.models[self.active_model_id]
-        client = self._get_client(self.active_model_id)
-        
-        # Build messages
-        messages = [{"role": "system", "content": self._build_system_prompt()}]
-        
-        # Add conversation history (last 6 turns for context)
-        for turn in self.conversation_history[-6:]:
-            messages.append(turn)
-        
-        # Add current question
+    def _build_system_prompt(self, question: Optional[str] = None) -> str:
+        """Build the system prompt with the full or question-relevant schema."""
+        # Follow-ups ("now only for SBI") keep the previous question's tables
+        previous = self.history.last_question() if question else None
+        retrieval_text = f"{previous} {question}" if previous else question
+        prompt, self.last_schema_tables = self._system_prompt_for(retrieval_text)
+        return prompt
+    
+    def _build_messages(self, question: str) -> list:
+        """System prompt, compacted history within budget and the question."""
+        messages = [{"role": "system", "content": self._build_system_prompt(question)}]
+        messages.extend(self.history.messages())
         messages.append({"role": "user", "content": question})
-        
-        # Build API args
+        return messages
+    
+    def _api_kwargs(self, model_id: int, messages: list, stream: bool) -> dict:
+        """Chat-completion arguments for a model."""
+        model_cfg = self.models[model_id]
         api_kwargs = {
             "model": model_cfg["name"],
             "messages": messages,
@@ -160,6 +227,9 @@ class NLEngine:
             "max_tokens": 4096,
             "stream": stream,
         }
+        if stream:
+            # Last chunk then carries token usage; servers that ignore it get an estimate
+            api_kwargs["stream_options"] = {"include_usage": True}
         
         # GLM-4.7 supports thinking/reasoning
         if model_cfg["supports_thinking"]:
@@ -169,47 +239,172 @@ class NLEngine:
                     "clear_thinking": False,
                 }
             }
+        return api_kwargs
+    
+    def _stream_completion(
+        self,
+        model_id: int,
+        messages: list,
+        on_token: Optional[Callable[[str], None]] = None,
+        on_thinking: Optional[Callable[[str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        stats: Optional[dict] = None,
+        on_sql: Optional[Callable[[str], None]] = None,
+    ) -> Optional[str]:
+        """
+        Stream one completion without printing anything.
+        
+        on_token / on_thinking receive answer and reasoning deltas as they
+        arrive. on_sql receives the first ```sql block as soon as its fence
+        closes, while the rest of the answer is still streaming. Returns the
+        full answer text, or None if cancel_event was set (the HTTP stream
+        is closed). API errors propagate.
+        
+        If a stats dict is given it is filled with llm_ms, ttft_ms (first
+        answer token), sql_ms (SQL block closed; only with on_sql),
+        prompt_tokens, completion_tokens and tokens_estimated (True when
+        the server sent no usage and the counts are estimates).
+        """
+        start = time.perf_counter()
+        first_token = None
+        sql_at = None
+        extractor = StreamingSQLExtractor() if on_sql is not None else None
+        usage = None
+        reasoning_text = []
+        
+        client = self._get_client(model_id)
+        completion = client.chat.completions.create(**self._api_kwargs(model_id, messages, True))
+        
+        full_response = ""
+        try:
+            for chunk in completion:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not getattr(chunk, "choices", None):
+                    continue
+                if len(chunk.choices) == 0 or getattr(chunk.choices[0], "delta", None) is None:
+                    continue
+                
+                delta = chunk.choices[0].delta
+                
+                # Handle reasoning/thinking content (GLM-4.7)
+                reasoning = getattr(delta, "reasoning_content", None)
+                if reasoning:
+                    reasoning_text.append(reasoning)
+                    if on_thinking is not None:
+                        on_thinking(reasoning)
+                
+                # Handle main content
+                content = getattr(delta, "content", None)
+                if content is not None:
+                    # The opening role chunk carries content "" — not a token
+                    if first_token is None and content:
+                        first_token = time.perf_counter()
+                    if on_token is not None:
+                        on_token(content)
+                    full_response += content
+                    if extractor is not None and extractor.sql is None and extractor.feed(content):
+                        sql_at = time.perf_counter()
+                        on_sql(extractor.sql)
+        finally:
+            completion.close()
+            if stats is not None:
+                stats.update(
+                    llm_ms=round((time.perf_counter() - start) * 1000, 1),
+                    ttft_ms=round((first_token - start) * 1000, 1) if first_token else None,
+                    sql_ms=round((sql_at - start) * 1000, 1) if sql_at else None,
+                    **self._usage(usage, messages, full_response + "".join(reasoning_text)),
+                )
+        
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        return full_response
+    
+    @staticmethod
+    def _usage(usage, messages: list, output: str) -> dict:
+        """Token counts from an API usage object, or estimated from the text."""
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            return {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "tokens_estimated": False,
+            }
+        return {
+            "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+            "completion_tokens": estimate_tokens(output),
+            "tokens_estimated": True,
+        }
+    
+    def ask(self, question: str, stream: bool = True,
+            cancel_event: Optional[threading.Event] = None,
+            on_sql: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Send a natural language question to the LLM and get a response.
+        Supports streaming output.
+        
+        If cancel_event is set while the answer streams (e.g. from Ctrl-C in
+        the main thread), the HTTP stream is closed, nothing is added to the
+        history and "" is returned.
+        
+        When streaming, on_sql(sql) is called from the streaming thread as
+        soon as the answer's ```sql block closes, so the caller can validate
+        or start the query while the explanation is still arriving. The
+        final answer may still contain a different (later) block; compare
+        with extract_sql() before reusing anything started from it.
+        
+        Model, latency and token usage of the answer are left in last_call.
+        
+        Returns the full response text.
+        """
+        messages = self._build_messages(question)
+        self.last_call = None
+        stats = {}
         
         full_response = ""
-        thinking_content = ""
         
         try:
             if stream:
-                completion = client.chat.completions.create(**api_kwargs)
-                
                 in_thinking = False
-                for chunk in completion:
-                    if not getattr(chunk, "choices", None):
-                        continue
-                    if len(chunk.choices) == 0 or getattr(chunk.choices[0], "delta", None) is None:
-                        continue
-                    
-                    delta = chunk.choices[0].delta
-                    
-                    # Handle reasoning/thinking content (GLM-4.7)
-                    reasoning = getattr(delta, "reasoning_content", None)
-                    if reasoning:
-                        if not in_thinking:
-                            print(f"\n{_THINKING_COLOR}💭 Thinking...", end="")
-                            in_thinking = True
-                        print(f"{_THINKING_COLOR}{reasoning}{_RESET_COLOR}", end="")
-                        thinking_content += reasoning
-                    
-                    # Handle main content
-                    content = getattr(delta, "content", None)
-                    if content is not None:
-                        if in_thinking:
-                            print(f"{_RESET_COLOR}\n")  # End thinking block
-                            in_thinking = False
-                        print(content, end="")
-                        full_response += content
+                
+                def on_thinking(reasoning: str):
+                    nonlocal in_thinking
+                    if not in_thinking:
+                        print(f"\n{_THINKING_COLOR}💭 Thinking...", end="")
+                        in_thinking = True
+                    print(f"{_THINKING_COLOR}{reasoning}{_RESET_COLOR}", end="")
+                
+                def on_token(content: str):
+                    nonlocal in_thinking
+                    if in_thinking:
+                        print(f"{_RESET_COLOR}\n")  # End thinking block
+                        in_thinking = False
+                    print(content, end="")
+                
+                full_response = self._stream_completion(
+                    self.active_model_id, messages,
+                    on_token=on_token, on_thinking=on_thinking, cancel_event=cancel_event,
+                    stats=stats, on_sql=on_sql,
+                )
                 
                 if in_thinking:
                     print(f"{_RESET_COLOR}")
+                if full_response is None:
+                    return ""
                 print()  # Final newline
             else:
-                completion = client.chat.completions.create(**api_kwargs)
+                client = self._get_client(self.active_model_id)
+                start = time.perf_counter()
+                completion = client.chat.completions.create(
+                    **self._api_kwargs(self.active_model_id, messages, False)
+                )
                 full_response = completion.choices[0].message.content or ""
+                stats = {
+                    "llm_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "ttft_ms": None,
+                    **self._usage(getattr(completion, "usage", None), messages, full_response),
+                }
                 print(full_response)
         
         except Exception as e:
@@ -217,17 +412,162 @@ class NLEngine:
             print(error_msg)
             return error_msg
         
+        if cancel_event is not None and cancel_event.is_set():
+            return ""
+        
         # Update conversation history
-        self.conversation_history.append({"role": "user", "content": question})
-        self.conversation_history.append({"role": "assistant", "content": full_response})
+        self.add_history(question, full_response)
+        self.last_call = {"model": self.models[self.active_model_id]["name"], **stats}
         
         return full_response
     
+    def generate(
+        self,
+        question: str,
+        model_id: Optional[int] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> dict:
+        """
+        Stateless, non-printing NL → SQL for batch and service use.
+        
+        Ignores and does not touch the conversation history, so it is safe
+        to call from several threads at once. on_token receives answer
+        deltas as they stream. Returns dict with response, sql, llm_ms,
+        ttft_ms (time to first answer token), prompt_tokens,
+        completion_tokens, tokens_estimated, schema_tables and error (None
+        on success; "cancelled" if cancel_event was set).
+        """
+        model_id = model_id or self.active_model_id
+        prompt, tables = self._system_prompt_for(question)
+        messages = [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": question},
+        ]
+        
+        start = time.perf_counter()
+        stats = {}
+        try:
+            response = self._stream_completion(
+                model_id, messages, on_token=on_token, cancel_event=cancel_event, stats=stats
+            )
+            error = None if response is not None else "cancelled"
+            response = response or ""
+        except Exception as e:
+            response, error = "", f"❌ API Error: {e}"
+        
+        return {
+            "response": response,
+            "sql": self.extract_sql(response) if response else None,
+            "llm_ms": stats.get("llm_ms", round((time.perf_counter() - start) * 1000, 1)),
+            "ttft_ms": stats.get("ttft_ms"),
+            "prompt_tokens": stats.get("prompt_tokens"),
+            "completion_tokens": stats.get("completion_tokens"),
+            "tokens_estimated": stats.get("tokens_estimated"),
+            "schema_tables": tables,
+            "error": error,
+        }
+    
+    def race(
+        self,
+        question: str,
+        accept: Callable[[str], bool],
+        cancel_event: Optional[threading.Event] = None,
+        model_ids: Optional[list] = None,
+    ) -> Optional[dict]:
+        """
+        Ask every configured model at once; the first usable answer wins.
+        
+        Each model streams on its own thread without printing. When a stream
+        finishes, its SQL is extracted and passed to accept(sql) (e.g.
+        validate_query + an EXPLAIN dry run); the first accepted answer wins
+        and the other streams are closed. Failed or rejected answers just
+        drop out of the race.
+        
+        Returns dict with model_id, response, sql, elapsed_ms and results
+        (per-model outcome: "won", "rejected", "no sql", "error: ...",
+        "cancelled"), or None if no model produced acceptable SQL.
+        """
+        model_ids = model_ids or list(self.models)
+        messages = self._build_messages(question)
+        self.last_call = None
+        stops = {mid: threading.Event() for mid in model_ids}
+        outcomes = {mid: "cancelled" for mid in model_ids}
+        winner = {}
+        lock = threading.Lock()
+        finished = threading.Semaphore(0)
+        start = time.perf_counter()
+        
+        def run(mid: int):
+            stats = {}
+            try:
+                response = self._stream_completion(mid, messages, cancel_event=stops[mid], stats=stats)
+                if response is None:
+                    return
+                sql = self.extract_sql(response)
+                if not sql:
+                    outcomes[mid] = "no sql"
+                    return
+                if winner or not accept(sql):
+                    outcomes[mid] = "rejected" if not winner else "cancelled"
+                    return
+                with lock:
+                    if winner:
+                        return
+                    winner.update(
+                        model_id=mid, response=response, sql=sql,
+                        elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+                        stats=stats,
+                    )
+                    outcomes[mid] = "won"
+                for other, stop in stops.items():
+                    if other != mid:
+                        stop.set()
+            except Exception as e:
+                outcomes[mid] = f"error: {e}"
+            finally:
+                finished.release()
+        
+        for mid in model_ids:
+            threading.Thread(target=run, args=(mid,), name=f"race-model-{mid}", daemon=True).start()
+        
+        # Wait until someone wins or every model has dropped out
+        pending = len(model_ids)
+        while pending and not winner:
+            if cancel_event is not None and cancel_event.is_set():
+                for stop in stops.values():
+                    stop.set()
+                return None
+            if finished.acquire(timeout=0.1):
+                pending -= 1
+        
+        if not winner:
+            return None
+        
+        self.add_history(question, winner["response"])
+        self.last_call = {"model": self.models[winner["model_id"]]["name"], **winner.pop("stats")}
+        return {**winner, "results": dict(outcomes)}
+    
+    @property
+    def conversation_history(self) -> list:
+        """Replayed history as chat messages (within the token budget)."""
+        return self.history.messages()
+    
+    def add_history(self, question: str, response: str):
+        """Record a question/answer turn (also used for cache-served answers)."""
+        self.history.add(question, response, sql=self.extract_sql(response))
+    
+    def record_result(self, question: str, result: dict, sql: Optional[str] = None):
+        """
+        Attach a one-line summary of the executed result to the question's
+        turn; sql (the query that actually ran) replaces the turn's SQL.
+        """
+        self.history.set_result_summary(question, summarize_result(result), sql=sql)
+    
     def extract_sql(self, response: str) -> Optional[str]:
         """Extract SQL query from LLM response (from code blocks)."""
         # Try ```sql ... ``` first
-        pattern = r'```sql\s*\n?(.*?)\n?\s*```'
-        matches = re.findall(pattern, response, re.DOTALL | re.IGNORECASE)
+        matches = _SQL_BLOCK_RE.findall(response)
         
         if matches:
             # Return the last SQL block (in case there are explanations with examples)
@@ -264,7 +604,7 @@ class NLEngine:
     
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history.clear()
+        self.history.clear()
     
     def test_connection(self) -> str:
         """Test API connectivity with a simple request."""
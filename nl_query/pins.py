@@ -0,0 +1,122 @@
+"""
+Pinned Queries
+Named queries whose results are refreshed by the loader after every load.
+
+/pin <name> saves the last validated SQL to pins.json. After each
+successful load, scripts/load_to_postgres.py re-runs every pin in a
+read-only transaction and writes its result to snapshots/<name>.json.gz
+(see scripts/pinned_snapshots.py). /pinned <name> reads that file back,
+so a morning dashboard question costs a file read, not a live query.
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional
+
+PINS_PATH = Path(__file__).parent / "pins.json"
+
+# Pin names double as snapshot file names
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# type_code → parser restoring the Python type JSON could not carry
+_REVIVERS = {
+    1700: Decimal,                  # numeric
+    1082: date.fromisoformat,       # date
+    1114: datetime.fromisoformat,   # timestamp
+    1184: datetime.fromisoformat,   # timestamptz
+}
+
+
+class PinStore:
+    """Pinned query definitions (pins.json) and their loader-written snapshots."""
+
+    def __init__(self, path=PINS_PATH):
+        """
+        Args:
+            path: pins file; snapshots are read from snapshots/ beside it
+        """
+        self.path = Path(path)
+        self.snapshot_dir = self.path.parent / "snapshots"
+        self._lock = threading.Lock()
+
+    def all(self) -> dict:
+        """name → {sql, question, created_at}, sorted by name."""
+        if not self.path.exists():
+            return {}
+        try:
+            pins = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return dict(sorted(pins.items()))
+
+    def get(self, name: str) -> Optional[dict]:
+        return self.all().get(name)
+
+    def _save(self, pins: dict):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(pins, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def add(self, name: str, sql: str, question: Optional[str] = None) -> bool:
+        """
+        Pin SQL under a name; returns True if an existing pin was replaced.
+        Raises ValueError for names that are not lowercase letters, digits,
+        '-' or '_'.
+        """
+        if not _NAME_RE.match(name):
+            raise ValueError("Pin names use lowercase letters, digits, '-' and '_' (max 64)")
+        with self._lock:
+            pins = self.all()
+            replaced = name in pins
+            pins[name] = {
+                "sql": sql.strip().rstrip(";"),
+                "question": question,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._save(pins)
+        if replaced:
+            # The old snapshot answers a different query
+            self.snapshot_path(name).unlink(missing_ok=True)
+        return replaced
+
+    def remove(self, name: str) -> bool:
+        """Unpin; returns False if there was no such pin."""
+        with self._lock:
+            pins = self.all()
+            if pins.pop(name, None) is None:
+                return False
+            self._save(pins)
+        self.snapshot_path(name).unlink(missing_ok=True)
+        return True
+
+    def snapshot_path(self, name: str) -> Path:
+        return self.snapshot_dir / f"{name}.json.gz"
+
+    def snapshot(self, name: str) -> Optional[dict]:
+        """
+        The latest snapshot as a SafeExecutor-style result dict (plus
+        refreshed_at and data_version), or None if the loader has not
+        refreshed this pin yet.
+        """
+        try:
+            with gzip.open(self.snapshot_path(name), "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        revivers = [_REVIVERS.get(code) for code in snapshot["type_codes"]]
+        rows = []
+        for row in snapshot["rows"]:
+            rows.append(tuple(
+                revive(val) if revive is not None and isinstance(val, str) else val
+                for revive, val in zip(revivers, row)
+            ))
+        snapshot["rows"] = rows
+        snapshot.update(success=True, error=None)
+        return snapshot
@@ -0,0 +1,248 @@
+"""
+Query Cache
+Two-level cache for NL → SQL → rows round trips:
+
+1. Question cache — normalized question text → generated SQL, with an
+   optional character n-gram similarity match for near-identical wording.
+2. Result cache — normalized SQL text → result dict from SafeExecutor.
+
+Both levels are tagged with the loader's data-version stamp
+(etl_data_version) and are emptied when it changes. The stamp is re-read at
+most once per VERSION_TTL_S, so a repeated question within that window
+needs neither an API call nor a database round trip.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Words that carry no meaning for cache lookups
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "me", "show", "list",
+    "give", "get", "please", "what", "which", "is", "are", "was", "by",
+    "tell", "display", "find", "all", "with",
+}
+
+# Questions that lean on earlier turns ("now only for SBI") are not cached
+_FOLLOW_UP_WORDS = {
+    "it", "its", "that", "those", "these", "them", "they", "same", "above",
+    "previous", "instead", "also", "again", "now",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, strip punctuation and stopwords, fold simple plurals."""
+    words = re.findall(r"[a-z0-9][a-z0-9\-.]*", question.lower())
+    out = []
+    for w in words:
+        w = w.rstrip(".")
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        out.append(w)
+    return " ".join(out)
+
+
+def normalize_sql(sql: str) -> str:
+    """Strip comments and trailing semicolons, collapse whitespace, lowercase outside literals."""
+    sql = re.sub(r"--.*$", "", sql, flags=re.MULTILINE)
+    sql = re.sub(r"/\*.*?\*/", "", sql, flags=re.DOTALL)
+    sql = sql.strip().rstrip(";").strip()
+    # Split on single-quoted literals so their case and spacing survive
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i]).lower()
+    return "".join(parts).strip()
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether the question refers back to earlier conversation turns."""
+    return bool(set(re.findall(r"[a-z]+", question.lower())) & _FOLLOW_UP_WORDS)
+
+
+def _ngrams(text: str, n: int = 3) -> set[str]:
+    """Character n-grams of a normalized question."""
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+def _numbers(text: str) -> set[str]:
+    """Digit runs (years, dates, limits) — these must match exactly."""
+    return set(re.findall(r"\d+", text))
+
+
+class QueryCache:
+    """LRU question → SQL and SQL → result cache invalidated by data version."""
+
+    # Seconds between data-version checks
+    VERSION_TTL_S = 30
+
+    def __init__(
+        self,
+        version_fn: Optional[Callable[[], Optional[int]]] = None,
+        max_questions: int = 256,
+        max_results: int = 64,
+        similarity: Optional[float] = None,
+    ):
+        """
+        Args:
+            version_fn: returns the current data version (e.g. SafeExecutor.get_data_version)
+            max_questions: LRU size of the question → SQL level
+            max_results: LRU size of the SQL → result level
+            similarity: if set (e.g. 0.9), also match questions whose character
+                trigram Jaccard similarity is at least this and whose numbers agree
+        """
+        self.version_fn = version_fn
+        self.max_questions = max_questions
+        self.max_results = max_results
+        self.similarity = similarity
+
+        self._questions: OrderedDict[str, str] = OrderedDict()
+        self._question_grams: dict[str, set[str]] = {}
+        self._results: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._stats = {
+            "sql_hits": 0, "sql_similar_hits": 0, "sql_misses": 0,
+            "result_hits": 0, "result_misses": 0, "invalidations": 0,
+        }
+
+    # ── Data version ──────────────────────────────────────────
+
+    def _check_version(self):
+        """Empty both levels if the loader has bumped the data version."""
+        if self.version_fn is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.VERSION_TTL_S:
+            return
+        self._version_checked_at = now
+        version = self.version_fn()
+        if version != self._version:
+            with self._lock:
+                if self._questions or self._results:
+                    self._stats["invalidations"] += 1
+                self._questions.clear()
+                self._question_grams.clear()
+                self._results.clear()
+                self._version = version
+
+    # ── Level 1: question → SQL ───────────────────────────────
+
+    def get_sql(self, question: str) -> Optional[tuple[str, str]]:
+        """
+        Look up SQL for a question.
+
+        Returns (sql, "exact" | "similar") or None. Follow-up questions that
+        depend on earlier turns always miss.
+        """
+        if is_follow_up(question):
+            return None
+        self._check_version()
+        key = normalize_question(question)
+
+        with self._lock:
+            if key in self._questions:
+                self._questions.move_to_end(key)
+                self._stats["sql_hits"] += 1
+                return self._questions[key], "exact"
+
+            if self.similarity is not None and key:
+                grams, nums = _ngrams(key), _numbers(key)
+                best_key, best_score = None, 0.0
+                for other, other_grams in self._question_grams.items():
+                    if _numbers(other) != nums:
+                        continue
+                    score = len(grams & other_grams) / len(grams | other_grams)
+                    if score > best_score:
+                        best_key, best_score = other, score
+                if best_key is not None and best_score >= self.similarity:
+                    self._questions.move_to_end(best_key)
+                    self._stats["sql_similar_hits"] += 1
+                    return self._questions[best_key], "similar"
+
+            self._stats["sql_misses"] += 1
+            return None
+
+    def put_sql(self, question: str, sql: str):
+        """Remember the SQL that answered a (non follow-up) question."""
+        if is_follow_up(question):
+            return
+        key = normalize_question(question)
+        if not key:
+            return
+        self._check_version()
+        with self._lock:
+            self._questions[key] = sql
+            self._questions.move_to_end(key)
+            self._question_grams[key] = _ngrams(key)
+            while len(self._questions) > self.max_questions:
+                old, _ = self._questions.popitem(last=False)
+                self._question_grams.pop(old, None)
+
+    # ── Level 2: SQL → result ─────────────────────────────────
+
+    def get_result(self, sql: str) -> Optional[dict]:
+        """Look up a cached result for SQL text."""
+        self._check_version()
+        key = normalize_sql(sql)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self._stats["result_hits"] += 1
+                return self._results[key]
+            self._stats["result_misses"] += 1
+            return None
+
+    def put_result(self, sql: str, result: dict):
+        """Cache a successful result."""
+        if not result.get("success"):
+            return
+        self._check_version()
+        key = normalize_sql(sql)
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    # ── Management ────────────────────────────────────────────
+
+    def clear(self):
+        """Drop every cached question and result."""
+        with self._lock:
+            self._questions.clear()
+            self._question_grams.clear()
+            self._results.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current sizes."""
+        with self._lock:
+            return {
+                **self._stats,
+                "questions": len(self._questions),
+                "results": len(self._results),
+                "data_version": self._version,
+            }
+
+    def format_stats(self) -> str:
+        """Human-readable cache statistics."""
+        s = self.stats()
+        sql_lookups = s["sql_hits"] + s["sql_similar_hits"] + s["sql_misses"]
+        result_lookups = s["result_hits"] + s["result_misses"]
+        sql_rate = (s["sql_hits"] + s["sql_similar_hits"]) / sql_lookups * 100 if sql_lookups else 0
+        result_rate = s["result_hits"] / result_lookups * 100 if result_lookups else 0
+        return "\n".join([
+            f"  Question → SQL : {s['questions']} cached, "
+            f"{s['sql_hits']} exact + {s['sql_similar_hits']} similar hits, "
+            f"{s['sql_misses']} misses ({sql_rate:.0f}% hit rate)",
+            f"  SQL → result   : {s['results']} cached, "
+            f"{s['result_hits']} hits, {s['result_misses']} misses ({result_rate:.0f}% hit rate)",
+            f"  Data version   : {s['data_version'] if s['data_version'] is not None else 'unknown'}"
+            f" ({s['invalidations']} invalidations)",
+        ])
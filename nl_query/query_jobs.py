@@ -0,0 +1,138 @@
+"""
+Query Jobs
+Runs database work on worker threads so the CLI stays responsive.
+
+Each job owns a QueryProgress that the main thread polls for the spinner
+(elapsed time, rows fetched) and uses to cancel the statement on the
+server. A job still running after the foreground wait is handed to the
+JobManager, the prompt comes back, and its result is shown once it lands.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from db_executor import QueryProgress
+
+
+class QueryJob:
+    """One unit of database work running on its own thread."""
+
+    def __init__(self, job_id: int, kind: str, label: str,
+                 work: Callable[[QueryProgress], Any], sql: Optional[str] = None):
+        """
+        Args:
+            job_id: number shown to the user (/jobs, /cancel)
+            kind: "query" (result dict) or "export" ((filepath, rows))
+            label: question or description shown in listings
+            work: called on the worker thread with the job's QueryProgress
+            sql: the SQL the job runs, for callers that cache or re-use it
+        """
+        self.job_id = job_id
+        self.kind = kind
+        self.label = label
+        self.sql = sql
+        self.progress = QueryProgress()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.background = False
+
+        self._work = work
+        self._done = threading.Event()
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"query-job-{job_id}", daemon=True
+        )
+
+    def start(self) -> "QueryJob":
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self._work(self.progress)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._finished = time.perf_counter()
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block up to timeout seconds. Returns True once the job is done."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Cancel the running statement; the job finishes shortly after."""
+        self.progress.cancel()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def elapsed_s(self) -> float:
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+
+class JobManager:
+    """Tracks jobs moved to the background and their unreported results."""
+
+    def __init__(self, on_finish: Optional[Callable[[QueryJob], None]] = None):
+        """
+        Args:
+            on_finish: called on the worker thread when a background job
+                completes (e.g. to print a one-line notice)
+        """
+        self.on_finish = on_finish
+        self._next_id = 1
+        self._jobs: dict[int, QueryJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, label: str, work: Callable[[QueryProgress], Any],
+               sql: Optional[str] = None) -> QueryJob:
+        """Start a job; it stays foreground until send_to_background()."""
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+        return QueryJob(job_id, kind, label, work, sql=sql).start()
+
+    def send_to_background(self, job: QueryJob):
+        """Keep the job running and report it from pop_finished() later."""
+        job.background = True
+        with self._lock:
+            self._jobs[job.job_id] = job
+        threading.Thread(
+            target=self._watch, args=(job,), name=f"query-job-{job.job_id}-watch", daemon=True
+        ).start()
+
+    def _watch(self, job: QueryJob):
+        job.wait()
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def running(self) -> list[QueryJob]:
+        """Background jobs still in progress."""
+        with self._lock:
+            return [j for j in self._jobs.values() if not j.done]
+
+    def pop_finished(self) -> list[QueryJob]:
+        """Background jobs that completed since the last call, oldest first."""
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.done]
+            for job in finished:
+                del self._jobs[job.job_id]
+        return sorted(finished, key=lambda j: j.job_id)
+
+    def get(self, job_id: int) -> Optional[QueryJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel_all(self) -> int:
+        """Cancel every running background job. Returns how many."""
+        jobs = self.running()
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
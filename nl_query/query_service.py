@@ -0,0 +1,538 @@
+"""
+NL Query Service
+Small asyncio HTTP service (standard library only) that puts NLEngine and
+SafeExecutor behind one process, so every analyst shares a single
+connection pool, schema cache and question/result cache instead of running
+their own REPL.
+
+Usage:
+    cd nl_query
+    python query_service.py --port 8765
+
+Endpoints (JSON in, JSON or NDJSON out):
+    GET  /health    data version, read endpoints and requests in flight
+    GET  /schema    table summary (refreshed when the data version changes)
+    POST /nl2sql    {"question": ..., "model": 1|2, "execute": true}
+                    NDJSON: token* → sql → result (if execute) → done
+                    (no tokens when the question hits the cache or a
+                    canned intent from intent_router)
+    POST /query     {"sql": ..., "stream": false}
+                    NDJSON: result, or meta → rows* → done with "stream": true
+                    (server-side cursor, no row cap)
+
+Blocking LLM and database calls run on a thread pool. At most
+--max-concurrency NL / query requests run at once; others wait up to
+--queue-timeout seconds and then get 503. A request running longer than
+--timeout seconds is cancelled (LLM stream closed, statement cancelled on
+the server) and ends with an error line or a 504. Executed queries go to
+the telemetry log (source "service") unless TELEMETRY=0.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Optional
+
+# Ensure the nl_query directory is in the path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app import get_cache_config, get_db_params, get_env_config, get_pool_config
+from db_executor import QueryProgress, SafeExecutor
+from intent_router import IntentRouter
+from nl_engine import NLEngine
+from query_cache import QueryCache
+from schema_introspect import get_schema_metadata, get_table_summary, render_schema_context
+from schema_retriever import SchemaRetriever
+from telemetry import TelemetryLog, get_log_path
+
+log = logging.getLogger("query_service")
+
+# Largest request body accepted
+MAX_BODY_BYTES = 1_000_000
+
+# Items buffered between a worker thread and a slow client
+STREAM_QUEUE_SIZE = 16
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+def _json_default(value):
+    """JSON for the types psycopg2 returns."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _ClientGone(Exception):
+    """Raised in a worker thread when the consumer stopped reading."""
+
+
+class RequestContext:
+    """Per-request cancellation handles for the LLM stream and the DB statement."""
+
+    def __init__(self):
+        self.progress = QueryProgress()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.progress.cancel()
+
+
+class Response:
+    """Writes one HTTP response: a JSON body or a chunked NDJSON stream."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.started = False
+        self.streaming = False
+
+    async def _head(self, status: int, content_type: str, extra: str = ""):
+        self.started = True
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Connection: close\r\n{extra}\r\n"
+        )
+        self.writer.write(head.encode("latin-1"))
+
+    async def json(self, status: int, obj):
+        body = _dumps(obj)
+        await self._head(status, "application/json", f"Content-Length: {len(body)}\r\n")
+        self.writer.write(body)
+        await self.writer.drain()
+
+    async def line(self, obj):
+        """Send one NDJSON line, starting the chunked stream if needed."""
+        if not self.streaming:
+            await self._head(200, "application/x-ndjson", "Transfer-Encoding: chunked\r\n")
+            self.streaming = True
+        data = _dumps(obj) + b"\n"
+        self.writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await self.writer.drain()
+
+    async def finish(self):
+        if self.streaming:
+            self.writer.write(b"0\r\n\r\n")
+            await self.writer.drain()
+
+
+class QueryService:
+    """Routes HTTP requests to shared NLEngine / SafeExecutor / QueryCache instances."""
+
+    def __init__(
+        self,
+        engine: NLEngine,
+        executor: SafeExecutor,
+        cache: QueryCache,
+        db_params: dict,
+        router: Optional[IntentRouter] = None,
+        telemetry: Optional[TelemetryLog] = None,
+        max_concurrency: int = 8,
+        request_timeout_s: float = 60,
+        queue_timeout_s: float = 5,
+    ):
+        self.engine = engine
+        self.executor = executor
+        self.cache = cache
+        self.db_params = db_params
+        self.router = router
+        self.telemetry = telemetry
+        self.max_concurrency = max_concurrency
+        self.request_timeout_s = request_timeout_s
+        self.queue_timeout_s = queue_timeout_s
+
+        self._slots: Optional[asyncio.Semaphore] = None
+        # LLM streams and DB statements block; both run here
+        self._threads = ThreadPoolExecutor(max_concurrency * 2, thread_name_prefix="service")
+        self._in_flight = 0
+        self._summary: tuple[Optional[int], Optional[str]] = (None, None)
+        self._summary_lock = threading.Lock()
+
+    # ── Thread bridging ───────────────────────────────────────
+
+    async def _in_thread(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._threads, fn, *args)
+
+    async def _events_from_thread(self, fn: Callable[[Callable], None], ctx: RequestContext):
+        """
+        Run fn(emit) on a worker thread and yield what it emits.
+
+        emit() blocks while the queue is full, so a slow client slows the
+        producer down instead of buffering a whole result in memory. If the
+        consumer goes away, the request is cancelled and the next emit()
+        raises inside the worker.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        done = object()
+        gone = threading.Event()
+
+        def emit(item):
+            if gone.is_set():
+                raise _ClientGone()
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def run():
+            try:
+                fn(emit)
+            except _ClientGone:
+                return
+            except BaseException as e:
+                if not gone.is_set():
+                    asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+                return
+            if not gone.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+        task = loop.run_in_executor(self._threads, run)
+        finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    finished = True
+                    break
+                if isinstance(item, BaseException):
+                    finished = True
+                    raise item
+                yield item
+        finally:
+            if not finished and not task.done():
+                gone.set()
+                ctx.cancel()
+                # Unblock a producer waiting on a full queue
+                while not queue.empty():
+                    queue.get_nowait()
+
+    # ── Endpoints ─────────────────────────────────────────────
+
+    async def health(self, _body, response: Response, _ctx):
+        version = await self._in_thread(self.executor.get_data_version)
+        ok = await self._in_thread(self._ping)
+        await response.json(200 if ok else 503, {
+            "status": "ok" if ok else "db_unavailable",
+            "data_version": version,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "endpoints": self.executor.endpoint_status(),
+            "cache": self.cache.stats(),
+        })
+
+    def _ping(self) -> bool:
+        try:
+            with self.executor.connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _table_summary(self) -> str:
+        """Table summary, recomputed only when the loader bumps the data version."""
+        version = self.executor.get_data_version()
+        with self._summary_lock:
+            cached_version, summary = self._summary
+            if summary is None or version != cached_version:
+                summary = get_table_summary(self.db_params)
+                self._summary = (version, summary)
+            return summary
+
+    async def schema(self, _body, response: Response, _ctx):
+        summary = await self._in_thread(self._table_summary)
+        await response.json(200, {"summary": summary})
+
+    def _result_events(self, sql: str, ctx: RequestContext, started: float,
+                       question: Optional[str] = None, llm: Optional[dict] = None, **extra) -> dict:
+        """Execute through the shared result cache and log it. Returns one result event."""
+        result = self.cache.get_result(sql)
+        cached = result is not None
+        if not cached:
+            result = self.executor.execute(sql, progress=ctx.progress)
+            self.cache.put_result(sql, result)
+        if self.telemetry is not None:
+            self.telemetry.record(sql, result, question=question, llm=llm, cached=cached,
+                                  total_ms=_ms(started), **extra)
+        return {"type": "result", "cached": cached, **result}
+
+    async def nl2sql(self, body, response: Response, ctx: RequestContext):
+        question = (body.get("question") or "").strip()
+        if not question:
+            raise HTTPError(400, "'question' is required")
+        model_id = body.get("model")
+        if model_id is not None and model_id not in self.engine.models:
+            raise HTTPError(400, f"unknown model {model_id}; available: {list(self.engine.models)}")
+
+        started = time.perf_counter()
+        cached = await self._in_thread(self.cache.get_sql, question)
+        routed = None
+        if not cached and self.router is not None:
+            routed = await self._in_thread(self.router.route, question)
+        llm = None
+        if cached:
+            sql, match = cached
+            source = {"sql_source": "cache"}
+            await response.line({"type": "sql", "sql": sql, "cached": match})
+        elif routed:
+            sql = routed["sql"]
+            source = {"sql_source": "intent", "intent": routed["intent"]}
+            await response.line({"type": "sql", "sql": sql, "cached": None, "intent": routed["intent"]})
+        else:
+            def produce(emit):
+                gen = self.engine.generate(
+                    question, model_id=model_id,
+                    on_token=lambda text: emit({"type": "token", "text": text}),
+                    cancel_event=ctx.cancel_event,
+                )
+                emit({
+                    "type": "sql", "sql": gen["sql"], "cached": None,
+                    "llm_ms": gen["llm_ms"], "ttft_ms": gen["ttft_ms"],
+                    "prompt_tokens": gen["prompt_tokens"],
+                    "completion_tokens": gen["completion_tokens"],
+                    "tokens_estimated": gen["tokens_estimated"],
+                    "schema_tables": gen["schema_tables"], "error": gen["error"],
+                })
+
+            sql = None
+            source = {"sql_source": "llm"}
+            model = self.engine.models[model_id or self.engine.active_model_id]["name"]
+            async for event in self._events_from_thread(produce, ctx):
+                if event["type"] == "sql":
+                    sql = event["sql"]
+                    llm = {"model": model, **{k: event[k] for k in (
+                        "llm_ms", "ttft_ms", "prompt_tokens", "completion_tokens", "tokens_estimated",
+                    )}}
+                await response.line(event)
+            if not sql:
+                await response.line({"type": "done", "ok": False, "elapsed_ms": _ms(started)})
+                return
+
+        ok = True
+        if body.get("execute", True):
+            event = await self._in_thread(
+                lambda: self._result_events(sql, ctx, started, question=question, llm=llm, **source)
+            )
+            ok = event["success"]
+            if ok:
+                self.cache.put_sql(question, sql)
+            await response.line(event)
+        await response.line({"type": "done", "ok": ok, "elapsed_ms": _ms(started)})
+
+    async def query(self, body, response: Response, ctx: RequestContext):
+        sql = (body.get("sql") or "").strip()
+        if not sql:
+            raise HTTPError(400, "'sql' is required")
+        started = time.perf_counter()
+
+        if not body.get("stream"):
+            event = await self._in_thread(lambda: self._result_events(sql, ctx, started, sql_source="given"))
+            await response.line(event)
+            await response.line({"type": "done", "ok": event["success"], "elapsed_ms": _ms(started)})
+            return
+
+        batch_size = int(body.get("batch_size") or self.executor.STREAM_BATCH_ROWS)
+
+        def produce(emit):
+            with self.executor.stream(sql, batch_size=batch_size, progress=ctx.progress) as stream:
+                emit({"type": "meta", "columns": stream.columns, "first_batch_ms": stream.first_batch_ms})
+                for batch in stream.batches():
+                    emit({"type": "rows", "rows": batch})
+                if self.telemetry is not None:
+                    self.telemetry.record(sql, {
+                        "success": True, "row_count": stream.row_count, "truncated": False,
+                        "execution_time_ms": stream.first_batch_ms,
+                    }, sql_source="given", streamed=True, total_ms=_ms(started))
+                emit({"type": "done", "ok": True, "row_count": stream.row_count,
+                      "elapsed_ms": stream.elapsed_ms})
+
+        try:
+            async for event in self._events_from_thread(produce, ctx):
+                await response.line(event)
+        except ValueError as e:
+            await response.line({"type": "done", "ok": False, "error": str(e)})
+
+    # ── HTTP plumbing ─────────────────────────────────────────
+
+    ROUTES = {
+        ("GET", "/health"): ("health", False),
+        ("GET", "/schema"): ("schema", False),
+        ("POST", "/nl2sql"): ("nl2sql", True),
+        ("POST", "/query"): ("query", True),
+    }
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> tuple[str, str, dict]:
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        body = {}
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+        if length:
+            raw = await reader.readexactly(length)
+            try:
+                body = json.loads(raw)
+            except json.JSONDecodeError as e:
+                raise HTTPError(400, f"invalid JSON: {e}")
+            if not isinstance(body, dict):
+                raise HTTPError(400, "JSON body must be an object")
+        return method.upper(), target.split("?", 1)[0], body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        response = Response(writer)
+        ctx = RequestContext()
+        started = time.perf_counter()
+        method = path = "-"
+        try:
+            method, path, body = await asyncio.wait_for(self._read_request(reader), 10)
+            route = self.ROUTES.get((method, path))
+            if route is None:
+                known = {p for _, p in self.ROUTES}
+                raise HTTPError(405 if path in known else 404, f"no route for {method} {path}")
+            handler, limited = getattr(self, route[0]), route[1]
+
+            if limited:
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s)
+                except asyncio.TimeoutError:
+                    raise HTTPError(503, f"busy: {self.max_concurrency} requests in flight")
+                self._in_flight += 1
+            try:
+                await asyncio.wait_for(handler(body, response, ctx), self.request_timeout_s)
+            finally:
+                if limited:
+                    self._in_flight -= 1
+                    self._slots.release()
+
+        except asyncio.TimeoutError:
+            ctx.cancel()
+            message = f"timed out after {self.request_timeout_s:.0f}s"
+            if response.streaming:
+                await response.line({"type": "done", "ok": False, "error": message})
+            elif not response.started:
+                await response.json(504, {"error": message})
+        except HTTPError as e:
+            if not response.started:
+                await response.json(e.status, {"error": str(e)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            ctx.cancel()
+        except Exception as e:
+            ctx.cancel()
+            log.exception(f"{method} {path} failed")
+            if response.streaming:
+                await response.line({"type": "done", "ok": False, "error": str(e)})
+            elif not response.started:
+                await response.json(500, {"error": str(e)})
+        finally:
+            try:
+                await response.finish()
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            log.info(f"{method} {path} {_ms(started):.0f}ms")
+
+    async def serve(self, host: str, port: int):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self.handle, host, port)
+        log.info(f"Listening on http://{host}:{port} (max {self.max_concurrency} concurrent, "
+                 f"{self.request_timeout_s:.0f}s timeout)")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self.executor.close()
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP service for NL → SQL and safe query execution")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default 8765)")
+    parser.add_argument("--max-concurrency", type=int,
+                        default=int(os.getenv("SERVICE_MAX_CONCURRENCY", "8")),
+                        help="NL / query requests served at once")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("SERVICE_TIMEOUT_S", "60")),
+                        help="Per-request timeout in seconds")
+    parser.add_argument("--queue-timeout", type=float, default=5,
+                        help="Seconds a request may wait for a free slot before 503")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Verbose logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    if not args.verbose:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    db_params = get_db_params()
+    schema_meta = get_schema_metadata(db_params, include_samples=True)
+    schema_context = render_schema_context(schema_meta, include_samples=True)
+    retriever = SchemaRetriever(schema_meta) if os.getenv("SCHEMA_RETRIEVAL", "1") != "0" else None
+    engine = NLEngine(get_env_config(), schema_context, schema_retriever=retriever)
+
+    pool_config = get_pool_config()
+    pool_config["max_size"] = max(pool_config["max_size"], args.max_concurrency)
+    executor = SafeExecutor(db_params, **pool_config)
+    cache = QueryCache(version_fn=executor.get_data_version, **get_cache_config())
+
+    router = IntentRouter(executor) if os.getenv("INTENT_ROUTER", "1") != "0" else None
+    log_path = get_log_path()
+
+    service = QueryService(
+        engine, executor, cache, db_params, router=router,
+        telemetry=TelemetryLog(log_path, source="service") if log_path else None,
+        max_concurrency=args.max_concurrency,
+        request_timeout_s=args.timeout,
+        queue_timeout_s=args.queue_timeout,
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        log.info("Shutting down")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
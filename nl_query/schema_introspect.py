@@ -2,224 +2,323 @@
 Schema Introspection Module
 Reads PostgreSQL database schema dynamically and produces a compressed
 text representation for LLM context injection.
+
+All per-table metadata comes from a single pg_catalog query, row counts are
+planner estimates (no COUNT(*) scans), and the result is cached on disk
+keyed by a cheap catalog fingerprint. A warm start costs one fingerprint
+query plus a file read.
 """
 
-import psycopg2
+import hashlib
+import json
+import time
+from pathlib import Path
 from typing import Optional
 
+import psycopg2
+
+# On-disk cache of schema metadata, one file per database
+CACHE_DIR = Path(__file__).parent / ".cache"
+
+# Sample rows per table included in the context
+SAMPLE_ROWS = 3
+
+# Changes whenever a relation is created, dropped, rewritten, altered,
+# re-analyzed or written to (pg_stat counters), or constraints change
+FINGERPRINT_SQL = """
+    SELECT string_agg(
+               concat_ws(':', c.relname, c.relkind, c.relfilenode, c.reltuples,
+                         c.relnatts,
+                         COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)),
+               ',' ORDER BY c.relname),
+           (SELECT count(*) FROM pg_constraint con
+             JOIN pg_namespace cn ON cn.oid = con.connamespace
+             WHERE cn.nspname = 'public')
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm')
+"""
+
+# One row per table / materialized view with columns and constraints as JSON
+METADATA_SQL = """
+    SELECT c.relname,
+           c.relkind,
+           CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint
+                ELSE COALESCE(s.n_live_tup, 0) END AS row_estimate,
+           (SELECT json_agg(json_build_object(
+                       'name', a.attname,
+                       'type', format_type(a.atttypid, a.atttypmod),
+                       'not_null', a.attnotnull,
+                       'default', pg_get_expr(d.adbin, d.adrelid))
+                   ORDER BY a.attnum)
+              FROM pg_attribute a
+              LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+             WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+           ) AS columns,
+           (SELECT json_agg(json_build_object(
+                       'type', con.contype,
+                       'columns', (SELECT json_agg(att.attname ORDER BY k.ord)
+                                     FROM unnest(con.conkey) WITH ORDINALITY k(attnum, ord)
+                                     JOIN pg_attribute att
+                                       ON att.attrelid = con.conrelid AND att.attnum = k.attnum),
+                       'ref_table', ref.relname,
+                       'ref_columns', (SELECT json_agg(att.attname ORDER BY k.ord)
+                                         FROM unnest(con.confkey) WITH ORDINALITY k(attnum, ord)
+                                         JOIN pg_attribute att
+                                           ON att.attrelid = con.confrelid AND att.attnum = k.attnum))
+                   ORDER BY con.contype, con.conname)
+              FROM pg_constraint con
+              LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+             WHERE con.conrelid = c.oid AND con.contype IN ('p', 'f', 'u')
+           ) AS constraints
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = 'public'
+      AND c.relkind IN ('r', 'p', 'm')
+      AND NOT c.relispartition
+    ORDER BY c.relname
+"""
+
+# In-process cache: dbname -> metadata dict
+_memory_cache: dict[str, dict] = {}
+
 
 def get_db_connection(conn_params: dict):
     """Create a database connection."""
     return psycopg2.connect(**conn_params)
 
 
-def get_schema_context(conn_params: dict, include_samples: bool = True) -> str:
+def get_schema_fingerprint(cur) -> str:
+    """Hash of catalog state that changes whenever cached metadata may be stale."""
+    cur.execute(FINGERPRINT_SQL)
+    relations, n_constraints = cur.fetchone()
+    return hashlib.sha256(f"{relations}|{n_constraints}".encode()).hexdigest()[:16]
+
+
+def _fetch_metadata(cur, include_samples: bool) -> list[dict]:
+    """Read every table's columns, keys and (optionally) sample rows."""
+    cur.execute(METADATA_SQL)
+    tables = []
+    for name, relkind, row_estimate, columns, constraints in cur.fetchall():
+        constraints = constraints or []
+        tables.append({
+            "name": name,
+            "kind": "view" if relkind == "m" else "table",
+            "row_estimate": int(row_estimate or 0),
+            "columns": columns or [],
+            "pk": next((c["columns"] for c in constraints if c["type"] == "p"), []),
+            "fks": [
+                [col, c["ref_table"], ref_col]
+                for c in constraints if c["type"] == "f"
+                for col, ref_col in zip(c["columns"], c["ref_columns"])
+            ],
+            "unique": [col for c in constraints if c["type"] == "u" for col in c["columns"]],
+            "samples": [],
+        })
+
+    if include_samples:
+        base_tables = [t for t in tables if t["kind"] == "table"]
+        if base_tables:
+            # One round trip for all tables; row_to_json keeps column order
+            union = " UNION ALL ".join(
+                f"(SELECT %s, row_to_json(x) FROM (SELECT * FROM \"{t['name']}\" LIMIT {SAMPLE_ROWS}) x)"
+                for t in base_tables
+            )
+            cur.execute(union, [t["name"] for t in base_tables])
+            by_name = {t["name"]: t for t in base_tables}
+            for name, row in cur.fetchall():
+                # Truncate long values
+                by_name[name]["samples"].append({
+                    k: (str(v)[:60] + '...' if len(str(v)) > 60 else str(v))
+                    for k, v in row.items() if v is not None
+                })
+
+    return tables
+
+
+def _cache_path(conn_params: dict) -> Path:
+    """Cache file for a database (host/port/dbname)."""
+    key = f"{conn_params.get('host')}_{conn_params.get('port')}_{conn_params['dbname']}"
+    safe = "".join(ch if ch.isalnum() else "_" for ch in key)
+    return CACHE_DIR / f"schema_{safe}.json"
+
+
+def get_schema_metadata(conn_params: dict, include_samples: bool = True,
+                        refresh: bool = False) -> dict:
     """
-    Read the full database schema and produce a text representation
-    suitable for injecting into an LLM system prompt.
-    
-    Returns a formatted string with:
-    - Table names, columns, types, constraints
-    - Foreign key relationships
-    - Row counts
-    - Sample data (optional)
+    Return structured schema metadata, from cache when the catalog is unchanged.
+
+    Returns dict with:
+    - dbname, fingerprint, include_samples, loaded_at
+    - tables: list of {name, kind, row_estimate, columns, pk, fks, unique, samples}
     """
     conn = get_db_connection(conn_params)
-    cur = conn.cursor()
-    
+    try:
+        cur = conn.cursor()
+        fingerprint = get_schema_fingerprint(cur)
+
+        def usable(meta: Optional[dict]) -> bool:
+            return (
+                meta is not None
+                and meta.get("fingerprint") == fingerprint
+                and (meta.get("include_samples") or not include_samples)
+            )
+
+        path = _cache_path(conn_params)
+        meta = None if refresh else _memory_cache.get(str(path))
+        if not refresh and not usable(meta) and path.exists():
+            try:
+                meta = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                meta = None
+
+        if not usable(meta):
+            meta = {
+                "dbname": conn_params["dbname"],
+                "fingerprint": fingerprint,
+                "include_samples": include_samples,
+                "loaded_at": time.time(),
+                "tables": _fetch_metadata(cur, include_samples),
+            }
+            try:
+                CACHE_DIR.mkdir(exist_ok=True)
+                path.write_text(json.dumps(meta), encoding="utf-8")
+            except OSError:
+                pass  # Cache is an optimisation; a read-only checkout still works
+
+        _memory_cache[str(path)] = meta
+        cur.close()
+        return meta
+    finally:
+        conn.close()
+
+
+def render_schema_context(meta: dict, include_samples: bool = True,
+                          tables: Optional[list[str]] = None) -> str:
+    """
+    Render schema metadata as the text block injected into the system prompt.
+
+    If `tables` is given, only those tables (and relationships between them)
+    are rendered.
+    """
+    selected = [t for t in meta["tables"] if tables is None or t["name"] in tables]
+    base_tables = [t for t in selected if t["kind"] == "table"]
+    views = [t for t in selected if t["kind"] == "view"]
+
     lines = []
     lines.append("=== POSTGRESQL DATABASE SCHEMA ===")
-    lines.append(f"Database: {conn_params['dbname']}\n")
-    
-    # ── Get all tables ──────────────────────────────────────────
-    cur.execute("""
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-          AND table_type = 'BASE TABLE'
-        ORDER BY table_name
-    """)
-    tables = [row[0] for row in cur.fetchall()]
-    
-    lines.append(f"Tables ({len(tables)}): {', '.join(tables)}\n")
-    
-    for table in tables:
-        # Row count
-        cur.execute(f'SELECT COUNT(*) FROM "{table}"')
-        row_count = cur.fetchone()[0]
-        
-        lines.append(f"── TABLE: {table} ({row_count:,} rows) ──")
-        
+    lines.append(f"Database: {meta['dbname']}\n")
+    lines.append(f"Tables ({len(base_tables)}): {', '.join(t['name'] for t in base_tables)}\n")
+
+    for table in base_tables:
+        lines.append(f"── TABLE: {table['name']} (~{table['row_estimate']:,} rows) ──")
+
         # ── Columns ────────────────────────────────────────────
-        cur.execute("""
-            SELECT column_name, data_type, is_nullable, column_default,
-                   character_maximum_length, numeric_precision, numeric_scale
-            FROM information_schema.columns
-            WHERE table_schema = 'public' AND table_name = %s
-            ORDER BY ordinal_position
-        """, (table,))
-        
-        columns = cur.fetchall()
-        for col in columns:
-            col_name, dtype, nullable, default, max_len, num_prec, num_scale = col
-            type_str = dtype
-            if max_len:
-                type_str += f"({max_len})"
-            elif num_prec and num_scale:
-                type_str += f"({num_prec},{num_scale})"
-            
+        for col in table["columns"]:
             extras = []
-            if nullable == 'NO':
+            if col["not_null"]:
                 extras.append("NOT NULL")
-            if default:
-                extras.append(f"DEFAULT {default}")
-            
+            if col["default"]:
+                extras.append(f"DEFAULT {col['default']}")
             extra_str = f"  [{', '.join(extras)}]" if extras else ""
-            lines.append(f"  {col_name}: {type_str}{extra_str}")
-        
-        # ── Primary key ───────────────────────────────────────
-        cur.execute("""
-            SELECT kcu.column_name
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu 
-              ON tc.constraint_name = kcu.constraint_name
-            WHERE tc.table_schema = 'public' 
-              AND tc.table_name = %s 
-              AND tc.constraint_type = 'PRIMARY KEY'
-            ORDER BY kcu.ordinal_position
-        """, (table,))
-        pk_cols = [row[0] for row in cur.fetchall()]
-        if pk_cols:
-            lines.append(f"  🔑 PK: ({', '.join(pk_cols)})")
-        
-        # ── Foreign keys ──────────────────────────────────────
-        cur.execute("""
-            SELECT
-                kcu.column_name,
-                ccu.table_name AS ref_table,
-                ccu.column_name AS ref_column
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu
-              ON tc.constraint_name = kcu.constraint_name
-            JOIN information_schema.constraint_column_usage ccu
-              ON tc.constraint_name = ccu.constraint_name
-            WHERE tc.table_schema = 'public'
-              AND tc.table_name = %s
-              AND tc.constraint_type = 'FOREIGN KEY'
-        """, (table,))
-        fks = cur.fetchall()
-        for fk in fks:
-            lines.append(f"  🔗 FK: {fk[0]} → {fk[1]}.{fk[2]}")
-        
-        # ── Unique constraints ────────────────────────────────
-        cur.execute("""
-            SELECT kcu.column_name
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu
-              ON tc.constraint_name = kcu.constraint_name
-            WHERE tc.table_schema = 'public'
-              AND tc.table_name = %s
-              AND tc.constraint_type = 'UNIQUE'
-            ORDER BY tc.constraint_name, kcu.ordinal_position
-        """, (table,))
-        uniq_cols = [row[0] for row in cur.fetchall()]
-        if uniq_cols:
-            lines.append(f"  🔒 UNIQUE: ({', '.join(uniq_cols)})")
-        
+            lines.append(f"  {col['name']}: {col['type']}{extra_str}")
+
+        # ── Keys ──────────────────────────────────────────────
+        if table["pk"]:
+            lines.append(f"  🔑 PK: ({', '.join(table['pk'])})")
+        for col, ref_table, ref_col in table["fks"]:
+            lines.append(f"  🔗 FK: {col} → {ref_table}.{ref_col}")
+        if table["unique"]:
+            lines.append(f"  🔒 UNIQUE: ({', '.join(table['unique'])})")
+
         # ── Sample data ───────────────────────────────────────
-        if include_samples and row_count > 0:
-            col_names = [c[0] for c in columns]
-            cur.execute(f'SELECT * FROM "{table}" LIMIT 3')
-            samples = cur.fetchall()
-            if samples:
-                lines.append(f"  📋 Sample ({min(3, row_count)} rows):")
-                for sample in samples:
-                    row_dict = dict(zip(col_names, sample))
-                    # Truncate long values
-                    truncated = {k: (str(v)[:60] + '...' if len(str(v)) > 60 else str(v)) 
-                                 for k, v in row_dict.items() if v is not None}
-                    lines.append(f"    {truncated}")
-        
+        if include_samples and table["samples"]:
+            lines.append(f"  📋 Sample ({len(table['samples'])} rows):")
+            for sample in table["samples"]:
+                lines.append(f"    {sample}")
+
         lines.append("")  # blank line between tables
-    
+
+    # ── Materialized views ────────────────────────────────────
+    if views:
+        lines.append("=== MATERIALIZED VIEWS ===")
+        for view in views:
+            lines.append(f"── VIEW: {view['name']} ──")
+            for col in view["columns"]:
+                lines.append(f"  {col['name']}: {col['type']}")
+            lines.append("")
+
     # ── Relationship summary ──────────────────────────────────
-    cur.execute("""
-        SELECT
-            tc.table_name AS from_table,
-            kcu.column_name AS from_col,
-            ccu.table_name AS to_table,
-            ccu.column_name AS to_col
-        FROM information_schema.table_constraints tc
-        JOIN information_schema.key_column_usage kcu
-          ON tc.constraint_name = kcu.constraint_name
-        JOIN information_schema.constraint_column_usage ccu
-          ON tc.constraint_name = ccu.constraint_name
-        WHERE tc.constraint_type = 'FOREIGN KEY'
-          AND tc.table_schema = 'public'
-        ORDER BY tc.table_name
-    """)
-    relationships = cur.fetchall()
-    
+    names = {t["name"] for t in selected}
+    relationships = [
+        (t["name"], col, ref_table, ref_col)
+        for t in base_tables
+        for col, ref_table, ref_col in t["fks"]
+        if ref_table in names
+    ]
     if relationships:
         lines.append("=== FOREIGN KEY RELATIONSHIPS ===")
         for rel in relationships:
             lines.append(f"  {rel[0]}.{rel[1]} → {rel[2]}.{rel[3]}")
         lines.append("")
-    
+
     # ── Common join patterns ──────────────────────────────────
-    lines.append("=== COMMON JOIN PATTERNS ===")
-    lines.append("  fund_master JOIN amc_master ON fund_master.amc_id = amc_master.amc_id")
-    lines.append("  portfolio_holdings JOIN fund_master ON portfolio_holdings.fund_id = fund_master.fund_id")
-    lines.append("  portfolio_holdings JOIN security_master ON portfolio_holdings.security_id = security_master.security_id")
-    lines.append("  fund_sector_exposure JOIN fund_master ON fund_sector_exposure.fund_id = fund_master.fund_id")
-    lines.append("  fund_monthly_metrics JOIN fund_master ON fund_monthly_metrics.fund_id = fund_master.fund_id")
-    lines.append("  fund_manager_mapping JOIN fund_master ON fund_manager_mapping.fund_id = fund_master.fund_id")
-    lines.append("  fund_manager_mapping JOIN fund_manager_master ON fund_manager_mapping.manager_id = fund_manager_master.manager_id")
-    lines.append("")
-    
-    cur.close()
-    conn.close()
-    
+    if tables is None:
+        lines.append("=== COMMON JOIN PATTERNS ===")
+        lines.append("  fund_master JOIN amc_master ON fund_master.amc_id = amc_master.amc_id")
+        lines.append("  portfolio_holdings JOIN fund_master ON portfolio_holdings.fund_id = fund_master.fund_id")
+        lines.append("  portfolio_holdings JOIN security_master ON portfolio_holdings.security_id = security_master.security_id")
+        lines.append("  fund_sector_exposure JOIN fund_master ON fund_sector_exposure.fund_id = fund_master.fund_id")
+        lines.append("  fund_monthly_metrics JOIN fund_master ON fund_monthly_metrics.fund_id = fund_master.fund_id")
+        lines.append("  fund_manager_mapping JOIN fund_master ON fund_manager_mapping.fund_id = fund_master.fund_id")
+        lines.append("  fund_manager_mapping JOIN fund_manager_master ON fund_manager_mapping.manager_id = fund_manager_master.manager_id")
+        lines.append("")
+
     return "\n".join(lines)
 
 
+def get_schema_context(conn_params: dict, include_samples: bool = True) -> str:
+    """
+    Read the full database schema and produce a text representation
+    suitable for injecting into an LLM system prompt.
+
+    Returns a formatted string with:
+    - Table names, columns, types, constraints
+    - Foreign key relationships
+    - Estimated row counts
+    - Sample data (optional)
+    """
+    meta = get_schema_metadata(conn_params, include_samples=include_samples)
+    return render_schema_context(meta, include_samples=include_samples)
+
+
 def get_table_summary(conn_params: dict) -> str:
-    """Get a quick summary of all tables and their row counts."""
-    conn = get_db_connection(conn_params)
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-          AND table_type = 'BASE TABLE'
-        ORDER BY table_name
-    """)
-    tables = [row[0] for row in cur.fetchall()]
-    
-    lines = [f"{'Table':<40} {'Rows':>10}",  "─" * 52]
+    """Get a quick summary of all tables and their estimated row counts."""
+    meta = get_schema_metadata(conn_params, include_samples=False)
+
+    lines = [f"{'Table':<40} {'Rows (est.)':>12}",  "─" * 54]
     total = 0
-    for table in tables:
-        cur.execute(f'SELECT COUNT(*) FROM "{table}"')
-        count = cur.fetchone()[0]
+    for table in meta["tables"]:
+        if table["kind"] != "table":
+            continue
+        count = table["row_estimate"]
         total += count
-        lines.append(f"{table:<40} {count:>10,}")
-    
-    lines.append("─" * 52)
-    lines.append(f"{'TOTAL':<40} {total:>10,}")
-    
-    cur.close()
-    conn.close()
-    
+        lines.append(f"{table['name']:<40} {count:>12,}")
+
+    lines.append("─" * 54)
+    lines.append(f"{'TOTAL':<40} {total:>12,}")
+
     return "\n".join(lines)
 
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
     import os
-    
+
     load_dotenv()
-    
+
     params = {
         "host": os.getenv("DB_HOST", "localhost"),
         "port": int(os.getenv("DB_PORT", 5432)),
@@ -227,9 +326,13 @@ if __name__ == "__main__":
         "user": os.getenv("DB_USER", "postgres"),
         "password": os.getenv("DB_PASSWORD", "vivek"),
     }
-    
+
+    start = time.perf_counter()
     print(get_table_summary(params))
-    print("\n\n")
+    print(f"\nSummary in {(time.perf_counter() - start) * 1000:.1f}ms\n\n")
+
+    start = time.perf_counter()
     schema = get_schema_context(params)
-    print(f"Schema context length: {len(schema):,} characters")
+    print(f"Schema context length: {len(schema):,} characters "
+          f"({(time.perf_counter() - start) * 1000:.1f}ms)")
     print(schema[:2000])
@@ -0,0 +1,213 @@
+"""
+Schema Retriever
+Picks the tables relevant to a question so the system prompt only carries
+that slice of the schema instead of every table, sample and FK.
+
+Tables are scored against the question with a local keyword index built
+from schema metadata (table and column name tokens) plus a small domain
+synonym map. Matches are weighted by how few tables share the token, so a
+wide denormalized table that mentions every column does not crowd out the
+table a word actually names. Tables on the foreign-key paths between the
+chosen ones are added so the model still sees every join it needs.
+"""
+
+import re
+from collections import deque
+
+from schema_introspect import render_schema_context
+
+# Question word → schema tokens it stands for
+SYNONYMS = {
+    "amc": ["amc"],
+    "house": ["amc"],
+    "sbi": ["amc"],
+    "axis": ["amc"],
+    "kotak": ["amc"],
+    "nippon": ["amc"],
+    "motilal": ["amc"],
+    "bajaj": ["amc"],
+    "edelweiss": ["amc"],
+    "hdfc": ["amc"],
+    "icici": ["amc"],
+    "fund": ["fund", "scheme"],
+    "scheme": ["fund", "scheme"],
+    "mf": ["fund", "amc"],
+    "stock": ["security"],
+    "share": ["security"],
+    "equity": ["security"],
+    "company": ["security"],
+    "companie": ["security"],
+    "isin": ["security", "isin"],
+    "security": ["security"],
+    "securitie": ["security"],
+    "sector": ["sector", "industry", "security", "portfolio"],
+    "industry": ["sector", "industry", "security", "portfolio"],
+    "holding": ["holding", "portfolio"],
+    "hold": ["holding", "portfolio"],
+    "held": ["holding", "portfolio"],
+    "own": ["holding", "portfolio"],
+    "portfolio": ["holding", "portfolio"],
+    "weight": ["pct", "weight", "portfolio"],
+    "allocation": ["pct", "exposure", "portfolio"],
+    "exposure": ["exposure", "pct"],
+    "value": ["value"],
+    "bought": ["change", "added", "new"],
+    "buy": ["change", "added", "new"],
+    "buying": ["change", "added", "new"],
+    "added": ["change", "added", "new"],
+    "sold": ["change", "trimmed", "exited"],
+    "sell": ["change", "trimmed", "exited"],
+    "selling": ["change", "trimmed", "exited"],
+    "exit": ["change", "exited"],
+    "exited": ["change", "exited"],
+    "trimmed": ["change", "trimmed"],
+    "change": ["change", "delta"],
+    "streak": ["streak", "window"],
+    "consecutive": ["streak", "window"],
+    "rolling": ["window", "avg"],
+    "average": ["avg", "window"],
+    "latest": ["current"],
+    "current": ["current"],
+    "manager": ["manager"],
+    "aum": ["aum", "metrics"],
+    "nav": ["nav", "metrics"],
+    "return": ["return", "metrics"],
+    "style": ["style"],
+    "cap": ["cap", "style"],
+}
+
+# Words that never identify a table
+_IGNORE = {
+    "the", "a", "an", "of", "for", "in", "on", "to", "by", "and", "or", "me",
+    "show", "list", "give", "what", "which", "who", "how", "many", "much",
+    "top", "is", "are", "with", "per", "each", "all", "id", "name", "date",
+}
+
+# Always-relevant anchor if nothing scores
+DEFAULT_TABLES = ["portfolio_holdings", "fund_master", "amc_master", "security_master"]
+
+
+def _tokens(text: str) -> list[str]:
+    """Lowercase word tokens with trailing plural 's' folded."""
+    out = []
+    for w in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss") and w not in SYNONYMS:
+            w = w[:-1]
+        out.append(w)
+    return out
+
+
+class SchemaRetriever:
+    """Keyword/synonym index over schema metadata from get_schema_metadata()."""
+
+    # Maximum tables selected by score (join-path tables come on top)
+    MAX_TABLES = 4
+
+    # Minimum score for a table to be selected
+    MIN_SCORE = 1.5
+
+    # Weight of a table-name token match / column-name token match, before
+    # dividing by the number of tables sharing the token
+    NAME_WEIGHT = 3.0
+    COLUMN_WEIGHT = 1.0
+
+    # Cap on the column-match part of a table's score
+    MAX_COLUMN_SCORE = 2.0
+
+    def __init__(self, schema_meta: dict, include_samples: bool = True):
+        self.meta = schema_meta
+        self.include_samples = include_samples
+        self.table_names = {t["name"] for t in schema_meta["tables"]}
+
+        # token → tables whose name / columns contain it
+        self.name_index: dict[str, set[str]] = {}
+        self.column_index: dict[str, set[str]] = {}
+        for table in schema_meta["tables"]:
+            for tok in _tokens(table["name"].replace("_", " ")):
+                self._add(self.name_index, tok, table["name"])
+            for col in table["columns"]:
+                for tok in _tokens(col["name"].replace("_", " ")):
+                    self._add(self.column_index, tok, table["name"])
+
+        # Undirected FK graph for join paths
+        self.graph: dict[str, set[str]] = {name: set() for name in self.table_names}
+        for table in schema_meta["tables"]:
+            for _, ref_table, _ in table["fks"]:
+                if ref_table in self.graph:
+                    self.graph[table["name"]].add(ref_table)
+                    self.graph[ref_table].add(table["name"])
+
+    @staticmethod
+    def _add(index: dict[str, set[str]], token: str, table: str):
+        if token not in _IGNORE:
+            index.setdefault(token, set()).add(table)
+
+    def score_tables(self, question: str) -> dict[str, float]:
+        """
+        Score tables against a question.
+
+        Only tables whose name matches some question word (directly or via
+        a synonym) are scored; column matches add a capped bonus.
+        """
+        name_scores: dict[str, float] = {}
+        column_scores: dict[str, float] = {}
+        for word in set(_tokens(question)) - _IGNORE:
+            for tok in {word, *SYNONYMS.get(word, [])}:
+                tables = self.name_index.get(tok, ())
+                for table in tables:
+                    name_scores[table] = name_scores.get(table, 0) + self.NAME_WEIGHT / len(tables)
+                tables = self.column_index.get(tok, ())
+                for table in tables:
+                    column_scores[table] = column_scores.get(table, 0) + self.COLUMN_WEIGHT / len(tables)
+        return {
+            table: score + min(column_scores.get(table, 0), self.MAX_COLUMN_SCORE)
+            for table, score in name_scores.items()
+        }
+
+    def _shortest_path(self, start: str, targets: set[str]) -> list[str]:
+        """BFS from start to the nearest table in targets; [] if unreachable."""
+        prev = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node in targets:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = prev[node]
+                return path
+            for nxt in sorted(self.graph.get(node, ())):
+                if nxt not in prev:
+                    prev[nxt] = node
+                    queue.append(nxt)
+        return []
+
+    def select_tables(self, question: str) -> list[str]:
+        """Relevant tables for a question, closed over FK join paths."""
+        scores = self.score_tables(question)
+        ranked = sorted(
+            (t for t, s in scores.items() if s >= self.MIN_SCORE),
+            key=lambda t: (-scores[t], t),
+        )[:self.MAX_TABLES]
+
+        if not ranked:
+            ranked = [t for t in DEFAULT_TABLES if t in self.table_names]
+
+        # Connect each chosen table to the tree built so far
+        selected = [ranked[0]] if ranked else []
+        for table in ranked[1:]:
+            if table in selected:
+                continue
+            path = self._shortest_path(table, set(selected))
+            for node in path or [table]:
+                if node not in selected:
+                    selected.append(node)
+        return selected
+
+    def build_context(self, question: str) -> tuple[str, list[str]]:
+        """Render the schema slice for a question. Returns (context, tables)."""
+        tables = self.select_tables(question)
+        context = render_schema_context(
+            self.meta, include_samples=self.include_samples, tables=tables
+        )
+        return context, tables
@@ -0,0 +1,339 @@
+"""
+SQL Templates
+Turns generated SQL into a canonical, parameterized template so queries
+that differ only in whitespace, case, table aliases or literal values are
+recognised as the same query shape.
+
+    SELECT ph.* FROM portfolio_holdings ph WHERE ph.fund_id = 12 LIMIT 50
+    select x.*  from portfolio_holdings x  where x.fund_id = 7  limit 10
+
+both become
+
+    select t1.* from portfolio_holdings t1 where t1.fund_id = $1 limit $2
+
+Templates key the server-side prepared statements in SafeExecutor and the
+per-template latency statistics shown by /templates.
+
+Literals are lifted conservatively, because a parameter's type is inferred
+from its context and must not change what the query means:
+- strings are lifted, except typed literals (DATE '...', INTERVAL '...'),
+  E'' / dollar-quoted strings and type modifiers like numeric(10, 2)
+- numbers are lifted only where the other side fixes their type:
+  after a comparison, in LIMIT / OFFSET / BETWEEN, and in IN (...) lists.
+  ORDER BY 2, arithmetic and CASE ... THEN 1 keep their literals.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict, deque
+from decimal import Decimal
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<ws>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    | (?P<param>\$\d+)
+    | (?P<estring>[eE]'(?:[^'\\]|\\.|'')*')
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<qident>"(?:[^"]|"")*")
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<ident>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<op>::|<=|>=|<>|!=|\|\||[^\s])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# A string right after one of these is a typed literal (DATE '2025-01-31')
+_TYPED_LITERAL_WORDS = {
+    "date", "interval", "time", "timetz", "timestamp", "timestamptz", "zone",
+}
+
+# Numbers inside parentheses after these are type modifiers (numeric(10, 2))
+_TYPE_NAMES = {
+    "numeric", "decimal", "varchar", "char", "character", "varying", "bit",
+    "float", "time", "timestamp", "interval",
+}
+
+# Previous token that fixes the type of a following number
+_NUMBER_CONTEXT = {"=", "<", ">", "<=", ">=", "<>", "!=", "limit", "offset", "between"}
+
+# Words that end a table reference, so they are never read as an alias
+_NOT_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural",
+    "on", "using", "group", "order", "having", "limit", "offset", "union",
+    "except", "intersect", "window", "fetch", "for", "lateral", "as",
+    "tablesample", "select", "with",
+}
+
+# Keywords that end a FROM list
+_END_FROM = {
+    "where", "group", "order", "having", "limit", "offset", "union",
+    "except", "intersect", "window", "fetch", "for", "select",
+}
+
+
+def _tokenize(sql: str) -> list[tuple[str, str]]:
+    """(kind, text) tokens without whitespace and comments."""
+    tokens = []
+    for m in _TOKEN_RE.finditer(sql):
+        kind = m.lastgroup
+        if kind == "tag":
+            kind = "dollar"
+        if kind in ("ws", "comment"):
+            continue
+        text = m.group(kind)
+        if kind == "ident":
+            text = text.lower()
+        tokens.append((kind, text))
+    while tokens and tokens[-1] == ("op", ";"):
+        tokens.pop()
+    return tokens
+
+
+def _to_param(kind: str, text: str):
+    """Python value for a lifted literal."""
+    if kind == "string":
+        return text[1:-1].replace("''", "'")
+    if re.fullmatch(r"\d+", text):
+        return int(text)
+    return Decimal(text)
+
+
+def _table_aliases(tokens: list[tuple[str, str]]) -> dict[int, str]:
+    """Token index → alias name for aliases defined on FROM / JOIN tables."""
+    aliases = {}
+    in_from = [False]
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if text == "(":
+            in_from.append(False)
+        elif text == ")":
+            if len(in_from) > 1:
+                in_from.pop()
+        elif kind == "ident" and text in _END_FROM:
+            in_from[-1] = False
+
+        starts_ref = kind == "ident" and text in ("from", "join")
+        if kind == "ident" and text == "from":
+            in_from[-1] = True
+        if text == "," and in_from[-1]:
+            starts_ref = True
+
+        if starts_ref:
+            # Table name, possibly schema-qualified
+            j = i + 1
+            if j < len(tokens) and tokens[j][0] in ("ident", "qident") and tokens[j][1] not in _NOT_ALIAS:
+                j += 1
+                while j + 1 < len(tokens) and tokens[j][1] == "." and tokens[j + 1][0] in ("ident", "qident"):
+                    j += 2
+                if j < len(tokens) and tokens[j][1] == "as":
+                    j += 1
+                if (
+                    j < len(tokens)
+                    and tokens[j][0] == "ident"
+                    and tokens[j][1] not in _NOT_ALIAS
+                    and (j + 1 >= len(tokens) or tokens[j + 1][1] != "(")
+                ):
+                    aliases[j] = tokens[j][1]
+                i = j
+        i += 1
+    return aliases
+
+
+def _normalize_aliases(tokens: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """Rename table aliases to t1, t2, ... in order of definition."""
+    defined = _table_aliases(tokens)
+    if not defined:
+        return tokens
+    used = {text for kind, text in tokens if kind == "ident"}
+
+    rename = {}
+    n = 0
+    for idx in sorted(defined):
+        name = defined[idx]
+        if name in rename:
+            continue
+        # Whole-row references (row_to_json(ph)) would need scope analysis;
+        # keep such aliases as they are
+        bare = any(
+            kind == "ident" and text == name and k not in defined
+            and not (k + 1 < len(tokens) and tokens[k + 1][1] == ".")
+            and not (k > 0 and tokens[k - 1][1] == ".")
+            for k, (kind, text) in enumerate(tokens)
+        )
+        if bare:
+            continue
+        n += 1
+        while f"t{n}" in used:
+            n += 1
+        rename[name] = f"t{n}"
+
+    out = []
+    for k, (kind, text) in enumerate(tokens):
+        if kind == "ident" and text in rename and (
+            k in defined or (k + 1 < len(tokens) and tokens[k + 1][1] == ".")
+        ) and not (k > 0 and tokens[k - 1][1] == "."):
+            text = rename[text]
+        out.append((kind, text))
+    return out
+
+
+def _render(tokens: list[tuple[str, str]]) -> str:
+    """Join tokens with single spaces, tight around . :: ( ) [ ] and commas."""
+    parts = []
+    prev = None
+    for kind, text in tokens:
+        if prev is not None:
+            tight = (
+                text in (",", ")", "]", ".", "::")
+                or prev[1] in ("(", "[", ".", "::")
+                or (text in ("(", "[") and prev[0] in ("ident", "qident"))
+            )
+            if not tight:
+                parts.append(" ")
+        parts.append(text)
+        prev = (kind, text)
+    return "".join(parts)
+
+
+def canonicalize(sql: str) -> tuple[str, list]:
+    """
+    Canonical template and lifted parameters for a SQL query.
+
+    Returns (template, params) where template uses $1..$n placeholders in
+    the order params are listed. SQL that already contains $n placeholders
+    is normalized but nothing is lifted.
+    """
+    tokens = _normalize_aliases(_tokenize(sql))
+    if any(kind == "param" for kind, _ in tokens):
+        return _render(tokens), []
+
+    out = []
+    params = []
+    # One entry per open parenthesis: "type" (type modifiers), "in" (IN list) or None
+    parens = []
+    # True between BETWEEN and its AND, so "BETWEEN 1 AND 5" lifts both bounds
+    in_between = False
+    between_and = False
+    prev = (None, None)
+    for kind, text in tokens:
+        lift = False
+        if kind == "string":
+            lift = prev[1] not in _TYPED_LITERAL_WORDS and parens[-1:] != ["type"]
+        elif kind == "number":
+            in_list = parens[-1:] == ["in"] and prev[1] in ("(", ",")
+            lift = prev[1] in _NUMBER_CONTEXT or in_list or (prev[1] == "and" and between_and)
+            if parens[-1:] == ["type"]:
+                lift = False
+
+        between_and = False
+        if text == "between":
+            in_between = True
+        elif text == "and" and in_between:
+            in_between = False
+            between_and = True
+
+        if text == "(":
+            if prev[0] == "ident" and prev[1] in _TYPE_NAMES:
+                parens.append("type")
+            elif prev[1] == "in":
+                parens.append("in")
+            else:
+                parens.append(None)
+        elif text == ")" and parens:
+            parens.pop()
+
+        if lift:
+            params.append(_to_param(kind, text))
+            out.append(("param", f"${len(params)}"))
+        else:
+            out.append((kind, text))
+        prev = (kind, text)
+
+    return _render(out), params
+
+
+def statement_name(template: str) -> str:
+    """Stable prepared-statement name for a template."""
+    return "nlq_" + hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class TemplateStats:
+    """Per-template execution counts and latency percentiles."""
+
+    def __init__(self, max_templates: int = 500, window: int = 200):
+        """
+        Args:
+            max_templates: least recently run templates beyond this are dropped
+            window: latencies kept per template for percentiles
+        """
+        self.max_templates = max_templates
+        self.window = window
+        self._stats: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, template: str) -> int:
+        """How many times a template has run."""
+        with self._lock:
+            entry = self._stats.get(template)
+            return entry["count"] if entry else 0
+
+    def record(self, template: str, elapsed_ms: float, prepared: bool = False):
+        """Record one execution of a template."""
+        with self._lock:
+            entry = self._stats.get(template)
+            if entry is None:
+                entry = {
+                    "count": 0, "prepared": 0, "total_ms": 0.0,
+                    "latencies": deque(maxlen=self.window),
+                }
+                self._stats[template] = entry
+            entry["count"] += 1
+            entry["prepared"] += int(prepared)
+            entry["total_ms"] += elapsed_ms
+            entry["latencies"].append(elapsed_ms)
+            self._stats.move_to_end(template)
+            while len(self._stats) > self.max_templates:
+                self._stats.popitem(last=False)
+
+    def top(self, limit: int = 10) -> list[dict]:
+        """Templates ordered by total time spent, heaviest first."""
+        with self._lock:
+            rows = []
+            for template, entry in self._stats.items():
+                lat = sorted(entry["latencies"])
+                rows.append({
+                    "template": template,
+                    "count": entry["count"],
+                    "prepared": entry["prepared"],
+                    "total_ms": round(entry["total_ms"], 1),
+                    "p50_ms": round(_percentile(lat, 50), 1),
+                    "p95_ms": round(_percentile(lat, 95), 1),
+                })
+        rows.sort(key=lambda r: -r["total_ms"])
+        return rows[:limit]
+
+    def format_stats(self, limit: int = 10) -> str:
+        """Human-readable summary of the heaviest templates."""
+        rows = self.top(limit)
+        if not rows:
+            return "  No queries executed yet."
+        lines = []
+        for i, r in enumerate(rows, 1):
+            template = r["template"] if len(r["template"]) <= 160 else r["template"][:157] + "..."
+            lines.append(
+                f"  {i}. {r['count']}× ({r['prepared']} prepared)  "
+                f"total {r['total_ms']:,.0f}ms  p50 {r['p50_ms']}ms  p95 {r['p95_ms']}ms"
+            )
+            lines.append(f"     {template}")
+        return "\n".join(lines)
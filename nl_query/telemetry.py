@@ -0,0 +1,306 @@
+"""
+Query Telemetry
+Append-only JSONL log of every executed query, and the latency report built
+from it.
+
+Each line records where the query came from (cli / batch / service), the
+question, SQL hash and canonical template (sql_template), the model with
+its latency and token counts, database latency, row count, truncation and
+whether the result came from the cache or a canned intent. The log is
+plain JSONL so it can be grepped, tailed or loaded into pandas.
+
+Usage:
+    cd nl_query
+    python telemetry.py                      # report over the whole log
+    python telemetry.py --since 7d --top 20
+    python telemetry.py --json > report.json
+
+The interactive app shows the same report with /stats.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from query_cache import normalize_sql
+from sql_template import canonicalize, statement_name
+
+DEFAULT_LOG_PATH = Path(__file__).parent / "logs" / "query_log.jsonl"
+
+# Latency fields summarized with percentiles
+LATENCY_FIELDS = ("llm_ms", "ttft_ms", "db_ms", "total_ms")
+
+
+def get_log_path() -> Optional[Path]:
+    """Log file from TELEMETRY_LOG; None if TELEMETRY=0."""
+    if os.getenv("TELEMETRY", "1") == "0":
+        return None
+    return Path(os.getenv("TELEMETRY_LOG") or DEFAULT_LOG_PATH)
+
+
+def sql_hash(sql: str) -> str:
+    """Short stable hash of the normalized SQL text."""
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+class TelemetryLog:
+    """Thread-safe JSONL appender for executed-query records."""
+
+    def __init__(self, path, source: str = "cli"):
+        """
+        Args:
+            path: JSONL file (created with its directory on first write)
+            source: tag stored on every record (cli, batch, service, ...)
+        """
+        self.path = Path(path)
+        self.source = source
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        sql: str,
+        result: Optional[dict] = None,
+        question: Optional[str] = None,
+        llm: Optional[dict] = None,
+        **extra,
+    ):
+        """
+        Append one executed query.
+
+        Args:
+            sql: the SQL that ran
+            result: SafeExecutor result dict (success, row_count, truncated,
+                execution_time_ms, error)
+            question: natural-language question, if any
+            llm: model call stats (model, llm_ms, ttft_ms, prompt_tokens,
+                completion_tokens, tokens_estimated); None when no model ran
+            extra: further fields: sql_source ("llm", "race", "cache",
+                "intent"), intent, cached (result served from the cache),
+                streamed, speculative (started while the answer streamed),
+                total_ms
+        """
+        result = result or {}
+        template, _ = canonicalize(sql)
+        llm = llm or {}
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "source": self.source,
+            "question": question,
+            "sql_hash": sql_hash(sql),
+            "template_hash": statement_name(template),
+            "template": template,
+            "model": llm.get("model"),
+            "llm_ms": llm.get("llm_ms"),
+            "ttft_ms": llm.get("ttft_ms"),
+            "prompt_tokens": llm.get("prompt_tokens"),
+            "completion_tokens": llm.get("completion_tokens"),
+            "tokens_estimated": llm.get("tokens_estimated"),
+            "db_ms": result.get("execution_time_ms"),
+            "rows": result.get("row_count"),
+            "truncated": result.get("truncated"),
+            "success": result.get("success"),
+            "error": (result.get("error") or "")[:300] or None,
+            "sql_source": None,
+            "intent": None,
+            "cached": False,
+        }
+        record.update(extra)
+        if record.get("cached"):
+            record["db_ms"] = None
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError:
+            # Telemetry must never break a query
+            pass
+
+
+def read_records(path, since: Optional[datetime] = None) -> Iterator[dict]:
+    """Records from a log file, optionally only those at or after since."""
+    path = Path(path)
+    if not path.exists():
+        return
+    cutoff = since.isoformat() if since else None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if cutoff and record.get("ts", "") < cutoff:
+                continue
+            yield record
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def _latency(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "max": max(values) if values else None,
+    }
+
+
+def summarize(records, top: int = 10) -> dict:
+    """
+    Latency percentiles, token totals and the slowest templates.
+
+    Templates are ranked by p95 database latency over their uncached runs.
+    """
+    records = list(records)
+    by_template = {}
+    latencies = {field: [] for field in LATENCY_FIELDS}
+    tokens = {"prompt": 0, "completion": 0, "estimated_calls": 0, "calls": 0}
+    models = {}
+    failures = cached = truncated = 0
+
+    for r in records:
+        for field in LATENCY_FIELDS:
+            if r.get(field) is not None:
+                latencies[field].append(r[field])
+        if r.get("llm_ms") is not None:
+            model = r.get("model") or "unknown"
+            models[model] = models.get(model, 0) + 1
+            tokens["calls"] += 1
+            tokens["prompt"] += r.get("prompt_tokens") or 0
+            tokens["completion"] += r.get("completion_tokens") or 0
+            tokens["estimated_calls"] += int(bool(r.get("tokens_estimated")))
+        failures += int(r.get("success") is False)
+        cached += int(bool(r.get("cached")))
+        truncated += int(bool(r.get("truncated")))
+
+        if r.get("db_ms") is None:
+            continue
+        entry = by_template.setdefault(r["template_hash"], {
+            "template": r.get("template", ""),
+            "db_ms": [],
+            "rows": 0,
+            "questions": set(),
+        })
+        entry["db_ms"].append(r["db_ms"])
+        entry["rows"] += r.get("rows") or 0
+        if r.get("question"):
+            entry["questions"].add(r["question"])
+
+    slowest = []
+    for template_hash, entry in by_template.items():
+        lat = entry["db_ms"]
+        slowest.append({
+            "template_hash": template_hash,
+            "template": entry["template"],
+            "runs": len(lat),
+            "p50_ms": _percentile(lat, 50),
+            "p95_ms": _percentile(lat, 95),
+            "total_ms": round(sum(lat), 1),
+            "avg_rows": round(entry["rows"] / len(lat), 1),
+            "example_question": min(entry["questions"], key=len) if entry["questions"] else None,
+        })
+    slowest.sort(key=lambda t: (-t["p95_ms"], -t["total_ms"]))
+
+    return {
+        "queries": len(records),
+        "first": records[0]["ts"] if records else None,
+        "last": records[-1]["ts"] if records else None,
+        "failures": failures,
+        "cached": cached,
+        "truncated": truncated,
+        "models": models,
+        "tokens": tokens,
+        "latency": {field: _latency(values) for field, values in latencies.items()},
+        "slowest_templates": slowest[:top],
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value:,.0f}ms"
+
+
+def format_report(summary: dict) -> str:
+    """Human-readable version of summarize()."""
+    if not summary["queries"]:
+        return "  No queries logged yet."
+    lines = [
+        f"  {summary['queries']:,} queries  ({summary['first'][:16]} → {summary['last'][:16]})",
+        f"  {summary['failures']} failed • {summary['cached']} from cache • {summary['truncated']} truncated",
+        "",
+        f"  {'':<10} {'count':>7} {'p50':>10} {'p95':>10} {'max':>10}",
+    ]
+    for field, label in (("llm_ms", "LLM"), ("ttft_ms", "TTFT"), ("db_ms", "Database"), ("total_ms", "End-to-end")):
+        s = summary["latency"][field]
+        if s["count"]:
+            lines.append(f"  {label:<10} {s['count']:>7,} {_ms(s['p50']):>10} {_ms(s['p95']):>10} {_ms(s['max']):>10}")
+
+    tokens = summary["tokens"]
+    if tokens["calls"]:
+        estimated = f" ({tokens['estimated_calls']} estimated)" if tokens["estimated_calls"] else ""
+        lines.append("")
+        lines.append(
+            f"  Tokens: {tokens['prompt']:,} prompt + {tokens['completion']:,} completion "
+            f"over {tokens['calls']:,} model calls{estimated}"
+        )
+        lines.append("  Models: " + ", ".join(f"{m} ×{n}" for m, n in summary["models"].items()))
+
+    if summary["slowest_templates"]:
+        lines.append("")
+        lines.append("  Slowest templates (by p95 database time):")
+        for i, t in enumerate(summary["slowest_templates"], 1):
+            template = " ".join(t["template"].split())
+            template = template if len(template) <= 160 else template[:157] + "..."
+            lines.append(
+                f"  {i}. {t['runs']}× p50 {_ms(t['p50_ms'])}  p95 {_ms(t['p95_ms'])}  "
+                f"total {_ms(t['total_ms'])}  ~{t['avg_rows']:,} rows"
+            )
+            lines.append(f"     {template}")
+            if t["example_question"]:
+                lines.append(f"     e.g. \"{t['example_question'][:100]}\"")
+    return "\n".join(lines)
+
+
+def parse_since(value: str) -> datetime:
+    """'7d', '12h', '30m' or an ISO date/time."""
+    units = {"d": "days", "h": "hours", "m": "minutes"}
+    if value[-1:] in units and value[:-1].isdigit():
+        return datetime.now() - timedelta(**{units[value[-1]]: int(value[:-1])})
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency report from the query telemetry log")
+    parser.add_argument("--log", default=None, help=f"Log file (default TELEMETRY_LOG or {DEFAULT_LOG_PATH})")
+    parser.add_argument("--since", default=None, help="Only records newer than this (7d, 12h, 30m or ISO time)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest templates to list (default 10)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    path = Path(args.log) if args.log else (get_log_path() or DEFAULT_LOG_PATH)
+    since = parse_since(args.since) if args.since else None
+
+    summary = summarize(read_records(path, since), top=args.top)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Query telemetry — {path}")
+        print(format_report(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Intent router phrasing tests against a stubbed fund / AMC catalog.
+
+Run from the repository root:
+    python -m pytest -q nl_query/tests
+"""
+
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from intent_router import IntentRouter, grouping
+
+AMCS = [(1, "Axis Mutual Fund", "AXIS"), (2, "HDFC Mutual Fund", "HDFC")]
+FUNDS = [
+    (10, 1, "Axis Nifty 500 Index Fund - Direct Growth"),
+    (11, 1, "Axis Consumption Fund"),
+    (20, 2, "HDFC Flexi Cap Fund"),
+]
+
+
+class _Cursor:
+    def __init__(self):
+        self._sql = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self._sql = sql
+
+    def fetchall(self):
+        return AMCS if "amc_master" in self._sql else FUNDS
+
+    def fetchone(self):
+        # holdings_change and current_holdings both exist
+        return True, True
+
+
+class _Conn:
+    def cursor(self):
+        return _Cursor()
+
+
+class _Executor:
+    @contextmanager
+    def connection(self, read=False):
+        yield _Conn()
+
+    def get_data_version(self):
+        return 1
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(_Executor())
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Top 10 holdings of Axis Nifty 500 Index Fund in Jan 2025", "top_holdings"),
+    ("Top 10 holdings across all funds", "top_holdings"),
+    ("How many holdings does Axis have?", "holdings_count"),
+    ("holdings per AMC", "holdings_count"),
+    ("How many holdings does each AMC have?", "holdings_count"),
+    ("holdings count by fund house", "holdings_count"),
+    ("Sector allocation of Axis Consumption Fund", "sector_mix"),
+    ("sector wise allocation of HDFC Flexi Cap Fund", "sector_mix"),
+    ("New stocks bought by Axis in March 2025", "holdings_changes"),
+])
+def test_routes(router, question, intent):
+    routed = router.route(question)
+    assert routed is not None and routed["intent"] == intent
+
+
+@pytest.mark.parametrize("question", [
+    # Groupings no template answers
+    "top 5 holdings of each fund",
+    "top 10 holdings in each month",
+    "top holdings by scheme",
+    "sector mix per fund",
+    "sector allocation for every AMC",
+    "fund wise sector mix",
+    "holdings count per fund",
+    "exited stocks per AMC",
+    # Rankings of funds and security counts
+    "top funds by holdings",
+    "count securities",
+])
+def test_falls_through(router, question):
+    assert router.route(question) is None
+
+
+def test_holdings_count_is_per_amc_only(router):
+    routed = router.route("holdings count per AMC")
+    assert "GROUP BY amc_name" in routed["sql"]
+    assert router.route("holdings count per scheme") is None
+
+
+@pytest.mark.parametrize("text, group", [
+    ("holdings per amc", "amc"),
+    ("counts for each fund house", "amc"),
+    ("amc-wise holdings", "amc"),
+    ("top holdings of each fund", "fund"),
+    ("sector mix by month", "month"),
+    ("top holdings by market value", None),
+    ("sector wise allocation", None),
+])
+def test_grouping(text, group):
+    assert grouping(text) == group
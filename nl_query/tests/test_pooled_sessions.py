@@ -0,0 +1,96 @@
+"""
+Pooled sessions and prepared statements against a local PostgreSQL server.
+
+Skipped when the database from DB_HOST / DB_PORT / DB_NAME / DB_USER /
+DB_PASSWORD cannot be reached; only SELECTs and session-level DEALLOCATE run.
+
+    cd nl_query
+    DB_HOST=localhost DB_PASSWORD=... python -m pytest -q tests/test_pooled_sessions.py
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import get_db_params
+from db_executor import SafeExecutor
+
+
+def _reachable(params: dict) -> bool:
+    try:
+        psycopg2.connect(connect_timeout=3, **params).close()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+pytestmark = pytest.mark.skipif(
+    not _reachable(get_db_params()), reason="needs the mutual_fund_db database"
+)
+
+
+def _pids(executor: SafeExecutor) -> set:
+    return {conn.info.backend_pid for conn in executor._primary.pool._pool}
+
+
+def test_concurrent_prepared_queries_with_min_pool():
+    """Sessions closed and reopened under load never inherit prepared state."""
+    executor = SafeExecutor(get_db_params(), min_size=1, max_size=3)
+    failures = []
+
+    def run(offset):
+        for i in range(50):
+            n = offset + i
+            result = executor.execute(f"SELECT g AS n FROM generate_series(1, 400) g WHERE g = {n}")
+            if not result["success"] or result["rows"] != [(n,)]:
+                failures.append(result["error"] or result["rows"])
+            # Staggered think time leaves sessions idle between queries, the
+            # case where a pool trimming to minconn closed and reopened them
+            time.sleep(0.001 * (i % 3))
+
+    threads = [threading.Thread(target=run, args=(n * 100 + 1,)) for n in range(3)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert failures == []
+    finally:
+        executor.close()
+
+
+def test_idle_sessions_stay_warm():
+    executor = SafeExecutor(get_db_params(), min_size=1, max_size=3)
+    try:
+        with executor.connection(), executor.connection(), executor.connection():
+            pass
+        warm = _pids(executor)
+        assert len(warm) == 3
+        for _ in range(5):
+            executor.execute("SELECT 1 AS one")
+        assert _pids(executor) == warm
+    finally:
+        executor.close()
+
+
+def test_lost_prepared_statement_is_prepared_again():
+    executor = SafeExecutor(get_db_params(), max_size=1)
+    try:
+        for _ in range(executor.PREPARE_AFTER):
+            executor.execute("SELECT g AS n FROM generate_series(1, 10) g WHERE g = 3")
+        with executor.connection() as conn, conn.cursor() as cur:
+            assert conn.prepared
+            cur.execute("DEALLOCATE ALL")
+
+        result = executor.execute("SELECT g AS n FROM generate_series(1, 10) g WHERE g = 4")
+        assert result["success"] and result["rows"] == [(4,)]
+        # Second and third runs prepared; the third re-prepared after DEALLOCATE
+        assert executor.template_stats.top(1)[0]["prepared"] == 2
+    finally:
+        executor.close()
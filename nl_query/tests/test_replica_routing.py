@@ -0,0 +1,132 @@
+"""
+Read-replica routing against two local PostgreSQL servers.
+
+Skipped unless DB_READ_HOSTS is set. The primary comes from DB_HOST /
+DB_PORT and the replica from the first DB_READ_HOSTS entry; both need the
+mutual_fund_db schema with etl_data_version. The tests overwrite
+etl_data_version on both servers and restore it afterwards.
+
+Two independent servers stand in for a primary and a streaming replica:
+"replication lag" is simply a lower etl_data_version on the second one.
+One way to set them up:
+
+    initdb -D /tmp/pg_replica -U postgres
+    pg_ctl -D /tmp/pg_replica -o "-p 5433" -l /tmp/pg_replica.log start
+    createdb -p 5433 -U postgres mutual_fund_db
+    pg_dump -U postgres mutual_fund_db | psql -p 5433 -U postgres mutual_fund_db
+
+    cd nl_query
+    DB_READ_HOSTS=localhost:5433 python -m pytest -q tests/test_replica_routing.py
+"""
+
+import contextlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import get_db_params, get_read_endpoints
+from db_executor import SafeExecutor
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("DB_READ_HOSTS"), reason="needs a primary and a replica (DB_READ_HOSTS)"
+)
+
+
+def _version(params: dict, value=None):
+    """Read (or with value, set) etl_data_version on one server."""
+    conn = psycopg2.connect(**params)
+    try:
+        with conn.cursor() as cur:
+            if value is not None:
+                cur.execute("UPDATE etl_data_version SET version = %s WHERE id = 1", (value,))
+                conn.commit()
+            cur.execute("SELECT version FROM etl_data_version WHERE id = 1")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _served_by(executor: SafeExecutor, read: bool = True) -> tuple:
+    with executor.connection(read=read) as conn:
+        return conn.info.host, conn.info.port
+
+
+@pytest.fixture
+def servers():
+    primary, replica = get_db_params(), get_read_endpoints()[0]
+    saved = _version(primary), _version(replica)
+    _version(replica, saved[0])
+    yield primary, replica
+    _version(primary, saved[0])
+    _version(replica, saved[1])
+
+
+@pytest.fixture
+def executor(servers):
+    primary, replica = servers
+    executor = SafeExecutor(primary, max_size=2, read_endpoints=[replica])
+    # The tests drive the checks themselves
+    executor.REPLICA_CHECK_S = 3600
+    executor.check_replicas()
+    yield executor
+    executor.close()
+
+
+def _address(params: dict) -> tuple:
+    return params["host"], int(params.get("port", 5432))
+
+
+def test_fresh_replica_serves_reads(servers, executor):
+    primary, replica = servers
+    assert _served_by(executor) == _address(replica)
+    assert _served_by(executor, read=False) == _address(primary)
+    assert executor.execute("SELECT 1 AS one")["success"]
+
+
+def test_stale_replica_falls_back_until_it_catches_up(servers, executor):
+    primary, replica = servers
+    version = _version(primary, _version(primary) + 1)
+    executor.check_replicas()
+    assert _served_by(executor) == _address(primary)
+
+    _version(replica, version)
+    executor.check_replicas()
+    assert _served_by(executor) == _address(replica)
+
+
+def test_unreachable_replica_is_never_routed(servers):
+    primary, replica = servers
+    dead = dict(replica, port=1)
+    executor = SafeExecutor(primary, max_size=2, read_endpoints=[dead, replica])
+    executor.REPLICA_CHECK_S = 3600
+    try:
+        executor.check_replicas()
+        status = {s["name"]: s for s in executor.endpoint_status()}
+        assert status[f"replica {dead['host']}:1"]["usable"] is False
+        assert {_served_by(executor) for _ in range(4)} == {_address(replica)}
+    finally:
+        executor.close()
+
+
+def test_saturated_primary_keeps_replica_state(servers, executor):
+    """A check that cannot read the primary's version changes nothing, quickly."""
+    primary, replica = servers
+    _version(primary, _version(primary) + 1)
+    with contextlib.ExitStack() as stack:
+        for _ in range(executor.max_size):
+            stack.enter_context(executor.connection())
+        start = time.monotonic()
+        executor.check_replicas()
+        assert time.monotonic() - start < executor.POOL_WAIT_S
+        # Still trusted from the last successful check, not re-marked blindly
+        assert executor.endpoint_status()[1]["usable"] is True
+
+    executor.check_replicas()
+    assert executor.endpoint_status()[1]["usable"] is False
+    assert _served_by(executor) == _address(primary)
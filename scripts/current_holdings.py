@@ -0,0 +1,92 @@
+"""
+Latest-snapshot materialized view.
+
+current_holdings holds each AMC's most recent month of portfolio_holdings
+with fund, AMC and security names already joined, so "current" questions
+become one narrow scan instead of MAX(report_date) plus a three-way join.
+
+The loader refreshes it with REFRESH MATERIALIZED VIEW CONCURRENTLY after
+each run; readers keep seeing the previous contents until the refresh
+commits and are never blocked.
+"""
+
+import logging
+import time
+
+log = logging.getLogger("db_loader")
+
+VIEW_NAME = "current_holdings"
+
+DDL = f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW_NAME} AS
+WITH latest AS (
+    SELECT fm.amc_id, MAX(ph.report_date) AS report_date
+    FROM portfolio_holdings ph
+    JOIN fund_master fm ON ph.fund_id = fm.fund_id
+    GROUP BY fm.amc_id
+)
+SELECT ph.report_date,
+       am.amc_id,
+       am.amc_name,
+       am.short_code AS amc_short_code,
+       fm.fund_id,
+       fm.scheme_name,
+       sm.security_id,
+       sm.isin,
+       sm.security_name,
+       sm.current_sector,
+       sm.current_industry,
+       ph.quantity,
+       ph.market_value_lakhs,
+       ph.pct_portfolio
+FROM latest l
+JOIN fund_master fm ON fm.amc_id = l.amc_id
+JOIN portfolio_holdings ph
+  ON ph.fund_id = fm.fund_id AND ph.report_date = l.report_date
+JOIN amc_master am ON am.amc_id = fm.amc_id
+JOIN security_master sm ON sm.security_id = ph.security_id
+WITH DATA;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_current_holdings_fund_security
+    ON {VIEW_NAME} (fund_id, security_id);
+CREATE INDEX IF NOT EXISTS idx_current_holdings_security
+    ON {VIEW_NAME} (security_id);
+CREATE INDEX IF NOT EXISTS idx_current_holdings_amc
+    ON {VIEW_NAME} (amc_short_code);
+"""
+
+
+def ensure_view(cursor) -> bool:
+    """Create the view and its indexes if missing. Returns True if created."""
+    cursor.execute("SELECT 1 FROM pg_matviews WHERE matviewname = %s", (VIEW_NAME,))
+    if cursor.fetchone():
+        return False
+    cursor.execute(DDL)
+    return True
+
+
+def refresh_current_holdings(conn):
+    """
+    Refresh current_holdings without blocking readers.
+
+    CONCURRENTLY needs the unique index and a populated view; a view that
+    was just created (or left unpopulated) gets a plain refresh instead.
+    Commits on success.
+    """
+    cursor = conn.cursor()
+    start = time.perf_counter()
+
+    if ensure_view(cursor):
+        conn.commit()
+        log.info(f"  Created materialized view {VIEW_NAME}")
+        cursor.close()
+        return
+
+    cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = %s", (VIEW_NAME,))
+    populated = cursor.fetchone()[0]
+    mode = "CONCURRENTLY " if populated else ""
+    cursor.execute(f"REFRESH MATERIALIZED VIEW {mode}{VIEW_NAME}")
+    conn.commit()
+    cursor.close()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    log.info(f"  Refreshed {VIEW_NAME} {mode.strip().lower() or 'fully'} in {elapsed_ms:.0f}ms")
@@ -0,0 +1,38 @@
+"""
+Data-version stamp for downstream caches.
+
+etl_data_version holds a single counter that the loader bumps after every
+successful run. Readers (the NL query caches) compare it with the version
+they cached under and drop stale entries when it changes.
+"""
+
+import logging
+
+log = logging.getLogger("db_loader")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS etl_data_version (
+    id          SMALLINT    PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version     BIGINT      NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+def bump_data_version(conn) -> int:
+    """Increment the data version and commit. Returns the new version."""
+    cursor = conn.cursor()
+    cursor.execute(DDL)
+    cursor.execute(
+        """
+        INSERT INTO etl_data_version (id, version) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE
+        SET version = etl_data_version.version + 1, updated_at = now()
+        RETURNING version
+        """
+    )
+    version = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    log.info(f"  Data version is now {version}")
+    return version
@@ -0,0 +1,237 @@
+"""
+Month-over-month holdings change capture.
+
+When month M is loaded for an AMC, compares its portfolio_holdings snapshot
+against the AMC's previous snapshot (M-1) and writes one row per changed
+(fund, security) pair into the holdings_change table:
+
+- new      — held in M, not held in M-1
+- added    — held in both, quantity increased
+- trimmed  — held in both, quantity decreased
+- exited   — held in M-1, not held in M
+
+Both snapshots are read in (fund_id, security_id) order through server-side
+cursors and combined with a single streaming merge, so memory use does not
+grow with the size of the AMC's portfolio.
+"""
+
+import logging
+from typing import Any, Iterable, Iterator
+
+from psycopg2.extras import execute_values
+
+log = logging.getLogger("db_loader")
+
+# Rows buffered before each batch insert into holdings_change
+INSERT_BATCH_SIZE = 1000
+
+# Rows fetched per round trip from the server-side snapshot cursors
+FETCH_SIZE = 2000
+
+CHANGE_NEW = "new"
+CHANGE_ADDED = "added"
+CHANGE_TRIMMED = "trimmed"
+CHANGE_EXITED = "exited"
+
+DDL = """
+CREATE TABLE IF NOT EXISTS holdings_change (
+    fund_id            INTEGER     NOT NULL REFERENCES fund_master(fund_id),
+    security_id        INTEGER     NOT NULL REFERENCES security_master(security_id),
+    report_date        DATE        NOT NULL,
+    prev_report_date   DATE,
+    change_type        VARCHAR(10) NOT NULL,
+    quantity_prev      NUMERIC,
+    quantity_curr      NUMERIC,
+    quantity_delta     NUMERIC,
+    value_prev_lakhs   NUMERIC,
+    value_curr_lakhs   NUMERIC,
+    value_delta_lakhs  NUMERIC,
+    pct_prev           NUMERIC,
+    pct_curr           NUMERIC,
+    PRIMARY KEY (fund_id, security_id, report_date)
+);
+CREATE INDEX IF NOT EXISTS idx_holdings_change_date_type
+    ON holdings_change (report_date, change_type);
+CREATE INDEX IF NOT EXISTS idx_holdings_change_security_date
+    ON holdings_change (security_id, report_date);
+"""
+
+# Snapshot of one AMC's holdings for one report date, in merge order
+SNAPSHOT_SQL = """
+    SELECT ph.fund_id, ph.security_id, ph.quantity,
+           ph.market_value_lakhs, ph.pct_portfolio
+    FROM portfolio_holdings ph
+    JOIN fund_master fm ON ph.fund_id = fm.fund_id
+    WHERE fm.amc_id = %s AND ph.report_date = %s
+    ORDER BY ph.fund_id, ph.security_id
+"""
+
+
+def ensure_table(cursor):
+    """Create the holdings_change table and its indexes if missing."""
+    cursor.execute(DDL)
+
+
+def merge_snapshots(prev_rows: Iterable[tuple], curr_rows: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    Merge two snapshots sorted by (fund_id, security_id).
+
+    Each input row starts with fund_id, security_id. Yields
+    (key, prev_row, curr_row) with None on the side where the key is absent.
+    """
+    prev_iter = iter(prev_rows)
+    curr_iter = iter(curr_rows)
+    prev = next(prev_iter, None)
+    curr = next(curr_iter, None)
+
+    while prev is not None or curr is not None:
+        prev_key = (prev[0], prev[1]) if prev is not None else None
+        curr_key = (curr[0], curr[1]) if curr is not None else None
+
+        if curr_key is None or (prev_key is not None and prev_key < curr_key):
+            yield prev_key, prev, None
+            prev = next(prev_iter, None)
+        elif prev_key is None or curr_key < prev_key:
+            yield curr_key, None, curr
+            curr = next(curr_iter, None)
+        else:
+            yield curr_key, prev, curr
+            prev = next(prev_iter, None)
+            curr = next(curr_iter, None)
+
+
+def _delta(curr: Any, prev: Any) -> Any:
+    """Difference of two nullable numbers, treating a missing side as zero."""
+    if curr is None and prev is None:
+        return None
+    return (curr or 0) - (prev or 0)
+
+
+def classify_change(prev: tuple | None, curr: tuple | None) -> str | None:
+    """
+    Classify a merged (prev, curr) pair.
+
+    Returns None for holdings whose quantity did not change. When quantity
+    is missing on either side, market value is compared instead.
+    """
+    if prev is None:
+        return CHANGE_NEW
+    if curr is None:
+        return CHANGE_EXITED
+
+    prev_qty, curr_qty = prev[2], curr[2]
+    if prev_qty is None or curr_qty is None:
+        prev_qty, curr_qty = prev[3], curr[3]
+    if prev_qty is None or curr_qty is None or curr_qty == prev_qty:
+        return None
+    return CHANGE_ADDED if curr_qty > prev_qty else CHANGE_TRIMMED
+
+
+def iter_cursor(cursor) -> Iterator[tuple]:
+    """Iterate a server-side cursor in FETCH_SIZE chunks."""
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def get_previous_report_date(cursor, amc_id: int, report_date: str):
+    """Return the AMC's latest report date before report_date, or None."""
+    cursor.execute(
+        """
+        SELECT MAX(ph.report_date)
+        FROM portfolio_holdings ph
+        JOIN fund_master fm ON ph.fund_id = fm.fund_id
+        WHERE fm.amc_id = %s AND ph.report_date < %s
+        """,
+        (amc_id, report_date)
+    )
+    return cursor.fetchone()[0]
+
+
+def compute_holdings_delta(conn, amc_id: int, report_date: str) -> dict[str, int]:
+    """
+    Recompute holdings_change rows for one AMC and report date.
+
+    Runs inside the caller's transaction. Existing rows for the AMC and date
+    are replaced, so re-loading a month is idempotent. Returns counts per
+    change type.
+    """
+    cursor = conn.cursor()
+    ensure_table(cursor)
+
+    prev_date = get_previous_report_date(cursor, amc_id, report_date)
+
+    cursor.execute(
+        """
+        DELETE FROM holdings_change
+        WHERE report_date = %s
+          AND fund_id IN (SELECT fund_id FROM fund_master WHERE amc_id = %s)
+        """,
+        (report_date, amc_id)
+    )
+
+    counts = {CHANGE_NEW: 0, CHANGE_ADDED: 0, CHANGE_TRIMMED: 0, CHANGE_EXITED: 0}
+
+    # With no earlier month, every holding would be "new" — skip the noise
+    if prev_date is None:
+        log.info(f"  No previous snapshot before {report_date}; no changes recorded")
+        cursor.close()
+        return counts
+
+    prev_cur = conn.cursor(name=f"delta_prev_{amc_id}")
+    curr_cur = conn.cursor(name=f"delta_curr_{amc_id}")
+    prev_cur.execute(SNAPSHOT_SQL, (amc_id, prev_date))
+    curr_cur.execute(SNAPSHOT_SQL, (amc_id, report_date))
+
+    batch = []
+    for (fund_id, security_id), prev, curr in merge_snapshots(
+        iter_cursor(prev_cur), iter_cursor(curr_cur)
+    ):
+        change_type = classify_change(prev, curr)
+        if change_type is None:
+            continue
+        counts[change_type] += 1
+
+        prev_qty, prev_val, prev_pct = prev[2:5] if prev else (None, None, None)
+        curr_qty, curr_val, curr_pct = curr[2:5] if curr else (None, None, None)
+        batch.append((
+            fund_id, security_id, report_date, prev_date, change_type,
+            prev_qty, curr_qty, _delta(curr_qty, prev_qty),
+            prev_val, curr_val, _delta(curr_val, prev_val),
+            prev_pct, curr_pct,
+        ))
+
+        if len(batch) >= INSERT_BATCH_SIZE:
+            _insert_batch(cursor, batch)
+            batch = []
+
+    if batch:
+        _insert_batch(cursor, batch)
+
+    prev_cur.close()
+    curr_cur.close()
+    cursor.close()
+
+    log.info(
+        f"  Holdings changes vs {prev_date}: "
+        + ", ".join(f"{k}={v}" for k, v in counts.items())
+    )
+    return counts
+
+
+def _insert_batch(cursor, rows: list[tuple]):
+    """Insert a batch of holdings_change rows."""
+    execute_values(
+        cursor,
+        """
+        INSERT INTO holdings_change
+        (fund_id, security_id, report_date, prev_report_date, change_type,
+         quantity_prev, quantity_curr, quantity_delta,
+         value_prev_lakhs, value_curr_lakhs, value_delta_lakhs,
+         pct_prev, pct_curr)
+        VALUES %s
+        """,
+        rows
+    )
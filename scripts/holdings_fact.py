@@ -0,0 +1,80 @@
+"""
+Denormalized wide holdings fact table.
+
+holdings_fact flattens portfolio_holdings with its AMC, fund and security
+attributes into one row per holding, so analytic scans need no joins.
+
+The table is rebuilt in bulk: a new copy is written with CREATE TABLE AS in
+(report_date, amc_short_code, fund_id) order, so rows for a date range sit
+together on disk and a BRIN index on report_date can skip everything else.
+The new copy is swapped in under its final name in one short transaction.
+"""
+
+import logging
+import time
+
+log = logging.getLogger("db_loader")
+
+TABLE_NAME = "holdings_fact"
+BUILD_NAME = f"{TABLE_NAME}_build"
+
+BUILD_SQL = f"""
+CREATE TABLE {BUILD_NAME} AS
+SELECT ph.report_date,
+       am.short_code AS amc_short_code,
+       am.amc_id,
+       fm.fund_id,
+       fm.scheme_name,
+       sm.security_id,
+       sm.isin,
+       sm.security_name,
+       COALESCE(ph.sector_at_time, sm.current_sector) AS sector,
+       sm.current_industry AS industry,
+       ph.quantity,
+       ph.market_value_lakhs,
+       ph.pct_portfolio
+FROM portfolio_holdings ph
+JOIN fund_master fm ON ph.fund_id = fm.fund_id
+JOIN amc_master am ON fm.amc_id = am.amc_id
+JOIN security_master sm ON ph.security_id = sm.security_id
+ORDER BY ph.report_date, am.short_code, fm.fund_id, sm.security_id
+"""
+
+
+def build_holdings_fact(conn):
+    """
+    Rebuild holdings_fact from the normalized tables and swap it in.
+
+    Readers of the previous copy are only blocked for the rename at the
+    end. Commits on success.
+    """
+    cursor = conn.cursor()
+    start = time.perf_counter()
+
+    cursor.execute(f"DROP TABLE IF EXISTS {BUILD_NAME}")
+    cursor.execute(BUILD_SQL)
+    row_count = cursor.rowcount
+
+    cursor.execute(
+        f"CREATE INDEX {BUILD_NAME}_date_brin ON {BUILD_NAME} "
+        f"USING BRIN (report_date) WITH (pages_per_range = 32)"
+    )
+    cursor.execute(
+        f"CREATE INDEX {BUILD_NAME}_amc_date_brin ON {BUILD_NAME} "
+        f"USING BRIN (report_date, amc_id) WITH (pages_per_range = 32)"
+    )
+    conn.commit()
+
+    # Swap: only this part holds an exclusive lock on the live table
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+    cursor.execute(f"ALTER TABLE {BUILD_NAME} RENAME TO {TABLE_NAME}")
+    cursor.execute(f"ALTER INDEX {BUILD_NAME}_date_brin RENAME TO {TABLE_NAME}_date_brin")
+    cursor.execute(f"ALTER INDEX {BUILD_NAME}_amc_date_brin RENAME TO {TABLE_NAME}_amc_date_brin")
+    conn.commit()
+
+    cursor.execute(f"ANALYZE {TABLE_NAME}")
+    conn.commit()
+    cursor.close()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    log.info(f"  Rebuilt {TABLE_NAME}: {row_count:,} rows in {elapsed_ms:.0f}ms")
@@ -0,0 +1,294 @@
+"""
+Incremental rolling-window analytics over monthly holdings snapshots.
+
+Maintains one compact row per (fund, security) in holding_window_state:
+
+- streak_months    — consecutive months held up to as_of_date
+- months_held      — total months held since tracking began
+- months_absent    — months since last held (0 while held)
+- weights          — last 12 monthly pct_portfolio values, newest first
+                     (0 for months the security was not held)
+- sum/avg weight over the last 3, 6 and 12 months
+
+Averages divide by the window length, capped at the months the AMC has been
+tracked (holding_window_amc); months a security was not held count as 0.
+A new buy and a recent exit are therefore averaged over the same months.
+
+When month M is loaded for an AMC, the AMC's existing state rows are merged
+with the month-M snapshot and advanced by exactly one month; the rest of the
+history is never rescanned. Loading a month at or before the state's
+as_of_date (a re-load or an out-of-order file) rebuilds that AMC's state by
+replaying its months in order.
+"""
+
+import logging
+from decimal import Decimal
+
+from psycopg2.extras import execute_values
+
+from holdings_delta import SNAPSHOT_SQL, iter_cursor, merge_snapshots
+
+log = logging.getLogger("db_loader")
+
+# Window lengths in months; the largest bounds the stored weight history
+WINDOWS = (3, 6, 12)
+MAX_WINDOW = max(WINDOWS)
+
+# Rows buffered before each batch upsert
+UPSERT_BATCH_SIZE = 1000
+
+ZERO = Decimal(0)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS holding_window_state (
+    fund_id           INTEGER   NOT NULL REFERENCES fund_master(fund_id),
+    security_id       INTEGER   NOT NULL REFERENCES security_master(security_id),
+    as_of_date        DATE      NOT NULL,
+    first_held_date   DATE,
+    last_held_date    DATE,
+    streak_months     INTEGER   NOT NULL DEFAULT 0,
+    months_held       INTEGER   NOT NULL DEFAULT 0,
+    months_absent     INTEGER   NOT NULL DEFAULT 0,
+    weights           NUMERIC[] NOT NULL,
+    sum_weight_3m     NUMERIC   NOT NULL DEFAULT 0,
+    sum_weight_6m     NUMERIC   NOT NULL DEFAULT 0,
+    sum_weight_12m    NUMERIC   NOT NULL DEFAULT 0,
+    avg_weight_3m     NUMERIC,
+    avg_weight_6m     NUMERIC,
+    avg_weight_12m    NUMERIC,
+    PRIMARY KEY (fund_id, security_id)
+);
+CREATE INDEX IF NOT EXISTS idx_holding_window_state_security
+    ON holding_window_state (security_id);
+CREATE TABLE IF NOT EXISTS holding_window_amc (
+    amc_id            INTEGER   PRIMARY KEY REFERENCES amc_master(amc_id),
+    as_of_date        DATE      NOT NULL,
+    months_tracked    INTEGER   NOT NULL
+);
+COMMENT ON COLUMN holding_window_amc.months_tracked IS
+    'Monthly snapshots applied to the AMC''s window state since tracking began';
+COMMENT ON COLUMN holding_window_state.avg_weight_3m IS
+    'sum_weight_3m / LEAST(3, months_tracked of the AMC); unheld months count as 0';
+COMMENT ON COLUMN holding_window_state.avg_weight_6m IS
+    'sum_weight_6m / LEAST(6, months_tracked of the AMC); unheld months count as 0';
+COMMENT ON COLUMN holding_window_state.avg_weight_12m IS
+    'sum_weight_12m / LEAST(12, months_tracked of the AMC); unheld months count as 0';
+"""
+
+# Columns in the order used by STATE_SQL and the upsert
+STATE_COLUMNS = (
+    "fund_id", "security_id", "as_of_date", "first_held_date", "last_held_date",
+    "streak_months", "months_held", "months_absent", "weights",
+    "sum_weight_3m", "sum_weight_6m", "sum_weight_12m",
+    "avg_weight_3m", "avg_weight_6m", "avg_weight_12m",
+)
+
+STATE_SQL = f"""
+    SELECT {", ".join("s." + c for c in STATE_COLUMNS)}
+    FROM holding_window_state s
+    JOIN fund_master fm ON s.fund_id = fm.fund_id
+    WHERE fm.amc_id = %s
+    ORDER BY s.fund_id, s.security_id
+"""
+
+
+def ensure_table(cursor):
+    """Create the holding_window_state / holding_window_amc tables if missing."""
+    cursor.execute(DDL)
+
+
+def advance_state(state: tuple | None, holding: tuple | None,
+                  key: tuple, report_date: str, months_tracked: int) -> tuple | None:
+    """
+    Advance one (fund, security) state row by one month.
+
+    state is a row in STATE_COLUMNS order (or None if untracked); holding is
+    a snapshot row (fund_id, security_id, quantity, value, pct) or None if
+    not held this month. months_tracked counts the AMC's months including
+    this one and caps the averaging denominator. Returns the new state row,
+    or None when the pair has dropped out of every window and can be forgotten.
+    """
+    held = holding is not None
+    weight = Decimal(holding[4]) if held and holding[4] is not None else ZERO
+
+    if state is None:
+        first_held, last_held, streak, months_held, months_absent = None, None, 0, 0, 0
+        prev_as_of, old_weights = None, []
+        old_sums = {n: ZERO for n in WINDOWS}
+    else:
+        (_, _, prev_as_of, first_held, last_held, streak, months_held,
+         months_absent, old_weights, sum3, sum6, sum12, *_) = state
+        old_sums = dict(zip(WINDOWS, (sum3, sum6, sum12)))
+
+    if held:
+        # Consecutive only if it was also held in the previous tracked month
+        streak = streak + 1 if last_held is not None and last_held == prev_as_of else 1
+        months_held += 1
+        months_absent = 0
+        first_held = first_held or report_date
+        last_held = report_date
+    else:
+        streak = 0
+        months_absent += 1
+
+    if months_absent >= MAX_WINDOW:
+        return None
+
+    # Slide each window: add the new month, drop the month falling off
+    sums = {}
+    for n in WINDOWS:
+        dropped = old_weights[n - 1] if len(old_weights) >= n else ZERO
+        sums[n] = old_sums[n] + weight - dropped
+    weights = [weight] + list(old_weights[:MAX_WINDOW - 1])
+
+    # Zero-filled back to when the AMC's tracking began, so a security bought
+    # this month averages over the same months as one that just exited
+    avgs = [sums[n] / min(n, months_tracked) for n in WINDOWS]
+    return (
+        key[0], key[1], report_date, first_held, last_held,
+        streak, months_held, months_absent, weights,
+        sums[3], sums[6], sums[12],
+        *avgs,
+    )
+
+
+def _apply_month(conn, amc_id: int, report_date: str, months_tracked: int) -> tuple[int, int]:
+    """
+    Advance every state row of an AMC by one month, months_tracked being
+    the AMC's month count including report_date. Returns (upserted, dropped).
+    """
+    cursor = conn.cursor()
+    state_cur = conn.cursor(name=f"window_state_{amc_id}")
+    snap_cur = conn.cursor(name=f"window_snap_{amc_id}")
+    state_cur.execute(STATE_SQL, (amc_id,))
+    snap_cur.execute(SNAPSHOT_SQL, (amc_id, report_date))
+
+    upserts, drops = [], []
+    n_upserted = n_dropped = 0
+    for key, state, holding in merge_snapshots(iter_cursor(state_cur), iter_cursor(snap_cur)):
+        new_state = advance_state(state, holding, key, report_date, months_tracked)
+        if new_state is not None:
+            upserts.append(new_state)
+        elif state is not None:
+            drops.append(key)
+
+        if len(upserts) >= UPSERT_BATCH_SIZE:
+            n_upserted += _upsert_batch(cursor, upserts)
+            upserts = []
+        if len(drops) >= UPSERT_BATCH_SIZE:
+            n_dropped += _delete_batch(cursor, drops)
+            drops = []
+
+    if upserts:
+        n_upserted += _upsert_batch(cursor, upserts)
+    if drops:
+        n_dropped += _delete_batch(cursor, drops)
+    cursor.execute(
+        """
+        INSERT INTO holding_window_amc (amc_id, as_of_date, months_tracked)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (amc_id) DO UPDATE
+            SET as_of_date = EXCLUDED.as_of_date, months_tracked = EXCLUDED.months_tracked
+        """,
+        (amc_id, report_date, months_tracked)
+    )
+
+    state_cur.close()
+    snap_cur.close()
+    cursor.close()
+    return n_upserted, n_dropped
+
+
+def _upsert_batch(cursor, rows: list[tuple]) -> int:
+    """Insert or replace a batch of state rows."""
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in STATE_COLUMNS[2:])
+    execute_values(
+        cursor,
+        f"""
+        INSERT INTO holding_window_state ({", ".join(STATE_COLUMNS)})
+        VALUES %s
+        ON CONFLICT (fund_id, security_id) DO UPDATE SET {updates}
+        """,
+        rows,
+        template="(%s, %s, %s, %s, %s, %s, %s, %s, %s::numeric[], %s, %s, %s, %s, %s, %s)",
+    )
+    return len(rows)
+
+
+def _delete_batch(cursor, keys: list[tuple]) -> int:
+    """Delete state rows that fell out of every window."""
+    execute_values(
+        cursor,
+        """
+        DELETE FROM holding_window_state s
+        USING (VALUES %s) AS k (fund_id, security_id)
+        WHERE s.fund_id = k.fund_id AND s.security_id = k.security_id
+        """,
+        keys,
+    )
+    return len(keys)
+
+
+def rebuild_holding_windows(conn, amc_id: int):
+    """Rebuild an AMC's window state by replaying all of its months in order."""
+    cursor = conn.cursor()
+    ensure_table(cursor)
+    cursor.execute(
+        """
+        DELETE FROM holding_window_state
+        WHERE fund_id IN (SELECT fund_id FROM fund_master WHERE amc_id = %s)
+        """,
+        (amc_id,)
+    )
+    cursor.execute("DELETE FROM holding_window_amc WHERE amc_id = %s", (amc_id,))
+    cursor.execute(
+        """
+        SELECT DISTINCT ph.report_date
+        FROM portfolio_holdings ph
+        JOIN fund_master fm ON ph.fund_id = fm.fund_id
+        WHERE fm.amc_id = %s
+        ORDER BY ph.report_date
+        """,
+        (amc_id,)
+    )
+    dates = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    for months_tracked, report_date in enumerate(dates, start=1):
+        _apply_month(conn, amc_id, report_date, months_tracked)
+    log.info(f"  Rebuilt holding windows over {len(dates)} months")
+
+
+def update_holding_windows(conn, amc_id: int, report_date: str):
+    """
+    Advance an AMC's window state to report_date.
+
+    Runs inside the caller's transaction. Appending a new month is
+    incremental; anything else falls back to rebuild_holding_windows.
+    """
+    cursor = conn.cursor()
+    ensure_table(cursor)
+    cursor.execute(
+        """
+        SELECT a.as_of_date >= %s, a.months_tracked,
+               EXISTS (SELECT 1 FROM holding_window_state s
+                       JOIN fund_master fm ON s.fund_id = fm.fund_id
+                       WHERE fm.amc_id = %s)
+        FROM (SELECT %s AS amc_id) k
+        LEFT JOIN holding_window_amc a ON a.amc_id = k.amc_id
+        """,
+        (report_date, amc_id, amc_id)
+    )
+    not_after, months_tracked, has_state = cursor.fetchone()
+    cursor.close()
+
+    if not_after or (months_tracked is None and has_state):
+        if not_after:
+            log.info(f"  {report_date} is not after current window state; rebuilding")
+        else:
+            log.info("  Window state predates month counting; rebuilding")
+        rebuild_holding_windows(conn, amc_id)
+        return
+
+    upserted, dropped = _apply_month(conn, amc_id, report_date, (months_tracked or 0) + 1)
+    log.info(f"  Holding windows advanced to {report_date}: {upserted} tracked, {dropped} dropped")
@@ -6,6 +6,16 @@ Maps JSON structure to database tables:
 - fund_master  
 - security_master
 - portfolio_holdings (or initial_portfolio_staging)
+
+After each file, month-over-month changes are captured into
+holdings_change (see holdings_delta.py) and rolling per-holding windows
+are advanced in holding_window_state (see holdings_window.py). Once all
+files are loaded, the current_holdings materialized view is refreshed
+(see current_holdings.py) and, with --build-fact-table, the denormalized
+holdings_fact table is rebuilt (see holdings_fact.py). Finally the
+etl_data_version stamp is bumped so NL query caches drop stale entries
+(see data_version.py) and the queries pinned in the NL CLI are re-run into
+fresh result snapshots (see pinned_snapshots.py).
 """
 
 import argparse
@@ -13,11 +23,18 @@ import json
 import logging
 import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import psycopg2
 from psycopg2.extras import execute_values
 
+from current_holdings import refresh_current_holdings
+from data_version import bump_data_version
+from holdings_delta import compute_holdings_delta
+from holdings_fact import build_holdings_fact
+from holdings_window import update_holding_windows
+from pinned_snapshots import DEFAULT_PINS_PATH, refresh_pinned_snapshots
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -29,11 +46,21 @@ log = logging.getLogger("db_loader")
 class DatabaseLoader:
     """Load JSON data into PostgreSQL."""
     
-    def __init__(self, connection_params: dict):
+    def __init__(self, connection_params: dict, compute_deltas: bool = True,
+                 update_windows: bool = True, refresh_views: bool = True,
+                 build_fact_table: bool = False, pins_path: Optional[Path] = DEFAULT_PINS_PATH):
         """Initialize with database connection parameters."""
         self.conn_params = connection_params
+        self.compute_deltas = compute_deltas
+        self.update_windows = update_windows
+        self.refresh_views = refresh_views
+        self.build_fact_table = build_fact_table
+        self.pins_path = pins_path
         self.conn = None
         self.cursor = None
+        # Files committed this run, and whether etl_data_version has been bumped since
+        self.committed_files = 0
+        self.version_bumped = False
     
     def connect(self):
         """Connect to PostgreSQL database."""
@@ -45,6 +72,22 @@ class DatabaseLoader:
             log.error(f"Failed to connect to database: {e}")
             raise
     
+    def bump_after_partial_load(self):
+        """
+        Bump the data version when files were committed but the run stopped
+        before finalize_load got that far, so the NL query caches drop
+        results from before those files.
+        """
+        if not self.committed_files or self.version_bumped or self.conn is None:
+            return
+        try:
+            self.conn.rollback()
+            bump_data_version(self.conn)
+            self.version_bumped = True
+            log.warning(f"Load incomplete: data version bumped for {self.committed_files} committed file(s)")
+        except Exception as e:
+            log.error(f"Could not bump the data version after a partial load: {e}")
+    
     def close(self):
         """Close database connection."""
         if self.cursor:
@@ -211,7 +254,7 @@ class DatabaseLoader:
                 report_date,
                 h.get("quantity"),
                 h.get("market_value_lakhs"),
-                h.get("pct_to_aum"),
+                h.get("pct_to_aum", h.get("pct_to_nav")),
                 h.get("industry"),  # sector_at_time
             ))
         
@@ -257,9 +300,30 @@ class DatabaseLoader:
             report_date
         )
         
+        # Capture month-over-month changes against the previous snapshot
+        if self.compute_deltas:
+            compute_holdings_delta(self.conn, amc_id, report_date)
+        
+        # Advance rolling 3/6/12-month windows and holding streaks
+        if self.update_windows:
+            update_holding_windows(self.conn, amc_id, report_date)
+        
         # Commit transaction
         self.conn.commit()
+        self.committed_files += 1
+        self.version_bumped = False
         log.info(f"✓ Committed {json_path.name}")
+    
+    def finalize_load(self):
+        """Run post-load steps once every file has been committed."""
+        if self.refresh_views:
+            refresh_current_holdings(self.conn)
+        if self.build_fact_table:
+            build_holdings_fact(self.conn)
+        version = bump_data_version(self.conn)
+        self.version_bumped = True
+        if self.pins_path is not None:
+            refresh_pinned_snapshots(self.conn_params, version, self.pins_path)
 
 
 def main():
@@ -270,6 +334,18 @@ def main():
     parser.add_argument("--dbname", required=True, help="Database name")
     parser.add_argument("--user", required=True, help="Database user")
     parser.add_argument("--password", required=True, help="Database password")
+    parser.add_argument("--no-deltas", action="store_true",
+                        help="Skip month-over-month holdings_change capture")
+    parser.add_argument("--no-windows", action="store_true",
+                        help="Skip rolling holding_window_state updates")
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="Skip refreshing the current_holdings materialized view")
+    parser.add_argument("--build-fact-table", action="store_true",
+                        help="Rebuild the denormalized holdings_fact table after loading")
+    parser.add_argument("--pins", type=Path, default=DEFAULT_PINS_PATH,
+                        help="Pinned NL queries to re-run after loading (default nl_query/pins.json)")
+    parser.add_argument("--no-pins", action="store_true",
+                        help="Skip refreshing pinned query snapshots")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose logging")
     
     args = parser.parse_args()
@@ -301,7 +377,14 @@ def main():
     log.info(f"Loading {len(json_paths)} JSON file(s) into database")
     log.info("=" * 60)
     
-    loader = DatabaseLoader(conn_params)
+    loader = DatabaseLoader(
+        conn_params,
+        compute_deltas=not args.no_deltas,
+        update_windows=not args.no_windows,
+        refresh_views=not args.no_refresh,
+        build_fact_table=args.build_fact_table,
+        pins_path=None if args.no_pins else args.pins,
+    )
     
     try:
         loader.connect()
@@ -318,6 +401,8 @@ def main():
                 loader.conn.rollback()
                 raise
         
+        loader.finalize_load()
+        
         log.info("\n" + "=" * 60)
         log.info("DATABASE LOAD COMPLETE")
         log.info("=" * 60)
@@ -326,6 +411,7 @@ def main():
         log.error(f"Database loading failed: {e}")
         sys.exit(1)
     finally:
+        loader.bump_after_partial_load()
         loader.close()
 
 
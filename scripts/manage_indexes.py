@@ -0,0 +1,299 @@
+"""
+Install and measure the index set used by the NL query workload.
+
+Generated SQL overwhelmingly filters portfolio_holdings by report_date and
+joins on fund_id / security_id, so the managed set is:
+
+- (report_date, fund_id) INCLUDE (security_id, market_value_lakhs, pct_portfolio)
+  covers "holdings for a date" scans, including the README examples, with
+  index-only scans
+- (security_id, report_date) for "who holds security X over time"
+- fund_master (amc_id) WHERE is_active, a partial index for AMC rollups
+
+Subcommands:
+    install    Create missing indexes (CONCURRENTLY, readers are not blocked)
+    drop       Drop the managed indexes
+    benchmark  Time the README example queries against the current indexes
+    compare    Time the example queries without, then with, the managed set
+    unused     Report indexes with no scans in pg_stat_user_indexes
+
+Usage:
+    python scripts/manage_indexes.py install --dbname mutual_fund_db --user postgres --password pwd
+    python scripts/manage_indexes.py compare --dbname mutual_fund_db --user postgres --password pwd
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import sys
+
+import psycopg2
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+log = logging.getLogger("manage_indexes")
+
+# (index name, CREATE statement without the CREATE INDEX prefix)
+MANAGED_INDEXES = [
+    (
+        "idx_ph_date_fund_covering",
+        "ON portfolio_holdings (report_date, fund_id) "
+        "INCLUDE (security_id, market_value_lakhs, pct_portfolio)",
+    ),
+    (
+        "idx_ph_security_date",
+        "ON portfolio_holdings (security_id, report_date)",
+    ),
+    (
+        "idx_fm_amc_active",
+        "ON fund_master (amc_id) WHERE is_active",
+    ),
+]
+
+# README example queries; %(report_date)s is the latest report date
+BENCHMARK_QUERIES = {
+    "top_holdings_by_value": """
+        SELECT sm.security_name,
+               SUM(ph.market_value_lakhs) as total_value
+        FROM portfolio_holdings ph
+        JOIN security_master sm ON ph.security_id = sm.security_id
+        WHERE ph.report_date = %(report_date)s
+        GROUP BY sm.security_name
+        ORDER BY total_value DESC
+        LIMIT 10
+    """,
+    "holdings_per_amc": """
+        SELECT am.amc_name,
+               COUNT(*) as holdings_count,
+               COUNT(DISTINCT fm.fund_id) as fund_count
+        FROM portfolio_holdings ph
+        JOIN fund_master fm ON ph.fund_id = fm.fund_id
+        JOIN amc_master am ON fm.amc_id = am.amc_id
+        WHERE ph.report_date = %(report_date)s
+        GROUP BY am.amc_name
+    """,
+    "top_securities_by_fund_count": """
+        SELECT sm.security_name,
+               COUNT(DISTINCT ph.fund_id) as fund_count,
+               SUM(ph.market_value_lakhs) as total_value
+        FROM portfolio_holdings ph
+        JOIN security_master sm ON ph.security_id = sm.security_id
+        WHERE ph.report_date = %(report_date)s
+        GROUP BY sm.security_name
+        ORDER BY fund_count DESC
+        LIMIT 10
+    """,
+    "security_history": """
+        SELECT ph.report_date, COUNT(DISTINCT ph.fund_id) as fund_count
+        FROM portfolio_holdings ph
+        WHERE ph.security_id = (
+            SELECT security_id FROM portfolio_holdings
+            WHERE report_date = %(report_date)s
+            ORDER BY market_value_lakhs DESC NULLS LAST LIMIT 1
+        )
+        GROUP BY ph.report_date
+        ORDER BY ph.report_date
+    """,
+}
+
+
+def install_indexes(conn):
+    """Create any missing managed indexes without blocking readers."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    for name, definition in MANAGED_INDEXES:
+        log.info(f"Creating {name} (if missing)")
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+    cur.execute("ANALYZE portfolio_holdings")
+    cur.execute("ANALYZE fund_master")
+    cur.close()
+    log.info(f"✓ {len(MANAGED_INDEXES)} managed indexes in place")
+
+
+def drop_indexes(conn):
+    """Drop the managed indexes."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    for name, _ in MANAGED_INDEXES:
+        log.info(f"Dropping {name}")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cur.close()
+
+
+def get_latest_report_date(cur):
+    """Latest report date in portfolio_holdings."""
+    cur.execute("SELECT MAX(report_date) FROM portfolio_holdings")
+    return cur.fetchone()[0]
+
+
+def time_queries(cur, report_date, runs: int) -> dict[str, dict]:
+    """
+    Run each benchmark query `runs` times under EXPLAIN ANALYZE.
+
+    Returns per-query median execution time and the top plan node type.
+    """
+    results = {}
+    for name, sql in BENCHMARK_QUERIES.items():
+        timings = []
+        plan = None
+        for _ in range(runs):
+            cur.execute(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql,
+                {"report_date": report_date},
+            )
+            raw = cur.fetchone()[0]
+            plan = raw if isinstance(raw, list) else json.loads(raw)
+            timings.append(plan[0]["Execution Time"])
+        results[name] = {
+            "median_ms": statistics.median(timings),
+            "scan_nodes": sorted(_scan_nodes(plan[0]["Plan"])),
+        }
+    return results
+
+
+def _scan_nodes(node: dict) -> set[str]:
+    """Collect scan node descriptions from an EXPLAIN plan tree."""
+    found = set()
+    if "Scan" in node.get("Node Type", ""):
+        label = node["Node Type"]
+        if node.get("Index Name"):
+            label += f" using {node['Index Name']}"
+        if node.get("Relation Name"):
+            label += f" on {node['Relation Name']}"
+        found.add(label)
+    for child in node.get("Plans", []):
+        found |= _scan_nodes(child)
+    return found
+
+
+def print_timings(title: str, results: dict[str, dict]):
+    """Print a benchmark result table."""
+    log.info(title)
+    log.info(f"  {'Query':<32} {'Median ms':>10}")
+    log.info("  " + "─" * 44)
+    for name, r in results.items():
+        log.info(f"  {name:<32} {r['median_ms']:>10.2f}")
+        for scan in r["scan_nodes"]:
+            log.info(f"      {scan}")
+
+
+def benchmark(conn, runs: int):
+    """Time the example queries against the current index set."""
+    cur = conn.cursor()
+    report_date = get_latest_report_date(cur)
+    print_timings(f"Benchmark @ {report_date} ({runs} runs)", time_queries(cur, report_date, runs))
+    conn.rollback()
+    cur.close()
+
+
+def compare(conn, runs: int):
+    """
+    Time the example queries without and with the managed indexes.
+
+    The "before" run drops the managed indexes inside a transaction that is
+    rolled back, so nothing has to be rebuilt afterwards. DROP INDEX holds an
+    exclusive lock until the rollback; run this against a quiet database.
+    """
+    install_indexes(conn)
+    conn.autocommit = False
+    cur = conn.cursor()
+    report_date = get_latest_report_date(cur)
+
+    for name, _ in MANAGED_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    before = time_queries(cur, report_date, runs)
+    conn.rollback()
+
+    after = time_queries(cur, report_date, runs)
+    conn.rollback()
+    cur.close()
+
+    print_timings("Without managed indexes", before)
+    print_timings("With managed indexes", after)
+
+    log.info("Speedup")
+    for name in BENCHMARK_QUERIES:
+        b, a = before[name]["median_ms"], after[name]["median_ms"]
+        ratio = b / a if a else float("inf")
+        log.info(f"  {name:<32} {b:>9.2f} → {a:>9.2f} ms  ({ratio:.1f}x)")
+
+
+def report_unused(conn):
+    """Report non-constraint indexes that have never been scanned."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT s.relname, s.indexrelname, s.idx_scan,
+               pg_size_pretty(pg_relation_size(s.indexrelid)) AS size
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.idx_scan = 0
+          AND NOT i.indisunique
+          AND NOT i.indisprimary
+        ORDER BY pg_relation_size(s.indexrelid) DESC
+    """)
+    rows = cur.fetchall()
+    cur.execute("SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()")
+    stats_reset = cur.fetchone()[0]
+    conn.rollback()
+    cur.close()
+
+    since = f"since {stats_reset}" if stats_reset else "since statistics were created"
+    if not rows:
+        log.info(f"✓ Every index has been scanned {since}")
+        return
+
+    log.info(f"Indexes with zero scans {since}:")
+    log.info(f"  {'Table':<28} {'Index':<36} {'Size':>10}")
+    log.info("  " + "─" * 76)
+    for table, index, _, size in rows:
+        managed = "  (managed)" if index in {n for n, _ in MANAGED_INDEXES} else ""
+        log.info(f"  {table:<28} {index:<36} {size:>10}{managed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage NL-workload indexes")
+    parser.add_argument("command", choices=["install", "drop", "benchmark", "compare", "unused"])
+    parser.add_argument("--host", default="localhost", help="Database host")
+    parser.add_argument("--port", type=int, default=5432, help="Database port")
+    parser.add_argument("--dbname", required=True, help="Database name")
+    parser.add_argument("--user", required=True, help="Database user")
+    parser.add_argument("--password", required=True, help="Database password")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per benchmark query")
+
+    args = parser.parse_args()
+
+    conn_params = {
+        "host": args.host,
+        "port": args.port,
+        "dbname": args.dbname,
+        "user": args.user,
+        "password": args.password,
+    }
+
+    try:
+        conn = psycopg2.connect(**conn_params)
+    except Exception as e:
+        log.error(f"Failed to connect to database: {e}")
+        sys.exit(1)
+
+    try:
+        if args.command == "install":
+            install_indexes(conn)
+        elif args.command == "drop":
+            drop_indexes(conn)
+        elif args.command == "benchmark":
+            benchmark(conn, args.runs)
+        elif args.command == "compare":
+            compare(conn, args.runs)
+        elif args.command == "unused":
+            report_unused(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
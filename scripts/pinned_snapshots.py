@@ -0,0 +1,149 @@
+"""
+Pinned query snapshots.
+
+Queries pinned in the NL CLI (/pin <name>) are listed in nl_query/pins.json.
+After every successful load each pin is re-executed in its own read-only
+transaction and its result written to nl_query/snapshots/<name>.json.gz,
+so /pinned <name> is a file read instead of a live query against
+portfolio_holdings.
+
+pins.json is a hand-editable file, so each pin must pass the NL CLI's own
+check (SafeExecutor.validate_query: one SELECT/WITH statement, no write
+keywords) and runs on a separate connection opened with
+default_transaction_read_only=on, never on the loader's connection.
+
+A snapshot file is gzipped JSON: columns, type_codes, rows (lists),
+row_count, truncated, execution_time_ms, refreshed_at and the data_version
+it was taken at. Files are replaced atomically; a pin that fails keeps its
+previous snapshot and does not fail the load.
+"""
+
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional
+
+import psycopg2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "nl_query"))
+
+from db_executor import SafeExecutor
+
+log = logging.getLogger("db_loader")
+
+DEFAULT_PINS_PATH = Path(__file__).resolve().parent.parent / "nl_query" / "pins.json"
+
+# Rows kept per snapshot
+MAX_ROWS = 10_000
+
+# Per-pin statement timeout
+TIMEOUT_MS = 120_000
+
+
+def snapshot_dir(pins_path: Path) -> Path:
+    """Snapshots live next to the pins file."""
+    return Path(pins_path).parent / "snapshots"
+
+
+def _json_value(val):
+    if isinstance(val, Decimal):
+        return str(val)
+    if isinstance(val, (date, datetime)):
+        return val.isoformat()
+    return str(val)
+
+
+def _write_snapshot(path: Path, snapshot: dict):
+    """Write to a temp file and rename, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"), default=_json_value)
+    os.replace(tmp, path)
+
+
+def _run_pin(conn, sql: str) -> dict:
+    """Execute one validated pin read-only and return its snapshot body."""
+    is_valid, message = SafeExecutor.validate_query(sql)
+    if not is_valid:
+        raise ValueError(message)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET TRANSACTION READ ONLY")
+        cursor.execute(f"SET LOCAL statement_timeout = {TIMEOUT_MS}")
+        start = time.perf_counter()
+        cursor.execute(sql.strip().rstrip(";"))
+        rows = cursor.fetchmany(MAX_ROWS + 1)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        truncated = len(rows) > MAX_ROWS
+        rows = rows[:MAX_ROWS]
+        return {
+            "columns": [desc[0] for desc in cursor.description],
+            "type_codes": [desc[1] for desc in cursor.description],
+            "rows": [list(row) for row in rows],
+            "row_count": len(rows),
+            "truncated": truncated,
+            "execution_time_ms": round(elapsed_ms, 1),
+        }
+    finally:
+        cursor.close()
+        conn.rollback()
+
+
+def refresh_pinned_snapshots(conn_params: dict, data_version: Optional[int] = None,
+                             pins_path: Path = DEFAULT_PINS_PATH) -> int:
+    """
+    Re-run every pinned query and store its result.
+
+    Pins run on their own read-only session (conn_params plus
+    default_transaction_read_only=on), each in a transaction that is
+    rolled back afterwards. Returns the number of snapshots written.
+    """
+    pins_path = Path(pins_path)
+    if not pins_path.exists():
+        return 0
+    try:
+        pins = json.loads(pins_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        log.warning(f"  Skipping pinned snapshots, cannot read {pins_path}: {e}")
+        return 0
+
+    if not pins:
+        return 0
+    try:
+        conn = psycopg2.connect(**conn_params, options="-c default_transaction_read_only=on")
+    except psycopg2.Error as e:
+        log.warning(f"  Skipping pinned snapshots, cannot connect: {e}")
+        return 0
+
+    out_dir = snapshot_dir(pins_path)
+    start = time.perf_counter()
+    written = 0
+    try:
+        for name, pin in sorted(pins.items()):
+            try:
+                snapshot = _run_pin(conn, pin["sql"])
+            except Exception as e:
+                log.warning(f"  Pinned snapshot '{name}' failed: {e}")
+                continue
+            snapshot.update({
+                "name": name,
+                "sql": pin["sql"],
+                "refreshed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "data_version": data_version,
+            })
+            _write_snapshot(out_dir / f"{name}.json.gz", snapshot)
+            written += 1
+            log.debug(f"  Snapshot '{name}': {snapshot['row_count']:,} rows in {snapshot['execution_time_ms']:.0f}ms")
+    finally:
+        conn.close()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    log.info(f"  Refreshed {written}/{len(pins)} pinned snapshots in {elapsed_ms:.0f}ms")
+    return written